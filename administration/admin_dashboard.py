@@ -19,6 +19,8 @@ from students.models import Student
 from academics.models import Department, Course, AcademicYear, Semester
 from courses.models import CourseRegistration, ClassSession, TimetableSlot
 from attendance.models import Attendance, ExamEligibility
+from attendance.attendance_counters import ATTENDED_STATUSES, get_combined_attendance_rate
+from attendance.attendance_rollups import get_rollups, summarize
 from .system_config import system_config_service
 
 logger = logging.getLogger(__name__)
@@ -43,9 +45,9 @@ class AdminDashboardService:
             total_departments = Department.objects.filter(is_active=True).count()
             
             # Today's attendance
-            today_attendance = Attendance.objects.filter(date=today)
-            present_today = today_attendance.filter(status__in=['present', 'partial', 'late']).count()
-            total_expected_today = today_attendance.count()
+            today_totals = summarize(get_rollups(today, today))
+            present_today = today_totals['attended']
+            total_expected_today = today_totals['records']
             
             # Active sessions
             active_sessions = ClassSession.objects.filter(
@@ -85,15 +87,21 @@ class AdminDashboardService:
         try:
             end_date = timezone.now().date()
             start_date = end_date - timedelta(days=days)
+            rollups = get_rollups(start_date, end_date)
+            totals = dict(
+                total=Sum('records'),
+                present=Sum('records', filter=Q(status__in=ATTENDED_STATUSES))
+            )
             
             # Daily attendance trends
+            by_date = {row['date']: row for row in rollups.values('date').annotate(**totals)}
             daily_stats = []
             current_date = start_date
             
             while current_date <= end_date:
-                day_attendance = Attendance.objects.filter(date=current_date)
-                total = day_attendance.count()
-                present = day_attendance.filter(status__in=['present', 'partial', 'late']).count()
+                day = by_date.get(current_date, {})
+                total = day.get('total') or 0
+                present = day.get('present') or 0
                 
                 daily_stats.append({
                     'date': current_date.isoformat(),
@@ -105,17 +113,16 @@ class AdminDashboardService:
                 current_date += timedelta(days=1)
             
             # Department-wise attendance
+            by_department = {
+                row['department_id']: row for row in rollups.values('department_id').annotate(**totals)
+            }
             dept_stats = []
             departments = Department.objects.filter(is_active=True)
             
             for dept in departments:
-                dept_attendance = Attendance.objects.filter(
-                    date__range=[start_date, end_date],
-                    student__department=dept
-                )
-                
-                total = dept_attendance.count()
-                present = dept_attendance.filter(status__in=['present', 'partial', 'late']).count()
+                row = by_department.get(dept.id, {})
+                total = row.get('total') or 0
+                present = row.get('present') or 0
                 
                 dept_stats.append({
                     'department_id': str(dept.id),
@@ -129,19 +136,19 @@ class AdminDashboardService:
             
             # Course-wise attendance
             course_stats = []
-            courses = Course.objects.filter(is_active=True)[:20]  # Top 20 courses
+            courses = list(Course.objects.filter(is_active=True).select_related('department')[:20])  # Top 20 courses
+            by_course = {
+                row['course_id']: row
+                for row in rollups.filter(course_id__in=[course.id for course in courses]).values('course_id').annotate(
+                    presence_total=Sum('presence_total'), presence_records=Sum('presence_records'), **totals
+                )
+            }
             
             for course in courses:
-                course_attendance = Attendance.objects.filter(
-                    date__range=[start_date, end_date],
-                    course_registration__course=course
-                )
-                
-                total = course_attendance.count()
-                present = course_attendance.filter(status__in=['present', 'partial', 'late']).count()
-                avg_presence = course_attendance.exclude(presence_percentage__isnull=True).aggregate(
-                    avg=Avg('presence_percentage')
-                )['avg'] or 0
+                row = by_course.get(course.id, {})
+                total = row.get('total') or 0
+                present = row.get('present') or 0
+                avg_presence = row['presence_total'] / row['presence_records'] if row.get('presence_records') else 0
                 
                 course_stats.append({
                     'course_id': str(course.id),
@@ -155,9 +162,7 @@ class AdminDashboardService:
                 })
             
             # Status distribution
-            status_distribution = Attendance.objects.filter(
-                date__range=[start_date, end_date]
-            ).values('status').annotate(count=Count('id')).order_by('status')
+            status_distribution = rollups.values('status').annotate(count=Sum('records')).order_by('status')
             
             return {
                 'period': f'{start_date.isoformat()} to {end_date.isoformat()}',
@@ -295,15 +300,16 @@ class AdminDashboardService:
             today = timezone.now().date()
             week_ago = today - timedelta(days=7)
             
-            recent_detections = Attendance.objects.filter(
-                date__gte=week_ago,
-                detection_count__gt=0
-            ).aggregate(
-                total_detections=Sum('detection_count'),
-                avg_confidence=Avg('presence_percentage'),
-                successful_recognitions=Count('id', filter=Q(status__in=['present', 'partial', 'late'])),
-                total_attempts=Count('id')
-            )
+            recent = summarize(get_rollups(week_ago, today))
+            recent_detections = {
+                'total_detections': recent['detections'],
+                'avg_confidence': (
+                    recent['detected_presence_total'] / recent['detected_presence_records']
+                    if recent['detected_presence_records'] else 0
+                ),
+                'successful_recognitions': recent['attended_detected'],
+                'total_attempts': recent['detected_records']
+            }
             
             # Students with face consent
             students_with_consent = Student.objects.filter(
@@ -431,21 +437,10 @@ class AdminDashboardService:
     def _calculate_student_attendance_rate(self, student: Student, semester: Semester) -> float:
         """Calculate attendance rate for a student in a semester"""
         try:
-            attendance_records = Attendance.objects.filter(
+            return round(get_combined_attendance_rate(ExamEligibility.objects.filter(
                 student=student,
-                course_registration__semester=semester,
-                date__range=[semester.start_date, semester.end_date]
-            )
-            
-            total_classes = attendance_records.count()
-            if total_classes == 0:
-                return 0.0
-            
-            present_classes = attendance_records.filter(
-                status__in=['present', 'partial', 'late']
-            ).count()
-            
-            return round((present_classes / total_classes) * 100, 2)
+                course_registration__semester=semester
+            )), 2)
             
         except Exception as e:
             logger.error(f"Error calculating attendance rate for student {student.id}: {e}")
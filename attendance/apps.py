@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AttendanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'attendance'
+
+    def ready(self):
+        """Register the attendance counter receivers"""
+        import attendance.attendance_counters
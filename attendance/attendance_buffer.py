@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Write-behind Attendance Buffer
+
+Recognized faces used to be written to the database one at a time (a
+lookup, a CourseRegistration get_or_create and an Attendance insert per
+face). Under SQLite those per-face write transactions stall with "database
+is locked" when many cameras start a lecture at once.
+
+The buffer instead remembers, per timetable slot and day, which students
+have already been marked, queues the new marks in memory and writes them
+in one transaction with bulk_create(ignore_conflicts=True), relying on the
+('student', 'course_registration', 'date') unique constraint of Attendance.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from academics.models import Semester
+from attendance import attendance_counters
+from attendance.models import Attendance, CourseRegistration
+from live_sessions.models import LiveSession, LiveSessionParticipant
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingMark:
+    """An attendance mark waiting to be written"""
+    student_id: int
+    user_id: Optional[int]
+    course_id: int
+    course_code: str
+    slot_id: Any
+    session_id: Optional[str]
+    date: Any
+    marked_at: datetime
+
+
+class AttendanceWriteBuffer:
+    """Collects attendance marks from recognized faces and writes them in bulk"""
+
+    FLUSH_INTERVAL = 2.0  # seconds a mark may wait before being written
+    MAX_PENDING = 200  # flush immediately once this many marks are queued
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: List[PendingMark] = []
+        # (slot_id, date) -> student ids already marked for that slot today
+        self._marked: Dict[Tuple[Any, Any], Set[int]] = {}
+        self._timer: Optional[threading.Timer] = None
+
+        self.stats = {
+            'marks_queued': 0,
+            'duplicates_skipped': 0,
+            'flushes': 0,
+            'records_written': 0,
+            'last_flush_at': None,
+            'last_flush_duration': 0.0
+        }
+
+    def mark(self, student_id: int, timetable_slot, session_id: Optional[str] = None,
+             user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Queue attendance for a student in a timetable slot
+
+        Args:
+            student_id: Student primary key
+            timetable_slot: TimetableSlot instance (course preloaded)
+            session_id: Optional live session UUID to add the student to
+            user_id: Student's user id, required to join the live session
+
+        Returns:
+            dict: Marking result; the record itself is written on the next flush
+        """
+        now = timezone.now()
+        today = now.date()
+        course_code = timetable_slot.course.code
+        slot_key = (timetable_slot.id, today)
+
+        with self._lock:
+            marked = self._marked.get(slot_key)
+            if marked is None:
+                self._prune_marked(today)
+                marked = self._marked[slot_key] = set()
+
+            if student_id in marked:
+                self.stats['duplicates_skipped'] += 1
+                return {
+                    'success': False,
+                    'message': f'Attendance already marked for {course_code}',
+                    'already_marked': True,
+                    'course_code': course_code,
+                    'timetable_slot_id': timetable_slot.id
+                }
+
+            marked.add(student_id)
+            self._pending.append(PendingMark(
+                student_id=student_id,
+                user_id=user_id,
+                course_id=timetable_slot.course_id,
+                course_code=course_code,
+                slot_id=timetable_slot.id,
+                session_id=session_id,
+                date=today,
+                marked_at=now
+            ))
+            self.stats['marks_queued'] += 1
+            flush_now = len(self._pending) >= self.MAX_PENDING
+            if not flush_now:
+                self._schedule_flush()
+
+        if flush_now:
+            self.flush()
+
+        return {
+            'success': True,
+            'message': f'Attendance marked for {course_code}',
+            'queued': True,
+            'course_code': course_code,
+            'timetable_slot_id': timetable_slot.id
+        }
+
+    def _prune_marked(self, today):
+        """Forget dedupe state from previous days"""
+        for key in [key for key in self._marked if key[1] != today]:
+            del self._marked[key]
+
+    def _schedule_flush(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.FLUSH_INTERVAL, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self):
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def flush(self) -> int:
+        """
+        Write all queued marks
+
+        Returns:
+            int: Number of marks written
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            if not pending:
+                return 0
+
+            start_time = time.time()
+            try:
+                with transaction.atomic():
+                    written = self._write(pending)
+            except Exception as e:
+                logger.error(f"Error flushing {len(pending)} attendance marks: {e}")
+                # Allow the students to be marked again on a later frame
+                self._unmark(pending)
+                return 0
+
+            duration = time.time() - start_time
+            self.stats['flushes'] += 1
+            self.stats['records_written'] += written
+            self.stats['last_flush_at'] = timezone.now().isoformat()
+            self.stats['last_flush_duration'] = round(duration, 4)
+            logger.info(f"Flushed {len(pending)} attendance marks ({written} new records) in {duration:.3f}s")
+            return written
+
+    def _write(self, pending: List[PendingMark]) -> int:
+        student_ids = {mark.student_id for mark in pending}
+        course_ids = {mark.course_id for mark in pending}
+        dates = {mark.date for mark in pending}
+
+        # Skip students that already have attendance for the course that day
+        already_recorded = set(
+            Attendance.objects.filter(
+                student_id__in=student_ids,
+                course_registration__course_id__in=course_ids,
+                date__in=dates
+            ).order_by().values_list('student_id', 'course_registration__course_id', 'date')
+        )
+        pending = [
+            mark for mark in pending
+            if (mark.student_id, mark.course_id, mark.date) not in already_recorded
+        ]
+        if not pending:
+            return 0
+
+        registrations = self._get_registrations(pending)
+
+        records = []
+        unregistered = []
+        for mark in pending:
+            registration_id = registrations.get((mark.student_id, mark.course_id))
+            if registration_id is None:
+                logger.warning(f"No course registration for student {mark.student_id} in {mark.course_code}; "
+                               f"attendance not recorded")
+                unregistered.append(mark)
+                continue
+            records.append(Attendance(
+                student_id=mark.student_id,
+                course_registration_id=registration_id,
+                date=mark.date,
+                status='present',
+                first_detected_at=mark.marked_at,
+                last_detected_at=mark.marked_at,
+                detection_count=1,
+                is_manual_override=False
+            ))
+        records = attendance_counters.bulk_create_attendance(records)
+        # Nothing was written for them, so a later frame may try again
+        self._unmark(unregistered)
+
+        self._join_live_sessions(pending)
+        return len(records)
+
+    def _unmark(self, marks: List[PendingMark]):
+        """Forget that the students of the marks were marked, so they are marked again"""
+        with self._lock:
+            for mark in marks:
+                self._marked.get((mark.slot_id, mark.date), set()).discard(mark.student_id)
+
+    def _get_registrations(self, pending: List[PendingMark]) -> Dict[Tuple[int, int], Any]:
+        """Map (student_id, course_id) to a course registration, creating missing ones"""
+        return get_course_registrations({(mark.student_id, mark.course_id) for mark in pending})
+
+    def _join_live_sessions(self, pending: List[PendingMark]):
+        """Add marked students to the live sessions they were recognized in"""
+        users_by_session: Dict[str, Set[int]] = {}
+        for mark in pending:
+            if mark.session_id and mark.user_id:
+                users_by_session.setdefault(mark.session_id, set()).add(mark.user_id)
+
+        now = timezone.now()
+        for session_id, user_ids in users_by_session.items():
+            session = LiveSession.objects.filter(id=session_id, status='live').first()
+            if session is None:
+                logger.warning(f"Live session {session_id} not found")
+                continue
+
+            existing = set(
+                LiveSessionParticipant.objects.filter(session=session, user_id__in=user_ids)
+                .values_list('user_id', flat=True)
+            )
+            LiveSessionParticipant.objects.filter(
+                session=session, user_id__in=existing, is_active=False
+            ).update(is_active=True, joined_at=now)
+            LiveSessionParticipant.objects.bulk_create([
+                LiveSessionParticipant(session=session, user_id=user_id, joined_at=now,
+                                       is_active=True, has_video=True)
+                for user_id in user_ids - existing
+            ], ignore_conflicts=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+            tracked_slots = len(self._marked)
+        return dict(self.stats, pending_marks=pending, tracked_slots=tracked_slots)
+
+
+def get_course_registrations(wanted: Set[Tuple[int, int]]) -> Dict[Tuple[int, int], Any]:
+    """Map (student_id, course_id) pairs to course registration ids, creating missing ones"""
+    def load():
+        registrations = {}
+        for student_id, course_id, registration_id in CourseRegistration.objects.filter(
+            student_id__in={student_id for student_id, _ in wanted},
+            course_id__in={course_id for _, course_id in wanted}
+        ).values_list('student_id', 'course_id', 'id'):
+            registrations.setdefault((student_id, course_id), registration_id)
+        return registrations
+
+    registrations = load()
+    missing = wanted - registrations.keys()
+    if missing:
+        semester = Semester.get_current()
+        if semester is None:
+            logger.warning("No current semester configured; cannot create course registrations")
+            return registrations
+        CourseRegistration.objects.bulk_create([
+            CourseRegistration(student_id=student_id, course_id=course_id, semester=semester)
+            for student_id, course_id in missing
+        ], ignore_conflicts=True)
+        registrations = load()
+    return registrations
+
+
+# Global attendance write buffer
+attendance_buffer = AttendanceWriteBuffer()
+atexit.register(attendance_buffer.flush)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Incrementally Maintained Attendance Counters
+
+Dashboards and exam eligibility used to count a student's Attendance rows
+(all of them, then the attended ones) on every read. The ExamEligibility
+row of each course registration now holds those counts: total_classes,
+attended_classes, attendance_percentage and is_eligible are adjusted
+whenever attendance is created, changes status or is deleted, so reads are
+one indexed lookup.
+
+Single-row saves and deletes are picked up by the receivers below. Bulk
+writes (bulk_create, bulk_update, QuerySet.update) do not send signals;
+the code doing them reports the rows with record_created() or
+record_status_changes(); inserts that may conflict with existing
+attendance go through bulk_create_attendance(), which only counts the
+rows actually inserted. `manage.py rebuild_attendance_counters`
+recounts everything from the Attendance table.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Greatest
+from django.db.models.lookups import GreaterThanOrEqual
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Attendance, ExamEligibility
+
+logger = logging.getLogger(__name__)
+
+# Statuses counted as attending the class
+ATTENDED_STATUSES = frozenset(('present', 'partial', 'late'))
+
+REBUILD_BATCH_SIZE = 1000
+
+# (student_id, course_registration_id) -> [total delta, attended delta]
+Deltas = Dict[Tuple[int, Any], list]
+
+
+def attendance_rate(attended: int, total: int) -> float:
+    return (attended / total) * 100 if total else 0.0
+
+
+def record_created(records: Iterable[Attendance]):
+    """Count newly written attendance records"""
+    deltas: Deltas = defaultdict(lambda: [0, 0])
+    for record in records:
+        delta = deltas[(record.student_id, record.course_registration_id)]
+        delta[0] += 1
+        delta[1] += record.status in ATTENDED_STATUSES
+    apply_deltas(deltas)
+
+
+def bulk_create_attendance(records: List[Attendance]) -> List[Attendance]:
+    """
+    Insert attendance records, skipping those that conflict with existing rows
+
+    bulk_create(ignore_conflicts=True) silently drops rows that lose the
+    unique (student, registration, date) race, e.g. an absent mark against
+    a late recognition. Records get their primary key before the insert,
+    so the ones that made it are found by id and only those are counted.
+
+    Returns:
+        list: The records that were inserted
+    """
+    if not records:
+        return []
+    Attendance.objects.bulk_create(records, ignore_conflicts=True)
+    inserted_ids = set(
+        Attendance.objects.filter(id__in=[record.id for record in records]).values_list('id', flat=True)
+    )
+    inserted = [record for record in records if record.id in inserted_ids]
+    record_created(inserted)
+    return inserted
+
+
+def record_status_changes(changes: Iterable[Tuple[int, int, str, str]]):
+    """Adjust the counters for (student_id, course_registration_id, old_status, new_status) changes"""
+    deltas: Deltas = defaultdict(lambda: [0, 0])
+    for student_id, registration_id, old_status, new_status in changes:
+        change = (new_status in ATTENDED_STATUSES) - (old_status in ATTENDED_STATUSES)
+        if change:
+            deltas[(student_id, registration_id)][1] += change
+    apply_deltas(deltas)
+
+
+def apply_deltas(deltas: Deltas, create_missing: bool = True):
+    """
+    Add count deltas to the ExamEligibility rows of the registrations
+
+    Registrations without a counter row yet get one built from their
+    attendance (which already includes the change being recorded).
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    registration_ids = {registration_id for _, registration_id in deltas}
+    existing = set(
+        ExamEligibility.objects.filter(course_registration_id__in=registration_ids)
+        .values_list('course_registration_id', flat=True)
+    )
+    if create_missing and registration_ids - existing:
+        rebuild(registration_ids - existing)
+
+    by_delta = defaultdict(list)
+    for (_, registration_id), (total, attended) in deltas.items():
+        if registration_id in existing:
+            by_delta[(total, attended)].append(registration_id)
+    now = timezone.now()
+    for (total, attended), ids in by_delta.items():
+        ExamEligibility.objects.filter(course_registration_id__in=ids).update(
+            total_classes=Greatest(F('total_classes') + total, Value(0)),
+            attended_classes=Greatest(F('attended_classes') + attended, Value(0)),
+            last_calculated=now
+        )
+
+    # Derived columns, from the counts just written
+    ExamEligibility.objects.filter(course_registration_id__in=existing & registration_ids).update(
+        attendance_percentage=Case(
+            When(total_classes=0, then=Value(0.0)),
+            default=Cast(F('attended_classes'), FloatField()) * 100.0 / F('total_classes'),
+            output_field=FloatField()
+        ),
+        is_eligible=Case(
+            When(total_classes=0, then=Value(False)),
+            When(GreaterThanOrEqual(F('attended_classes') * 100.0, F('required_percentage') * F('total_classes')),
+                 then=Value(True)),
+            default=Value(False)
+        )
+    )
+
+
+def rebuild(registration_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recount the counters from the Attendance table
+
+    Args:
+        registration_ids: Course registrations to rebuild (default: all)
+
+    Returns:
+        int: Number of counter rows written
+    """
+    attendance = Attendance.objects.all()
+    eligibilities = ExamEligibility.objects.all()
+    if registration_ids is not None:
+        registration_ids = list(registration_ids)
+        attendance = attendance.filter(course_registration_id__in=registration_ids)
+        eligibilities = eligibilities.filter(course_registration_id__in=registration_ids)
+
+    counts = {
+        row['course_registration_id']: row
+        for row in attendance.order_by().values('course_registration_id', 'student_id').annotate(
+            total=Count('id'), attended=Count('id', filter=Q(status__in=ATTENDED_STATUSES))
+        )
+    }
+
+    now = timezone.now()
+
+    def fill(eligibility, total, attended):
+        eligibility.last_calculated = now
+        eligibility.total_classes = total
+        eligibility.attended_classes = attended
+        eligibility.attendance_percentage = attendance_rate(attended, total)
+        eligibility.is_eligible = total > 0 and eligibility.attendance_percentage >= eligibility.required_percentage
+
+    updated = []
+    for eligibility in eligibilities.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        row = counts.pop(eligibility.course_registration_id, None)
+        fill(eligibility, row['total'] if row else 0, row['attended'] if row else 0)
+        updated.append(eligibility)
+    ExamEligibility.objects.bulk_update(
+        updated, ['total_classes', 'attended_classes', 'attendance_percentage', 'is_eligible', 'last_calculated'],
+        batch_size=REBUILD_BATCH_SIZE
+    )
+
+    created = []
+    for registration_id, row in counts.items():
+        eligibility = ExamEligibility(student_id=row['student_id'], course_registration_id=registration_id)
+        fill(eligibility, row['total'], row['attended'])
+        created.append(eligibility)
+    ExamEligibility.objects.bulk_create(created, batch_size=REBUILD_BATCH_SIZE, ignore_conflicts=True)
+
+    return len(updated) + len(created)
+
+
+@receiver(post_init, sender=Attendance)
+def remember_counted_status(sender, instance, **kwargs):
+    instance._counted_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Attendance)
+def count_saved_attendance(sender, instance, created, raw=False, **kwargs):
+    """Count a new record, or a status change of an existing one"""
+    if raw:
+        return
+    key = (instance.student_id, instance.course_registration_id)
+    if created:
+        apply_deltas({key: [1, int(instance.status in ATTENDED_STATUSES)]})
+    elif instance._counted_status is not None and instance._counted_status != instance.status:
+        record_status_changes([key + (instance._counted_status, instance.status)])
+    instance._counted_status = instance.status
+
+
+@receiver(post_delete, sender=Attendance)
+def uncount_deleted_attendance(sender, instance, **kwargs):
+    apply_deltas(
+        {(instance.student_id, instance.course_registration_id): [-1, -int(instance.status in ATTENDED_STATUSES)]},
+        create_missing=False
+    )
+
+
+def get_attendance_rates(registrations) -> Dict[Any, float]:
+    """Attendance percentage of each course registration in a queryset or list of ids"""
+    return dict(
+        ExamEligibility.objects.filter(course_registration__in=registrations)
+        .values_list('course_registration_id', 'attendance_percentage')
+    )
+
+
+def get_combined_attendance_rate(eligibilities) -> float:
+    """Attendance percentage over all classes counted by an ExamEligibility queryset"""
+    totals = eligibilities.aggregate(total=Sum('total_classes'), attended=Sum('attended_classes'))
+    return attendance_rate(totals['attended'] or 0, totals['total'] or 0)
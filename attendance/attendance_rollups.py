@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Daily Attendance Rollups for Admin Analytics
+
+The admin analytics counted raw Attendance rows per day, per department
+and per course on every request, so their cost grew with the attendance
+history. DailyAttendanceRollup holds the counts at (date, course, status)
+granularity, with the course's department and level copied alongside.
+
+Past days are filled by `manage.py rollup_attendance` (by default the
+last two days, so late finalization and absent marking are picked up; run
+it nightly, or with --since to backfill). The current day is recomputed
+from its own Attendance rows when analytics read it and its rollup is
+older than ATTENDANCE_ROLLUP_TODAY_MAX_AGE seconds.
+"""
+
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .attendance_counters import ATTENDED_STATUSES
+from .models import Attendance, DailyAttendanceRollup
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_BATCH_SIZE = 1000
+ROLLUP_WINDOW_DAYS = 31  # Days aggregated per query when rebuilding a long range
+TODAY_REFRESH_KEY = "attendance_rollup_today_refreshed"
+
+MEASURES = ('records', 'detected_records', 'detections', 'presence_total', 'presence_records',
+            'detected_presence_total', 'detected_presence_records')
+
+
+def rebuild_rollups(start_date: date, end_date: Optional[date] = None) -> int:
+    """
+    Recompute the rollups of a date range from the Attendance table
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    end_date = end_date or timezone.localdate()
+    written = 0
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start + timedelta(days=ROLLUP_WINDOW_DAYS - 1), end_date)
+        written += _rebuild_window(window_start, window_end)
+        window_start = window_end + timedelta(days=1)
+    return written
+
+
+def _rebuild_window(start_date: date, end_date: date) -> int:
+    rows = Attendance.objects.filter(date__range=[start_date, end_date]).order_by().values(
+        'date', 'status',
+        course_id=F('course_registration__course_id'),
+        department_id=F('course_registration__course__department_id'),
+        level=F('course_registration__course__level')
+    ).annotate(
+        records=Count('id'),
+        detected_records=Count('id', filter=Q(detection_count__gt=0)),
+        detections=Sum('detection_count'),
+        presence_total=Sum('presence_percentage'),
+        presence_records=Count('presence_percentage'),
+        detected_presence_total=Sum('presence_percentage', filter=Q(detection_count__gt=0)),
+        detected_presence_records=Count('presence_percentage', filter=Q(detection_count__gt=0))
+    )
+
+    rollups = [
+        DailyAttendanceRollup(
+            date=row['date'],
+            course_id=row['course_id'],
+            department_id=row['department_id'],
+            level=row['level'],
+            status=row['status'],
+            **{measure: row[measure] or 0 for measure in MEASURES}
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        DailyAttendanceRollup.objects.filter(date__range=[start_date, end_date]).delete()
+        DailyAttendanceRollup.objects.bulk_create(rollups, batch_size=ROLLUP_BATCH_SIZE)
+    return len(rollups)
+
+
+def refresh_today(force: bool = False) -> bool:
+    """Recompute today's rollup unless another request did so within the configured max age"""
+    max_age = getattr(settings, 'ATTENDANCE_ROLLUP_TODAY_MAX_AGE', 60)
+    if not force and not cache.add(TODAY_REFRESH_KEY, True, max_age):
+        return False
+    if force:
+        cache.set(TODAY_REFRESH_KEY, True, max_age)
+    today = timezone.localdate()
+    written = _rebuild_window(today, today)
+    logger.debug(f"Refreshed today's attendance rollup ({written} rows)")
+    return True
+
+
+def get_rollups(start_date: date, end_date: Optional[date] = None):
+    """Rollup rows of a date range, with today's brought up to date first"""
+    today = timezone.localdate()
+    end_date = end_date or today
+    if start_date <= today <= end_date:
+        refresh_today()
+    return DailyAttendanceRollup.objects.filter(date__range=[start_date, end_date])
+
+
+def summarize(rollups) -> Dict[str, Any]:
+    """Totals of a rollup queryset: records, attended records and detection measures"""
+    totals = rollups.aggregate(
+        attended=Sum('records', filter=Q(status__in=ATTENDED_STATUSES)),
+        attended_detected=Sum('detected_records', filter=Q(status__in=ATTENDED_STATUSES)),
+        **{measure: Sum(measure) for measure in MEASURES}
+    )
+    return {key: value or 0 for key, value in totals.items()}
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Camera Session Tracking
+
+Keeps per-camera state between frames so that a face which has already been
+identified is followed with a lightweight IoU/centroid tracker and is only
+re-verified by the recognizer every few frames, instead of being re-recognized
+from scratch on every frame.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]  # (x, y, w, h)
+
+
+def box_iou(box_a: Box, box_b: Box) -> float:
+    """Intersection-over-union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+
+    intersection = inter_w * inter_h
+    union = aw * ah + bw * bh - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def box_centroid_distance(box_a: Box, box_b: Box) -> float:
+    """Centroid distance between two boxes, normalized by the larger box size"""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+
+    dx = (ax + aw / 2.0) - (bx + bw / 2.0)
+    dy = (ay + ah / 2.0) - (by + bh / 2.0)
+    scale = max(aw, ah, bw, bh, 1)
+    return ((dx * dx + dy * dy) ** 0.5) / scale
+
+
+class FaceTrack:
+    """A face followed across consecutive frames of one camera"""
+
+    def __init__(self, track_id: int, box: Box):
+        self.track_id = track_id
+        self.box = box
+        self.hits = 1
+        self.missed_frames = 0
+
+        # Identity established by the last successful recognition; identity holds
+        # whatever the service resolved the label to (e.g. a CachedStudent)
+        self.label_id = None
+        self.confidence = None
+        self.identity = None
+        self.frames_since_verified = 0
+        self.verified_at = None
+
+    @property
+    def is_identified(self) -> bool:
+        return self.label_id is not None
+
+    def needs_verification(self, reverify_interval: int) -> bool:
+        """Whether the recognizer should run for this face on the current frame"""
+        return not self.is_identified or self.frames_since_verified >= reverify_interval
+
+    def record_identity(self, label_id, confidence: float, identity: Any = None):
+        """Store the result of a successful recognition for this track"""
+        self.label_id = label_id
+        self.confidence = confidence
+        self.identity = identity
+        self.frames_since_verified = 0
+        self.verified_at = time.time()
+
+    def clear_identity(self):
+        """Forget the identity so the next frame re-runs recognition"""
+        self.label_id = None
+        self.confidence = None
+        self.identity = None
+        self.frames_since_verified = 0
+        self.verified_at = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'track_id': self.track_id,
+            'box': list(self.box),
+            'hits': self.hits,
+            'label_id': self.label_id,
+            'confidence': self.confidence,
+            'frames_since_verified': self.frames_since_verified
+        }
+
+
+class FaceTracker:
+    """
+    Greedy IoU tracker with a centroid-distance fallback.
+
+    Faces in a seated lecture barely move between frames, so matching by box
+    overlap (and by centroid distance for small, fast-shifting boxes) is
+    enough to carry an identity from one frame to the next.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_centroid_distance: float = 0.5,
+                 max_missed_frames: int = 5):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_missed_frames = max_missed_frames
+        self.tracks: Dict[int, FaceTrack] = {}
+        self._track_ids = itertools.count(1)
+
+    def update(self, boxes: Sequence[Box]) -> List[FaceTrack]:
+        """
+        Match the detections of a new frame against the existing tracks
+
+        Args:
+            boxes: Detected face boxes as (x, y, w, h)
+
+        Returns:
+            list: One FaceTrack per input box, in the same order
+        """
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        assigned: List[Optional[FaceTrack]] = [None] * len(boxes)
+        unmatched_tracks = set(self.tracks.keys())
+
+        # Score every (track, box) pair; IoU first, centroid distance as fallback
+        candidates = []
+        for track_id, track in self.tracks.items():
+            for box_index, box in enumerate(boxes):
+                iou = box_iou(track.box, box)
+                if iou >= self.iou_threshold:
+                    candidates.append((1.0 + iou, track_id, box_index))
+                    continue
+                distance = box_centroid_distance(track.box, box)
+                if distance <= self.max_centroid_distance:
+                    candidates.append((1.0 - distance, track_id, box_index))
+
+        candidates.sort(reverse=True)
+        for _, track_id, box_index in candidates:
+            if track_id not in unmatched_tracks or assigned[box_index] is not None:
+                continue
+            track = self.tracks[track_id]
+            track.box = boxes[box_index]
+            track.hits += 1
+            track.missed_frames = 0
+            track.frames_since_verified += 1
+            assigned[box_index] = track
+            unmatched_tracks.discard(track_id)
+
+        # Age out tracks that were not seen in this frame
+        for track_id in unmatched_tracks:
+            track = self.tracks[track_id]
+            track.missed_frames += 1
+            if track.missed_frames > self.max_missed_frames:
+                del self.tracks[track_id]
+
+        # Start new tracks for unmatched detections
+        for box_index, box in enumerate(boxes):
+            if assigned[box_index] is None:
+                track = FaceTrack(next(self._track_ids), box)
+                self.tracks[track.track_id] = track
+                assigned[box_index] = track
+
+        return assigned
+
+    def reset(self):
+        self.tracks.clear()
+
+
+class CameraSession:
+    """Long-lived recognition state for a single classroom camera"""
+
+    def __init__(self, camera_id: str, reverify_interval: int):
+        self.camera_id = camera_id
+        self.reverify_interval = reverify_interval
+        self.tracker = FaceTracker()
+        self.lock = threading.Lock()
+        # Per-camera detection pass planner, attached by the recognition service
+        self.detection_planner = None
+
+        self.created_at = time.time()
+        self.last_frame_at = None
+        self.frames_processed = 0
+        self.predictions_run = 0
+        self.predictions_skipped = 0
+
+    def track_faces(self, boxes: Sequence[Box]) -> List[FaceTrack]:
+        """Update the tracker with the faces detected in a new frame"""
+        with self.lock:
+            self.frames_processed += 1
+            self.last_frame_at = time.time()
+            return self.tracker.update(boxes)
+
+    def should_recognize(self, track: Optional[FaceTrack]) -> bool:
+        """Decide whether a tracked face must go through the recognizer again"""
+        if track is None or track.needs_verification(self.reverify_interval):
+            self.predictions_run += 1
+            return True
+        self.predictions_skipped += 1
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        total_predictions = self.predictions_run + self.predictions_skipped
+        return {
+            'camera_id': self.camera_id,
+            'active_tracks': len(self.tracker.tracks),
+            'frames_processed': self.frames_processed,
+            'predictions_run': self.predictions_run,
+            'predictions_skipped': self.predictions_skipped,
+            'skip_rate': round(self.predictions_skipped / total_predictions * 100, 1) if total_predictions else 0,
+            'reverify_interval': self.reverify_interval,
+            'last_frame_at': self.last_frame_at,
+            'detection': self.detection_planner.get_stats() if self.detection_planner else None
+        }
+
+
+class CameraSessionManager:
+    """Registry of camera sessions for this process"""
+
+    REVERIFY_INTERVAL = 10  # Re-run recognition on an identified face every N frames
+    SESSION_IDLE_TIMEOUT = 300  # seconds without frames before a session is dropped
+
+    def __init__(self):
+        self._sessions: Dict[str, CameraSession] = {}
+        self._lock = threading.Lock()
+
+    def get_session(self, camera_id: str) -> CameraSession:
+        """Get the session for a camera, creating it on first use"""
+        camera_id = str(camera_id)
+        with self._lock:
+            self._expire_idle_sessions()
+            session = self._sessions.get(camera_id)
+            if session is None:
+                session = CameraSession(camera_id, self.REVERIFY_INTERVAL)
+                self._sessions[camera_id] = session
+                logger.info(f"Started camera session {camera_id}")
+            return session
+
+    def end_session(self, camera_id: str) -> bool:
+        """Drop the state kept for a camera"""
+        with self._lock:
+            session = self._sessions.pop(str(camera_id), None)
+        if session:
+            logger.info(f"Ended camera session {camera_id} after {session.frames_processed} frames")
+        return session is not None
+
+    def _expire_idle_sessions(self):
+        now = time.time()
+        expired = [
+            camera_id for camera_id, session in self._sessions.items()
+            if now - (session.last_frame_at or session.created_at) > self.SESSION_IDLE_TIMEOUT
+        ]
+        for camera_id in expired:
+            del self._sessions[camera_id]
+            logger.info(f"Expired idle camera session {camera_id}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = [session.get_stats() for session in self._sessions.values()]
+        return {
+            'active_sessions': len(sessions),
+            'predictions_run': sum(s['predictions_run'] for s in sessions),
+            'predictions_skipped': sum(s['predictions_skipped'] for s in sessions),
+            'sessions': sessions
+        }
+
+
+# Global camera session manager
+camera_session_manager = CameraSessionManager()
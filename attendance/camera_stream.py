@@ -0,0 +1,231 @@
+"""
+WebSocket endpoint for streaming camera frames
+
+A classroom camera opens one long-lived connection
+
+    ws://<host>/ws/face-tracking/<camera_id>/?token=<JWT access token>[&session_id=...][&department_id=...][&compact=1]
+
+and sends frames either as binary JPEG/PNG messages or as JSON text messages
+({"frame_data": "data:image/jpeg;base64,...", "session_id": ..., "department_id": ...}).
+Each processed frame is answered with a JSON message shaped like the
+process_face_frame HTTP response; with compact=1 the data is delta
+encoded (see frame_protocol): the roster is sent once per roster version
+and each recognition once. Authentication and session validation
+happen once per connection, and the camera's face tracker lives for as long
+as the connection does.
+
+Only the most recent frame is kept while the recognizer is busy, so a slow
+server drops stale frames instead of building up latency.
+
+Served by the ASGI application in backend/asgi.py (e.g. uvicorn/daphne);
+the WSGI deployment keeps using the HTTP endpoint.
+"""
+
+import asyncio
+import json
+import logging
+import re
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from rest_framework.utils.encoders import JSONEncoder
+
+from live_sessions.models import LiveSession
+from .camera_sessions import camera_session_manager
+from .frame_gate import frame_gates
+from .frame_protocol import FrameDeltaEncoder
+from .recognition_workers import recognition_pool, run_frame, FrameDropped
+from . import face_tracking_views
+
+logger = logging.getLogger(__name__)
+
+PATH_PATTERN = re.compile(r'^/ws/face-tracking/(?P<camera_id>[\w.-]+)/?$')
+
+# Close codes in the application range (4000-4999)
+CLOSE_NOT_FOUND = 4404
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_UNAVAILABLE = 4503
+CLOSE_BAD_SESSION = 4400
+
+
+def _authenticate(raw_token):
+    """Resolve a JWT access token to an active user, or None"""
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+    if not raw_token:
+        return None
+    try:
+        authenticator = JWTAuthentication()
+        validated_token = authenticator.get_validated_token(raw_token)
+        return authenticator.get_user(validated_token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def _validate_live_session(session_id):
+    """Return an error message if the live session cannot receive attendance"""
+    if not session_id:
+        return None
+    try:
+        session = LiveSession.objects.get(id=session_id)
+    except (LiveSession.DoesNotExist, ValueError):
+        return 'Live session not found'
+    if session.status != 'live':
+        return 'Session is not currently live'
+    return None
+
+
+async def _process_frame(frame, session_id, department_id, camera_id):
+    """
+    Run recognition on the worker pool when enabled, else in a thread
+
+    The camera's frame gate is consulted first, so an unchanged scene
+    reuses the previous result without being handed to recognition.
+    """
+    gate = frame_gates.get_gate(camera_id)
+    thumbnail = gate.fingerprint(frame) if gate else None
+    reused = gate.reuse(thumbnail, (session_id, department_id)) if gate else None
+    if reused is not None:
+        return reused
+
+    if recognition_pool.enabled:
+        future = recognition_pool.submit(frame, session_id, department_id, camera_id)
+        results = await asyncio.wrap_future(future)
+    else:
+        # Not thread sensitive: cameras must not queue behind each other on one shared thread
+        results = await sync_to_async(run_frame, thread_sensitive=False)(frame, session_id, department_id, camera_id)
+
+    if gate:
+        gate.record(thumbnail, (session_id, department_id), results)
+    return results
+
+
+async def _send_json(send, payload):
+    await send({'type': 'websocket.send', 'text': json.dumps(payload, cls=JSONEncoder)})
+
+
+async def face_tracking_websocket(scope, receive, send):
+    """ASGI application handling ws/face-tracking/<camera_id>/ connections"""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    match = PATH_PATTERN.match(scope.get('path', ''))
+    if not match:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    camera_id = match.group('camera_id')
+    params = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+
+    user = await sync_to_async(_authenticate)(params.get('token'))
+    if user is None or not user.is_active:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+
+    if not face_tracking_views.FACE_RECOGNITION_AVAILABLE:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAVAILABLE})
+        return
+
+    session_id = params.get('session_id')
+    department_id = params.get('department_id')
+    session_error = await sync_to_async(_validate_live_session)(session_id)
+    if session_error:
+        await send({'type': 'websocket.close', 'code': CLOSE_BAD_SESSION})
+        return
+
+    await send({'type': 'websocket.accept'})
+    logger.info(f"Camera {camera_id} connected for streaming recognition (user {user.pk})")
+
+    latest = {'frame': None, 'session_id': session_id, 'department_id': department_id}
+    frame_ready = asyncio.Event()
+    stats = {'received': 0, 'processed': 0, 'dropped': 0}
+    encoder = FrameDeltaEncoder() if params.get('compact') in ('1', 'true') else None
+    connected = True
+
+    async def read_frames():
+        nonlocal connected
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            if message['type'] != 'websocket.receive':
+                continue
+
+            frame = None
+            if message.get('bytes'):
+                frame = message['bytes']
+            elif message.get('text'):
+                try:
+                    payload = json.loads(message['text'])
+                except ValueError:
+                    await _send_json(send, {'success': False, 'message': 'Invalid JSON message'})
+                    continue
+                frame = payload.get('frame_data')
+                new_session_id = payload.get('session_id', latest['session_id'])
+                if new_session_id != latest['session_id']:
+                    # Switching sessions is checked like the one given at connect
+                    session_error = await sync_to_async(_validate_live_session)(new_session_id)
+                    if session_error:
+                        await _send_json(send, {'success': False, 'message': session_error})
+                        continue
+                    latest['session_id'] = new_session_id
+                latest['department_id'] = payload.get('department_id', latest['department_id'])
+
+            if not frame:
+                continue
+
+            stats['received'] += 1
+            if latest['frame'] is not None:
+                # The recognizer has not caught up; only the newest frame matters
+                stats['dropped'] += 1
+            latest['frame'] = frame
+            frame_ready.set()
+
+        connected = False
+        frame_ready.set()
+
+    async def process_frames():
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            if not connected:
+                break
+
+            frame, latest['frame'] = latest['frame'], None
+            if frame is None:
+                continue
+
+            try:
+                results = await _process_frame(frame, latest['session_id'], latest['department_id'], camera_id)
+            except FrameDropped as e:
+                stats['dropped'] += 1
+                await _send_json(send, {'success': False, 'dropped': True, 'retry_after': e.retry_after})
+                continue
+            except ValueError as e:
+                await _send_json(send, {'success': False, 'message': str(e)})
+                continue
+            except Exception as e:
+                # One failing frame must not end the stream
+                logger.error(f"Error processing frame from camera {camera_id}: {e}")
+                await _send_json(send, {'success': False, 'message': 'Frame processing failed'})
+                continue
+            stats['processed'] += 1
+            if connected:
+                data = encoder.encode(results) if encoder else results
+                await _send_json(send, {'success': True, 'data': data, 'stream': dict(stats)})
+
+    reader = asyncio.ensure_future(read_frames())
+    try:
+        await process_frames()
+    finally:
+        reader.cancel()
+        if recognition_pool.enabled:
+            # The camera's tracking state lives in its worker process
+            recognition_pool.end_session(camera_id)
+        else:
+            camera_session_manager.end_session(camera_id)
+        frame_gates.end(camera_id)
+        logger.info(f"Camera {camera_id} disconnected: {stats['processed']} frames processed, "
+                    f"{stats['dropped']} dropped")
@@ -16,6 +16,7 @@ from courses.models import TimetableSlot, TimetableEntry, CourseRegistration
 from academics.models import CourseOffering
 from students.models import Student, StudentLevelSelection, StudentCourseSelection
 from attendance.enhanced_services import EnhancedAttendanceService
+from attendance.absence_marking import mark_absent_for_ended_slots
 
 logger = logging.getLogger(__name__)
 
@@ -232,71 +233,11 @@ class EnhancedAttendanceAdapter:
             return None
     
     @staticmethod
-    def auto_mark_absent_with_course_selection_filtering():
+    def auto_mark_absent_with_course_selection_filtering(dry_run: bool = False) -> Dict[str, Any]:
         """
         Auto-mark absent but only for courses students are offering
         """
-        now = timezone.localtime()
-        current_day = now.strftime('%a').upper()[:3]
-        
-        # Get all timetable slots that have ended today
-        ended_slots = TimetableSlot.objects.select_related(
-            'course', 'level', 'timetable__department', 'lecturer'
-        ).filter(
-            day_of_week=current_day,
-            end_time__lt=now.time()
-        )
-        
-        for slot in ended_slots:
-            # Get all students in this department and level
-            students_in_level = StudentLevelSelection.objects.select_related(
-                'student'
-            ).filter(
-                level=slot.level,
-                student__department=slot.timetable.department
-            )
-            
-            for level_selection in students_in_level:
-                student = level_selection.student
-                
-                # Check if student is offering this course and it's approved
-                try:
-                    course_selection = StudentCourseSelection.objects.get(
-                        student=student,
-                        course=slot.course,
-                        level=slot.level
-                    )
-                    is_offered = course_selection.is_offered and course_selection.is_approved
-                except StudentCourseSelection.DoesNotExist:
-                    # Default to offered and approved for timetable courses
-                    is_offered = True
-                
-                if is_offered:
-                    # Student is offering the course, mark as absent if not already marked
-                    timetable_entry = TimetableAdapter.create_timetable_entry_from_slot(slot)
-                    course_registration = TimetableAdapter.ensure_student_course_registration(student, slot)
-                    
-                    if timetable_entry and course_registration:
-                        today = timezone.now().date()
-                        attendance, created = Attendance.objects.get_or_create(
-                            student=student,
-                            course_registration=course_registration,
-                            timetable_entry=timetable_entry,
-                            date=today,
-                            defaults={'status': 'absent'}
-                        )
-                        
-                        if created:
-                            logger.info(
-                                f"Auto-marked {student.matric_number} as absent "
-                                f"for {slot.course.code}"
-                            )
-                else:
-                    # Student opted out, don't create attendance record
-                    logger.info(
-                        f"Skipping attendance for {student.matric_number} "
-                        f"in {slot.course.code} - student opted out"
-                    )
+        return mark_absent_for_ended_slots(dry_run=dry_run)
 
 
 # Convenience functions to replace existing attendance functions
@@ -314,8 +255,8 @@ def get_current_timetable_entry_enhanced(student: Student) -> Optional[Timetable
     return EnhancedAttendanceAdapter.get_current_timetable_entry_enhanced(student)
 
 
-def auto_mark_absent_enhanced():
+def auto_mark_absent_enhanced(dry_run: bool = False) -> Dict[str, Any]:
     """
     Enhanced version of auto_mark_absent that considers course selections
     """
-    return EnhancedAttendanceAdapter.auto_mark_absent_with_course_selection_filtering()
\ No newline at end of file
+    return EnhancedAttendanceAdapter.auto_mark_absent_with_course_selection_filtering(dry_run=dry_run)
\ No newline at end of file
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Adaptive Face Detection Planner
+
+Multi-scale detection runs several Haar cascade passes over differently
+preprocessed images and merges them with NMS. Which passes actually find
+faces depends on the camera (distance, lighting, lens), so running all of
+them on every frame mostly buys duplicates that NMS throws away.
+
+A DetectionPlanner is kept per camera. It records for every pass how long
+it takes and how many of its boxes survive NMS (its yield), and plans each
+frame as follows:
+
+- passes that have not contributed a face in their last IDLE_FRAMES runs
+  are skipped,
+- a skipped pass is re-probed every PROBE_INTERVAL frames so it can come
+  back when the scene changes,
+- when a latency budget is set, passes are taken in order of yield per
+  millisecond until the expected cost reaches the budget.
+
+At least one pass always runs.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence
+
+EMA_WEIGHT = 0.2  # Weight of the newest sample in the running cost/yield averages
+
+
+class PassStats:
+    """Running cost and yield of one detection pass on one camera"""
+
+    def __init__(self, name: str, history: int):
+        self.name = name
+        self.runs = 0
+        self.skips = 0
+        self.avg_cost_ms = None
+        self.avg_yield = None
+        self.total_faces = 0
+        self.recent_yields = deque(maxlen=history)
+        self.frames_since_run = 0
+
+    def record_cost(self, elapsed_ms: float):
+        self.runs += 1
+        self.frames_since_run = 0
+        if self.avg_cost_ms is None:
+            self.avg_cost_ms = elapsed_ms
+        else:
+            self.avg_cost_ms += EMA_WEIGHT * (elapsed_ms - self.avg_cost_ms)
+
+    def record_yield(self, faces: int):
+        self.total_faces += faces
+        self.recent_yields.append(faces)
+        if self.avg_yield is None:
+            self.avg_yield = float(faces)
+        else:
+            self.avg_yield += EMA_WEIGHT * (faces - self.avg_yield)
+
+    @property
+    def is_idle(self) -> bool:
+        """True once the pass ran a full history window without contributing"""
+        return (len(self.recent_yields) == self.recent_yields.maxlen
+                and not any(self.recent_yields))
+
+    @property
+    def value(self) -> float:
+        """Faces contributed per millisecond; unmeasured passes rank first"""
+        if self.avg_cost_ms is None or self.avg_yield is None:
+            return float('inf')
+        return self.avg_yield / max(self.avg_cost_ms, 0.01)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'runs': self.runs,
+            'skips': self.skips,
+            'avg_cost_ms': round(self.avg_cost_ms, 2) if self.avg_cost_ms is not None else None,
+            'avg_yield': round(self.avg_yield, 2) if self.avg_yield is not None else None,
+            'total_faces': self.total_faces,
+            'idle': self.is_idle
+        }
+
+
+class DetectionPlanner:
+    """Chooses the detection passes to run for each frame of one camera"""
+
+    IDLE_FRAMES = 20  # Runs without a contribution before a pass is skipped
+    PROBE_INTERVAL = 30  # Frames between re-probes of a skipped pass
+
+    def __init__(self, pass_names: Sequence[str], budget_ms: Optional[float] = None):
+        """
+        Args:
+            pass_names: Detection passes in their default (priority) order
+            budget_ms: Optional detection latency budget per frame
+        """
+        self.pass_names = list(pass_names)
+        self.budget_ms = budget_ms
+        self.passes = {name: PassStats(name, self.IDLE_FRAMES) for name in self.pass_names}
+        self.frames_planned = 0
+        self.last_plan: List[str] = []
+        self.last_detection_ms = None
+        self._lock = threading.Lock()
+
+    def plan(self) -> List[str]:
+        """Names of the passes to run for the next frame, in default order"""
+        with self._lock:
+            self.frames_planned += 1
+            for stats in self.passes.values():
+                stats.frames_since_run += 1
+
+            candidates = []
+            for name in self.pass_names:
+                stats = self.passes[name]
+                if not stats.is_idle or stats.frames_since_run >= self.PROBE_INTERVAL:
+                    candidates.append(name)
+
+            if self.budget_ms is not None:
+                candidates = self._fit_budget(candidates)
+
+            if not candidates:
+                # Never skip everything: fall back to the historically best pass
+                best = max(self.pass_names, key=lambda name: (self.passes[name].total_faces, -self.pass_names.index(name)))
+                candidates = [best]
+
+            selected = set(candidates)
+            for name in self.pass_names:
+                if name not in selected:
+                    self.passes[name].skips += 1
+
+            self.last_plan = [name for name in self.pass_names if name in selected]
+            return list(self.last_plan)
+
+    def _fit_budget(self, candidates: List[str]) -> List[str]:
+        ranked = sorted(candidates, key=lambda name: self.passes[name].value, reverse=True)
+        chosen, spent = [], 0.0
+        for name in ranked:
+            cost = self.passes[name].avg_cost_ms or 0.0
+            if chosen and spent + cost > self.budget_ms:
+                continue
+            chosen.append(name)
+            spent += cost
+        return chosen
+
+    def record_pass(self, name: str, elapsed_ms: float):
+        """Record the wall time of one executed pass"""
+        with self._lock:
+            self.passes[name].record_cost(elapsed_ms)
+
+    def record_frame(self, contributions: Dict[str, int], elapsed_ms: float):
+        """
+        Record how many boxes of each executed pass survived NMS
+
+        Args:
+            contributions: Surviving boxes per pass; passes of the last plan
+                missing from it contributed nothing
+            elapsed_ms: Total detection time for the frame
+        """
+        with self._lock:
+            for name in self.last_plan:
+                self.passes[name].record_yield(contributions.get(name, 0))
+            self.last_detection_ms = elapsed_ms
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'frames_planned': self.frames_planned,
+                'budget_ms': self.budget_ms,
+                'last_plan': list(self.last_plan),
+                'last_detection_ms': round(self.last_detection_ms, 2) if self.last_detection_ms is not None else None,
+                'passes': {name: self.passes[name].to_dict() for name in self.pass_names}
+            }
+
+
+def timed_ms(start: float) -> float:
+    """Milliseconds elapsed since a time.perf_counter() reading"""
+    return (time.perf_counter() - start) * 1000.0
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Edge Recognition Event Ingestion
+
+Classroom PCs that run detection and recognition themselves post batches
+of recognition events instead of frames:
+
+    {
+        "event_id": "cam-1:000123",        # idempotency key, unique per event
+        "matric_number": "CSC/2021/001",
+        "slot_id": "<timetable slot uuid>",
+        "session_id": "<live session uuid>",  # optional
+        "timestamp": "2026-03-02T09:15:04Z",
+        "confidence": 0.91,                # 0-1
+        "camera_id": "hall-a-cam-1",       # optional
+        "bounding_box": {...}              # optional
+    }
+
+Each event is checked against its timetable slot (the timestamp must fall
+inside the slot, the student must be on the slot's roster). Accepted
+events are applied in one transaction: the attendance of each student is
+updated once through presence_tracking_service, and one AttendanceDetection
+row is stored per event with the event_id as its idempotency key, so a
+batch that is retried after a timeout is not counted twice.
+"""
+
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from courses.models import TimetableSlot
+from students.models import Student
+from .attendance_buffer import get_course_registrations
+from .models import AttendanceDetection, CourseRegistration
+from .presence_tracking_service import presence_tracking_service
+from .roster_index import roster_index
+
+logger = logging.getLogger(__name__)
+
+MAX_CLOCK_SKEW = timedelta(seconds=60)  # Edge clocks may run slightly ahead of the server
+
+
+class EventRejected(ValueError):
+    """An event that cannot be applied, with the reason reported to the client"""
+
+
+@dataclass
+class EdgeEvent:
+    """A validated recognition event"""
+    index: int
+    event_id: str
+    matric_number: str
+    slot_id: uuid.UUID
+    session_id: Optional[str]
+    timestamp: datetime
+    confidence: float
+    camera_id: str
+    bounding_box: Optional[Dict[str, Any]]
+
+
+def parse_event(index: int, raw: Any) -> EdgeEvent:
+    """Validate the shape of one raw event"""
+    if not isinstance(raw, dict):
+        raise EventRejected("event must be an object")
+
+    event_id = str(raw.get('event_id') or '').strip()
+    if not event_id or len(event_id) > 64:
+        raise EventRejected("event_id is required (at most 64 characters)")
+
+    matric_number = str(raw.get('matric_number') or '').strip()
+    if not matric_number:
+        raise EventRejected("matric_number is required")
+
+    try:
+        slot_id = uuid.UUID(str(raw.get('slot_id')))
+    except ValueError:
+        raise EventRejected("slot_id must be a timetable slot id")
+
+    timestamp = parse_datetime(str(raw.get('timestamp') or ''))
+    if timestamp is None:
+        raise EventRejected("timestamp must be an ISO 8601 datetime")
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    if timestamp > timezone.now() + MAX_CLOCK_SKEW:
+        raise EventRejected("timestamp is in the future")
+
+    try:
+        confidence = float(raw.get('confidence'))
+    except (TypeError, ValueError):
+        raise EventRejected("confidence must be a number between 0 and 1")
+    if not 0.0 <= confidence <= 1.0:
+        raise EventRejected("confidence must be a number between 0 and 1")
+
+    camera_id = str(raw.get('camera_id') or '')
+    if len(camera_id) > 50:
+        raise EventRejected("camera_id is longer than 50 characters")
+
+    bounding_box = raw.get('bounding_box')
+    if bounding_box is not None and not isinstance(bounding_box, dict):
+        raise EventRejected("bounding_box must be an object")
+
+    return EdgeEvent(
+        index=index,
+        event_id=event_id,
+        matric_number=matric_number,
+        slot_id=slot_id,
+        session_id=str(raw['session_id']) if raw.get('session_id') else None,
+        timestamp=timestamp,
+        confidence=confidence,
+        camera_id=camera_id,
+        bounding_box=bounding_box
+    )
+
+
+def slot_covers(slot, timestamp: datetime) -> bool:
+    """Whether a timestamp falls on the slot's weekday between its start and end time"""
+    local = timezone.localtime(timestamp)
+    return (local.strftime('%a').upper() == slot.day_of_week
+            and slot.start_time <= local.time() <= slot.end_time)
+
+
+def ingest_events(raw_events: List[Any], retry_on_conflict: bool = True) -> Dict[str, Any]:
+    """
+    Validate, deduplicate and apply a batch of edge recognition events
+
+    Returns:
+        dict: accepted / duplicates counts, rejected events with their
+              reasons, and the number of attendance records updated
+    """
+    rejected = []
+    duplicates = 0
+
+    def reject(index, event_id, reason):
+        rejected.append({'index': index, 'event_id': event_id, 'reason': reason})
+
+    # Shape validation, and duplicates within the batch
+    events: Dict[str, EdgeEvent] = {}
+    for index, raw in enumerate(raw_events):
+        try:
+            event = parse_event(index, raw)
+        except EventRejected as e:
+            reject(index, raw.get('event_id') if isinstance(raw, dict) else None, str(e))
+            continue
+        if event.event_id in events:
+            duplicates += 1
+            continue
+        events[event.event_id] = event
+
+    # Events applied by an earlier request
+    already_applied = set(
+        AttendanceDetection.objects.filter(idempotency_key__in=list(events))
+        .values_list('idempotency_key', flat=True)
+    )
+    duplicates += len(already_applied)
+    pending = [event for event in events.values() if event.event_id not in already_applied]
+
+    # Roster validation, with one query for the slots and one for the students
+    slots = TimetableSlot.objects.select_related('course', 'level', 'timetable__department', 'lecturer') \
+        .in_bulk({event.slot_id for event in pending})
+    students = Student.objects.in_bulk({event.matric_number for event in pending}, field_name='matric_number')
+
+    valid = []
+    for event in pending:
+        slot = slots.get(event.slot_id)
+        student = students.get(event.matric_number)
+        if slot is None:
+            reject(event.index, event.event_id, "unknown timetable slot")
+        elif not slot_covers(slot, event.timestamp):
+            reject(event.index, event.event_id, "timestamp is outside the timetable slot")
+        elif student is None:
+            reject(event.index, event.event_id, "unknown matric number")
+        elif student.id not in roster_index.get_roster(slot):
+            reject(event.index, event.event_id, "student is not expected in this slot")
+        else:
+            valid.append((event, slot, student))
+
+    if not valid:
+        return _summary(0, duplicates, rejected, 0)
+
+    try:
+        with transaction.atomic():
+            accepted, updated = _apply(valid, reject)
+    except IntegrityError:
+        # A concurrent request stored some of these event ids first; those are duplicates now
+        if not retry_on_conflict:
+            raise
+        logger.info("Edge event batch raced with another request; retrying")
+        return ingest_events(raw_events, retry_on_conflict=False)
+
+    logger.info(f"Ingested {accepted} edge recognition events ({duplicates} duplicates, "
+                f"{len(rejected)} rejected, {updated} attendance records updated)")
+    return _summary(accepted, duplicates, rejected, updated)
+
+
+def _apply(valid, reject):
+    """Update attendance once per student, course and day, and store one detection per event"""
+    registration_ids = get_course_registrations({(student.id, slot.course_id) for _, slot, student in valid})
+    registrations = CourseRegistration.objects.select_related('course').in_bulk(registration_ids.values())
+
+    groups = {}
+    for event, slot, student in valid:
+        registration = registrations.get(registration_ids.get((student.id, slot.course_id)))
+        if registration is None:
+            reject(event.index, event.event_id, "no course registration for the student")
+            continue
+        date = timezone.localtime(event.timestamp).date()
+        groups.setdefault((student.id, registration.id, date), (student, registration, []))[2].append((event, slot))
+
+    detections = []
+    for (_, _, date), (student, registration, group) in groups.items():
+        attendance = presence_tracking_service.start_presence_tracking(student, registration, date=date)
+        presence_tracking_service.record_presence_detections(attendance, [event.timestamp for event, _ in group])
+        detections.extend(
+            AttendanceDetection(
+                attendance=attendance,
+                confidence_score=event.confidence,
+                bounding_box=event.bounding_box,
+                camera_id=event.camera_id,
+                idempotency_key=event.event_id,
+                session_context={
+                    'source': 'edge',
+                    'slot_id': str(slot.id),
+                    'session_id': event.session_id,
+                    'detected_at': event.timestamp.isoformat(),
+                    'recognition_method': 'edge_recognition'
+                }
+            )
+            for event, slot in group
+        )
+    AttendanceDetection.objects.bulk_create(detections)
+    return len(detections), len(groups)
+
+
+def _summary(accepted, duplicates, rejected, updated):
+    return {
+        'accepted': accepted,
+        'duplicates': duplicates,
+        'rejected': sorted(rejected, key=lambda r: r['index']),
+        'attendance_updated': updated
+    }
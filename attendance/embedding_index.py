@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Face Embedding Index
+
+Known face encodings are kept as one contiguous float32 matrix with
+precomputed squared norms, so every face in a frame is matched against
+every enrolled encoding with a single matrix product:
+
+    ||q - k||^2 = ||q||^2 + ||k||^2 - 2 q.k
+
+Rows can carry a group key (the student's department) to search a smaller
+per-department sub-index first.
+"""
+
+import logging
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingMatch(NamedTuple):
+    """One candidate for a query face"""
+    label: Any
+    distance: float
+    row: int
+
+
+class EmbeddingIndex:
+    """Immutable matrix of known face encodings with batched nearest-neighbour search"""
+
+    def __init__(self, encodings, labels: Optional[Sequence[Any]] = None,
+                 groups: Optional[Sequence[Hashable]] = None):
+        """
+        Args:
+            encodings: Sequence of equally sized encodings (or an N x D array)
+            labels: Label per row (e.g. student id); defaults to the row number
+            groups: Optional group key per row (e.g. department id)
+        """
+        matrix = np.asarray(encodings, dtype=np.float32)
+        if matrix.size == 0:
+            matrix = matrix.reshape(0, matrix.shape[-1] if matrix.ndim == 2 else 0)
+        self.matrix = np.ascontiguousarray(matrix)
+        self.matrix.setflags(write=False)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+        self.labels = list(labels) if labels is not None else list(range(len(self.matrix)))
+        if len(self.labels) != len(self.matrix):
+            raise ValueError(f"Got {len(self.labels)} labels for {len(self.matrix)} encodings")
+
+        self._groups = list(groups) if groups is not None else None
+        self._sub_indexes: Dict[Hashable, 'EmbeddingIndex'] = {}
+        if self._groups is not None:
+            rows_by_group: Dict[Hashable, List[int]] = {}
+            for row, group in enumerate(self._groups):
+                if group is not None:
+                    rows_by_group.setdefault(group, []).append(row)
+            for group, rows in rows_by_group.items():
+                self._sub_indexes[group] = EmbeddingIndex(
+                    self.matrix[rows], [self.labels[row] for row in rows]
+                )
+
+    def __len__(self):
+        return len(self.matrix)
+
+    @property
+    def groups(self) -> List[Hashable]:
+        return list(self._sub_indexes.keys())
+
+    def for_group(self, group: Hashable) -> Optional['EmbeddingIndex']:
+        """Sub-index holding only the rows of one group, or None if the group is empty"""
+        return self._sub_indexes.get(group)
+
+    def distances(self, queries) -> np.ndarray:
+        """
+        Euclidean distances between every query and every known encoding
+
+        Args:
+            queries: F x D array (or a single D vector)
+
+        Returns:
+            np.ndarray: F x N float32 distance matrix
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if len(self) == 0:
+            return np.empty((len(queries), 0), dtype=np.float32)
+
+        query_sq_norms = np.einsum('ij,ij->i', queries, queries)
+        squared = query_sq_norms[:, None] + self.sq_norms[None, :] - 2.0 * (queries @ self.matrix.T)
+        np.maximum(squared, 0.0, out=squared)
+        return np.sqrt(squared, out=squared)
+
+    def search(self, queries, k: int = 1, max_distance: Optional[float] = None) -> List[List[EmbeddingMatch]]:
+        """
+        Top-k nearest known encodings for each query
+
+        Args:
+            queries: F x D array of face encodings
+            k: Number of candidates to return per query
+            max_distance: Drop candidates further away than this
+
+        Returns:
+            list: One list of EmbeddingMatch per query, closest first
+        """
+        distances = self.distances(queries)
+        count = len(self)
+        if count == 0:
+            return [[] for _ in range(len(distances))]
+
+        k = min(k, count)
+        if k < count:
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.tile(np.arange(count), (len(distances), 1))
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        candidate_distances = np.take_along_axis(candidate_distances, order, axis=1)
+
+        results = []
+        for rows, row_distances in zip(candidates, candidate_distances):
+            matches = []
+            for row, distance in zip(rows, row_distances):
+                if max_distance is not None and distance > max_distance:
+                    break
+                matches.append(EmbeddingMatch(self.labels[row], float(distance), int(row)))
+            results.append(matches)
+        return results
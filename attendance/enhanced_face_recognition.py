@@ -22,10 +22,16 @@ from PIL import Image
 import threading
 import time
 
-from .models import Attendance, AttendanceDetection, CourseRegistration
+from .models import Attendance, CourseRegistration
 from students.models import Student, StudentPhoto
 from courses.models import ClassSession, TimetableSlot
 from .presence_tracking_service import presence_tracking_service
+from .presence_accumulator import presence_accumulator
+from .camera_sessions import camera_session_manager
+from .embedding_index import EmbeddingIndex
+from .frame_decoding import decode_frame
+from .face_detectors import FaceDetector
+from .stage_timing import StageTimer
 
 logger = logging.getLogger(__name__)
 
@@ -46,10 +52,16 @@ class EnhancedFaceRecognitionEngine:
         self.detection_interval = 30  # seconds
         self.max_faces_per_frame = 10
         
+        # Detection runs on a copy shrunk to detection_max_dimension pixels (None: full frame)
+        self.detector_backend = 'hog'
+        self.detection_max_dimension = None
+        self.face_detector = FaceDetector(self.detector_backend, self.detection_max_dimension, self.model_path)
+        
         # Model state
         self.known_face_encodings = []
         self.known_student_ids = []
         self.student_id_to_info = {}
+        self.embedding_index = EmbeddingIndex([])
         self.model_loaded = False
         self.last_model_update = None
         
@@ -84,20 +96,36 @@ class EnhancedFaceRecognitionEngine:
                     self.face_distance_threshold = config.get('face_distance_threshold', 0.6)
                     self.detection_interval = config.get('detection_interval', 30)
                     self.max_faces_per_frame = config.get('max_faces_per_frame', 10)
+                    self.face_detector = FaceDetector(
+                        config.get('detector_backend', 'hog'), config.get('detection_max_dimension'), self.model_path
+                    )
+                    self.detector_backend = self.face_detector.backend
+                    self.detection_max_dimension = self.face_detector.max_dimension
                     logger.info("Face recognition configuration loaded")
         except Exception as e:
             logger.warning(f"Could not load face recognition config: {e}")
     
     def save_configuration(self):
-        """Save current configuration to file"""
+        """
+        Save current configuration to file
+        
+        face_config.json is shared with the LBPH configuration (face_config),
+        so only this engine's keys are updated. confidence_threshold is the
+        LBPH distance threshold there and is not overwritten.
+        """
         try:
-            config = {
-                'confidence_threshold': self.confidence_threshold,
+            config = {}
+            if os.path.exists(self.config_file):
+                with open(self.config_file, 'r') as f:
+                    config = json.load(f)
+            config.update({
                 'face_distance_threshold': self.face_distance_threshold,
                 'detection_interval': self.detection_interval,
                 'max_faces_per_frame': self.max_faces_per_frame,
+                'detector_backend': self.detector_backend,
+                'detection_max_dimension': self.detection_max_dimension,
                 'last_updated': timezone.now().isoformat()
-            }
+            })
             with open(self.config_file, 'w') as f:
                 json.dump(config, f, indent=2)
             logger.info("Face recognition configuration saved")
@@ -124,8 +152,9 @@ class EnhancedFaceRecognitionEngine:
                 with open(self.student_labels_file, 'rb') as f:
                     self.known_student_ids = pickle.load(f)
                 
-                # Build student info mapping
+                # Build student info mapping and the matching index
                 self._build_student_info_mapping()
+                self._build_embedding_index()
                 
                 self.model_loaded = True
                 self.last_model_update = timezone.now()
@@ -173,6 +202,17 @@ class EnhancedFaceRecognitionEngine:
         except Exception as e:
             logger.error(f"Error building student info mapping: {e}")
     
+    def _build_embedding_index(self):
+        """Pack known encodings into a float32 matrix with per-department sub-indexes"""
+        departments = [
+            self.student_id_to_info.get(student_id, {}).get('department_id')
+            for student_id in self.known_student_ids
+        ]
+        # Replaced in one assignment; frames in flight keep the previous index
+        self.embedding_index = EmbeddingIndex(self.known_face_encodings, self.known_student_ids, departments)
+        logger.info(f"Embedding index built: {len(self.embedding_index)} encodings, "
+                    f"{len(self.embedding_index.groups)} departments")
+    
     def train_models(self, force_retrain: bool = False) -> Dict[str, Any]:
         """Train face recognition models with all available student photos"""
         try:
@@ -245,6 +285,7 @@ class EnhancedFaceRecognitionEngine:
                 self.known_face_encodings = face_encodings
                 self.known_student_ids = student_ids
                 self._build_student_info_mapping()
+                self._build_embedding_index()
                 self.model_loaded = True
                 self.last_model_update = timezone.now()
             
@@ -317,9 +358,17 @@ class EnhancedFaceRecognitionEngine:
         return encodings
     
     def process_frame(self, frame_data: str, session_id: Optional[str] = None, 
-                     department_id: Optional[str] = None) -> Dict[str, Any]:
-        """Process a single frame for face recognition"""
+                     department_id: Optional[str] = None,
+                     camera_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Process a single frame for face recognition
+
+        When camera_id is given, faces are tracked across frames of that camera
+        and encodings are only computed for new faces or faces due for
+        re-verification.
+        """
         start_time = time.time()
+        timer = StageTimer('dlib')
         
         try:
             if not self.model_loaded:
@@ -331,7 +380,8 @@ class EnhancedFaceRecognitionEngine:
                 }
             
             # Decode frame data
-            image = self._decode_frame_data(frame_data)
+            with timer.span('decode'):
+                image = self._decode_frame_data(frame_data)
             if image is None:
                 return {
                     'success': False,
@@ -341,49 +391,91 @@ class EnhancedFaceRecognitionEngine:
                 }
             
             # Find faces in the frame
-            face_locations = face_recognition.face_locations(image, model="hog")
+            with timer.span('detect'):
+                face_locations = self.face_detector.detect(image)
             
             if not face_locations:
-                return {
+                results = {
                     'success': True,
                     'message': 'No faces detected in frame',
                     'recognized_students': [],
                     'unknown_faces': 0,
                     'processing_time': time.time() - start_time
                 }
+                timer.finish(results)
+                return results
             
             # Limit number of faces processed
             if len(face_locations) > self.max_faces_per_frame:
                 face_locations = face_locations[:self.max_faces_per_frame]
             
-            # Generate encodings for detected faces
-            face_encodings = face_recognition.face_encodings(image, face_locations)
+            # Follow faces across frames of a streaming camera
+            camera_session = camera_session_manager.get_session(camera_id) if camera_id else None
+            if camera_session:
+                tracks = camera_session.track_faces([
+                    (left, top, right - left, bottom - top)
+                    for top, right, bottom, left in face_locations
+                ])
+                pending = [i for i, track in enumerate(tracks) if camera_session.should_recognize(track)]
+            else:
+                tracks = [None] * len(face_locations)
+                pending = list(range(len(face_locations)))
+            
+            # Generate encodings only for faces that need recognition
+            with timer.span('encode'):
+                face_encodings = face_recognition.face_encodings(
+                    image, [face_locations[i] for i in pending]
+                ) if pending else []
+            
+            # Match every new face of the frame in one batched search
+            with timer.span('match'):
+                results_by_index = dict(zip(pending, self._recognize_faces(face_encodings, department_id)))
             
             recognized_students = []
             unknown_faces = 0
             
             # Process each face
-            for i, face_encoding in enumerate(face_encodings):
-                recognition_result = self._recognize_face(face_encoding, face_locations[i])
+            for i, face_location in enumerate(face_locations):
+                track = tracks[i]
+                if i in results_by_index:
+                    recognition_result = results_by_index[i]
+                    if track is not None:
+                        if recognition_result['recognized']:
+                            track.record_identity(
+                                recognition_result['student_info']['student_id'],
+                                recognition_result['confidence'],
+                                recognition_result['student_info']
+                            )
+                        else:
+                            track.clear_identity()
+                else:
+                    # Identity carried over from a recent encoding on this track
+                    recognition_result = {
+                        'recognized': True,
+                        'student_info': track.identity,
+                        'confidence': track.confidence
+                    }
                 
                 if recognition_result['recognized']:
                     student_info = recognition_result['student_info']
                     
                     # Record attendance if this is a valid session
                     if session_id or department_id:
-                        self._record_attendance(
-                            student_info, 
-                            recognition_result['confidence'],
-                            session_id,
-                            department_id
-                        )
+                        with timer.span('attendance'):
+                            self._record_attendance(
+                                student_info, 
+                                recognition_result['confidence'],
+                                session_id,
+                                department_id
+                            )
                     
                     recognized_students.append({
                         'student_id': student_info['student_id'],
                         'matric_number': student_info['matric_number'],
                         'full_name': student_info['full_name'],
                         'confidence': recognition_result['confidence'],
-                        'face_location': face_locations[i],
+                        'face_location': face_location,
+                        'track_id': track.track_id if track is not None else None,
                         'timestamp': timezone.now().isoformat()
                     })
                 else:
@@ -392,14 +484,17 @@ class EnhancedFaceRecognitionEngine:
             # Update processing stats
             self._update_processing_stats(time.time() - start_time, len(recognized_students))
             
-            return {
+            results = {
                 'success': True,
                 'message': f'Processed {len(face_locations)} faces, recognized {len(recognized_students)} students',
                 'recognized_students': recognized_students,
                 'unknown_faces': unknown_faces,
                 'total_faces': len(face_locations),
+                'encoded_faces': len(pending),
                 'processing_time': time.time() - start_time
             }
+            timer.finish(results)
+            return results
             
         except Exception as e:
             logger.error(f"Error processing frame: {e}")
@@ -412,24 +507,12 @@ class EnhancedFaceRecognitionEngine:
             }
     
     def _decode_frame_data(self, frame_data: str) -> Optional[np.ndarray]:
-        """Decode base64 frame data to numpy array"""
+        """Decode base64 frame data, encoded image bytes or a BGR numpy frame to an RGB numpy array"""
         try:
-            # Remove data URL prefix if present
-            if frame_data.startswith('data:image'):
-                frame_data = frame_data.split(',')[1]
-            
-            # Decode base64
-            image_data = base64.b64decode(frame_data)
-            
-            # Convert to PIL Image
-            pil_image = Image.open(BytesIO(image_data))
-            
-            # Convert to RGB (face_recognition expects RGB)
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
+            image, _ = decode_frame(frame_data, grayscale=False)
             
-            # Convert to numpy array
-            return np.array(pil_image)
+            # face_recognition expects RGB
+            return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
         except Exception as e:
             logger.error(f"Error decoding frame data: {e}")
@@ -437,38 +520,68 @@ class EnhancedFaceRecognitionEngine:
     
     def _recognize_face(self, face_encoding: np.ndarray, face_location: Tuple) -> Dict[str, Any]:
         """Recognize a single face encoding"""
+        return self._recognize_faces([face_encoding])[0]
+    
+    def _recognize_faces(self, face_encodings: List[np.ndarray],
+                         department_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Match all face encodings of a frame against the embedding index at once
+        
+        When department_id is given, the department's sub-index is searched
+        first and only faces without a match there fall back to the full index.
+        """
+        if not face_encodings:
+            return []
+        
         try:
-            if not self.known_face_encodings:
-                return {'recognized': False, 'confidence': 0.0}
-            
-            # Compare with known faces
-            face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-            
-            # Find best match
-            best_match_index = np.argmin(face_distances)
-            best_distance = face_distances[best_match_index]
-            
-            # Check if match is good enough
-            if best_distance <= self.face_distance_threshold:
-                student_id = self.known_student_ids[best_match_index]
-                confidence = 1.0 - best_distance  # Convert distance to confidence
+            index = self.embedding_index
+            if len(index) == 0:
+                return [{'recognized': False, 'confidence': 0.0} for _ in face_encodings]
+            
+            queries = np.asarray(face_encodings, dtype=np.float32)
+            best_matches = [None] * len(queries)
+            
+            department_index = index.for_group(self._parse_department_id(department_id)) if department_id else None
+            if department_index is not None:
+                for i, matches in enumerate(department_index.search(queries, k=1)):
+                    if matches and matches[0].distance <= self.face_distance_threshold:
+                        best_matches[i] = matches[0]
+            
+            remaining = [i for i, match in enumerate(best_matches) if match is None]
+            if remaining:
+                for i, matches in zip(remaining, index.search(queries[remaining], k=1)):
+                    best_matches[i] = matches[0]
+            
+            results = []
+            for match in best_matches:
+                best_distance = match.distance
                 
-                if student_id in self.student_id_to_info:
+                # Check if match is good enough
+                if best_distance <= self.face_distance_threshold and match.label in self.student_id_to_info:
+                    student_id = match.label
                     student_info = self.student_id_to_info[student_id].copy()
                     student_info['student_id'] = student_id
                     
-                    return {
+                    results.append({
                         'recognized': True,
                         'student_info': student_info,
-                        'confidence': confidence,
+                        'confidence': 1.0 - best_distance,  # Convert distance to confidence
                         'face_distance': best_distance
-                    }
-            
-            return {'recognized': False, 'confidence': 0.0, 'face_distance': best_distance}
+                    })
+                else:
+                    results.append({'recognized': False, 'confidence': 0.0, 'face_distance': best_distance})
+            return results
             
         except Exception as e:
-            logger.error(f"Error recognizing face: {e}")
-            return {'recognized': False, 'confidence': 0.0, 'error': str(e)}
+            logger.error(f"Error recognizing faces: {e}")
+            return [{'recognized': False, 'confidence': 0.0, 'error': str(e)} for _ in face_encodings]
+    
+    @staticmethod
+    def _parse_department_id(department_id):
+        try:
+            return int(department_id)
+        except (TypeError, ValueError):
+            return department_id
     
     def _record_attendance(self, student_info: Dict, confidence: float, 
                           session_id: Optional[str], department_id: Optional[str]):
@@ -491,13 +604,10 @@ class EnhancedFaceRecognitionEngine:
                     timetable_entry=session_info.get('timetable_entry')
                 )
                 
-                # Record presence detection
-                presence_tracking_service.record_presence_detection(attendance)
-                
-                # Create detailed detection record
-                AttendanceDetection.objects.create(
-                    attendance=attendance,
-                    confidence_score=confidence,
+                # Record presence detection; written with other detections on the next flush
+                presence_accumulator.record(
+                    attendance,
+                    confidence,
                     session_context={
                         'session_id': session_id,
                         'department_id': department_id,
@@ -594,7 +704,9 @@ class EnhancedFaceRecognitionEngine:
                 'confidence_threshold': self.confidence_threshold,
                 'face_distance_threshold': self.face_distance_threshold,
                 'detection_interval': self.detection_interval,
-                'max_faces_per_frame': self.max_faces_per_frame
+                'max_faces_per_frame': self.max_faces_per_frame,
+                'detector_backend': self.detector_backend,
+                'detection_max_dimension': self.detection_max_dimension
             },
             'processing_stats': self.processing_stats.copy(),
             'model_files_exist': {
@@ -619,6 +731,16 @@ class EnhancedFaceRecognitionEngine:
             if 'max_faces_per_frame' in config:
                 self.max_faces_per_frame = int(config['max_faces_per_frame'])
             
+            if 'detector_backend' in config or 'detection_max_dimension' in config:
+                # Validated (ValueError) before anything is replaced
+                self.face_detector = FaceDetector(
+                    config.get('detector_backend', self.detector_backend),
+                    config.get('detection_max_dimension', self.detection_max_dimension),
+                    self.model_path
+                )
+                self.detector_backend = self.face_detector.backend
+                self.detection_max_dimension = self.face_detector.max_dimension
+            
             # Save configuration
             self.save_configuration()
             
@@ -629,7 +751,9 @@ class EnhancedFaceRecognitionEngine:
                     'confidence_threshold': self.confidence_threshold,
                     'face_distance_threshold': self.face_distance_threshold,
                     'detection_interval': self.detection_interval,
-                    'max_faces_per_frame': self.max_faces_per_frame
+                    'max_faces_per_frame': self.max_faces_per_frame,
+                    'detector_backend': self.detector_backend,
+                    'detection_max_dimension': self.detection_max_dimension
                 }
             }
             
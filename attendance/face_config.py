@@ -40,11 +40,16 @@ class FaceRecognitionConfig:
             self.config = self.default_config.copy()
     
     def save_config(self):
-        """Save configuration to file"""
+        """Save configuration to file, keeping keys other components store there"""
         try:
             self.config_file.parent.mkdir(exist_ok=True)
+            config = {}
+            if self.config_file.exists():
+                with open(self.config_file, 'r') as f:
+                    config = json.load(f)
+            config.update({key: self.config[key] for key in self.default_config})
             with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=2)
+                json.dump(config, f, indent=2)
         except Exception as e:
             print(f"Error saving config: {e}")
     
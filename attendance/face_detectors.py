@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Face Detector Backends with Downscaled Detection
+
+Detection cost grows with the number of pixels (HOG in particular), while
+face encodings need the full-resolution image. FaceDetector runs the
+selected backend on a copy of the frame shrunk to max_dimension pixels on
+its longest side and maps the boxes back to full resolution, in
+face_recognition's (top, right, bottom, left) order, ready for
+face_recognition.face_encodings().
+
+Backends:
+    hog:  dlib HOG detector through face_recognition (the original behaviour)
+    haar: OpenCV frontal face Haar cascade
+    dnn:  OpenCV DNN ResNet-10 SSD (ml_models/deploy.prototxt and
+          res10_300x300_ssd_iter_140000.caffemodel); falls back to hog when
+          the model files are missing
+"""
+
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DETECTOR_BACKENDS = ('hog', 'haar', 'dnn')
+
+DNN_PROTOTXT = "deploy.prototxt"
+DNN_MODEL = "res10_300x300_ssd_iter_140000.caffemodel"
+DNN_INPUT_SIZE = (300, 300)
+DNN_MEAN = (104.0, 177.0, 123.0)
+
+
+def detect_faces_dnn(net, image: np.ndarray, min_confidence: float = 0.7) -> List[dict]:
+    """
+    Detect faces with OpenCV's DNN SSD face detector
+
+    Returns:
+        list: {'box': [x, y, w, h], 'confidence': float} clipped to the image
+    """
+    (h, w) = image.shape[:2]
+    blob = cv2.dnn.blobFromImage(cv2.resize(image, DNN_INPUT_SIZE), 1.0, DNN_INPUT_SIZE, DNN_MEAN)
+
+    net.setInput(blob)
+    detections = net.forward()
+
+    results = []
+    for i in range(0, detections.shape[2]):
+        confidence = detections[0, 0, i, 2]
+
+        if confidence > min_confidence:
+            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
+            (startX, startY, endX, endY) = box.astype("int")
+
+            # Ensure the bounding boxes fall within the dimensions of the frame
+            (startX, startY) = (max(0, startX), max(0, startY))
+            (endX, endY) = (min(w - 1, endX), min(h - 1, endY))
+
+            results.append({
+                'box': [int(startX), int(startY), int(endX - startX), int(endY - startY)],
+                'confidence': float(confidence)
+            })
+
+    return results
+
+
+def downscale(image: np.ndarray, max_dimension: Optional[int]) -> Tuple[np.ndarray, float]:
+    """
+    Copy of image whose longest side is at most max_dimension
+
+    Returns:
+        tuple: (image, scale) where full-resolution coordinates = detection coordinates * scale
+    """
+    longest = max(image.shape[:2])
+    if not max_dimension or longest <= max_dimension:
+        return image, 1.0
+    factor = max_dimension / longest
+    size = (max(1, round(image.shape[1] * factor)), max(1, round(image.shape[0] * factor)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), longest / max_dimension
+
+
+def scale_location(location: Tuple[int, int, int, int], scale: float,
+                   shape: Tuple[int, ...]) -> Tuple[int, int, int, int]:
+    """Map a (top, right, bottom, left) box from the detection image to the full image"""
+    top, right, bottom, left = location
+    if scale == 1.0:
+        return int(top), int(right), int(bottom), int(left)
+    height, width = shape[:2]
+    return (
+        max(0, int(round(top * scale))),
+        min(width, int(round(right * scale))),
+        min(height, int(round(bottom * scale))),
+        max(0, int(round(left * scale)))
+    )
+
+
+class FaceDetector:
+    """Detects faces with a configurable backend on a downscaled copy of the frame"""
+
+    HAAR_SCALE_FACTOR = 1.1
+    HAAR_MIN_NEIGHBORS = 5
+    HAAR_MIN_SIZE = (20, 20)
+
+    def __init__(self, backend: str = 'hog', max_dimension: Optional[int] = None,
+                 models_dir: Optional[str] = None, dnn_min_confidence: float = 0.7):
+        if backend not in DETECTOR_BACKENDS:
+            raise ValueError(f"Unknown detector backend '{backend}', expected one of {', '.join(DETECTOR_BACKENDS)}")
+        if max_dimension is not None and int(max_dimension) <= 0:
+            raise ValueError("max_dimension must be a positive number of pixels or None")
+        self.backend = backend
+        self.max_dimension = int(max_dimension) if max_dimension else None
+        self.models_dir = models_dir
+        self.dnn_min_confidence = dnn_min_confidence
+
+        self._haar = None
+        self._dnn_net = None
+        self._dnn_missing = False
+        self._lock = threading.Lock()  # cv2.dnn.Net is not safe for concurrent forward()
+
+    def detect(self, rgb_image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """(top, right, bottom, left) face boxes in full-resolution coordinates"""
+        image, scale = downscale(rgb_image, self.max_dimension)
+        if self.backend == 'haar':
+            locations = self._detect_haar(image)
+        elif self.backend == 'dnn' and self._get_dnn_net() is not None:
+            locations = self._detect_dnn(image)
+        else:
+            locations = self._detect_hog(image)
+        return [scale_location(location, scale, rgb_image.shape) for location in locations]
+
+    def _detect_hog(self, image):
+        import face_recognition
+        return face_recognition.face_locations(image, model="hog")
+
+    def _detect_haar(self, image):
+        if self._haar is None:
+            self._haar = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        faces = self._haar.detectMultiScale(
+            gray,
+            scaleFactor=self.HAAR_SCALE_FACTOR,
+            minNeighbors=self.HAAR_MIN_NEIGHBORS,
+            minSize=self.HAAR_MIN_SIZE
+        )
+        return [(y, x + w, y + h, x) for (x, y, w, h) in faces]
+
+    def _detect_dnn(self, image):
+        # The SSD was trained on BGR input
+        bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        with self._lock:
+            detections = detect_faces_dnn(self._dnn_net, bgr, self.dnn_min_confidence)
+        return [(y, x + w, y + h, x) for (x, y, w, h) in (d['box'] for d in detections)]
+
+    def _get_dnn_net(self):
+        if self._dnn_net is None and not self._dnn_missing:
+            prototxt = os.path.join(self.models_dir or "ml_models", DNN_PROTOTXT)
+            model = os.path.join(self.models_dir or "ml_models", DNN_MODEL)
+            if os.path.exists(prototxt) and os.path.exists(model):
+                self._dnn_net = cv2.dnn.readNetFromCaffe(prototxt, model)
+            else:
+                logger.warning("DNN face detector model files not found, falling back to HOG detection")
+                self._dnn_missing = True
+        return self._dnn_net
+
+    def describe(self) -> dict:
+        return {
+            'detector_backend': self.backend,
+            'detection_max_dimension': self.max_dimension,
+            'dnn_available': self._get_dnn_net() is not None if self.backend == 'dnn' else None
+        }
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Face Training Feature Store
+
+Detecting and cropping faces in student photos is the expensive part of
+training, and the photos rarely change between runs. The cropped,
+resized face ROIs of each photo are stored as an .npz file keyed by a
+hash of the photo's bytes and the detection parameters, so a retrain
+only runs the Haar cascade on photos it has not seen before.
+
+Augmentation is applied to all ROIs of a student at once: rotations are
+done by one warpAffine over the ROIs stacked as channels, and brightness,
+flips and noise are plain numpy operations over the whole batch.
+
+This module deliberately has no Django imports, so student directories
+can be processed in spawned worker processes.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png")
+MAX_WARP_CHANNELS = 512  # OpenCV's channel limit per Mat
+
+_face_cascade = None
+
+
+def _get_face_cascade():
+    global _face_cascade
+    if _face_cascade is None:
+        _face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    return _face_cascade
+
+
+class FaceFeatureStore:
+    """Content-addressed store of cropped face ROIs per photo"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def key_for(self, photo_bytes: bytes, config: Dict[str, Any]) -> str:
+        """Hash of the photo and every parameter that affects its ROIs"""
+        digest = hashlib.sha256(photo_bytes)
+        digest.update(repr((tuple(config["img_size"]), config["scale_factor"], config["min_neighbors"])).encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.npz"
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as data:
+                return data["rois"]
+        except Exception as e:
+            logger.warning(f"Discarding unreadable feature file {path}: {e}")
+            return None
+
+    def put(self, key: str, rois: np.ndarray):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write next to the destination and rename, so parallel workers never see partial files
+        fd, tmp_path = tempfile.mkstemp(suffix=".npz", dir=path.parent)
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, rois=rois)
+        os.replace(tmp_path, path)
+
+
+def detect_photo_rois(photo_bytes: bytes, config: Dict[str, Any]) -> np.ndarray:
+    """Grayscale face crops of one photo, resized to the training size (N x H x W)"""
+    width, height = config["img_size"]
+    image = cv2.imdecode(np.frombuffer(photo_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError("Could not decode photo")
+
+    faces = _get_face_cascade().detectMultiScale(
+        image,
+        scaleFactor=config["scale_factor"],
+        minNeighbors=config["min_neighbors"]
+    )
+    rois = [cv2.resize(image[y:y+h, x:x+w], (width, height)) for (x, y, w, h) in faces]
+    if not rois:
+        return np.empty((0, height, width), dtype=np.uint8)
+    return np.stack(rois)
+
+
+def augment_faces(rois: np.ndarray, augmentation_config: Dict[str, Any]) -> np.ndarray:
+    """
+    Original ROIs followed by their configured augmentations, as one batch
+
+    Produces the same variants as the per-face loop the trainer used:
+    rotations, brightness variations, horizontal flips and noise.
+    """
+    if len(rois) == 0:
+        return rois
+
+    count, rows, cols = rois.shape
+    batches = [rois]
+
+    # Rotations: one warpAffine over the ROIs stacked as channels
+    stacked = np.ascontiguousarray(rois.transpose(1, 2, 0))
+    for angle in augmentation_config["rotations"]:
+        rotation_matrix = cv2.getRotationMatrix2D((cols/2, rows/2), angle, 1)
+        rotated = [
+            cv2.warpAffine(stacked[:, :, start:start + MAX_WARP_CHANNELS], rotation_matrix, (cols, rows))
+            for start in range(0, count, MAX_WARP_CHANNELS)
+        ]
+        rotated = np.concatenate([r.reshape(rows, cols, -1) for r in rotated], axis=2)
+        batches.append(rotated.transpose(2, 0, 1))
+
+    # Brightness variations (saturating like cv2.convertScaleAbs)
+    as_float = rois.astype(np.float32)
+    for brightness in augmentation_config["brightness_variations"]:
+        batches.append(np.clip(np.rint(as_float * brightness), 0, 255).astype(np.uint8))
+
+    # Horizontal flips
+    if augmentation_config["enable_flipping"]:
+        batches.append(rois[:, :, ::-1])
+
+    # Additive noise (saturating like cv2.add)
+    if augmentation_config["enable_noise"]:
+        noise = np.random.randint(0, 25, rois.shape, dtype=np.uint16)
+        batches.append(np.minimum(rois.astype(np.uint16) + noise, 255).astype(np.uint8))
+
+    return np.ascontiguousarray(np.concatenate(batches))
+
+
+def extract_student_dir(student_dir, config: Dict[str, Any], augmentation_config: Dict[str, Any],
+                        store_root) -> Dict[str, Any]:
+    """
+    Training samples for one student's photo directory (runs in a worker process)
+
+    Returns:
+        dict: matric_number, samples (N x H x W uint8), photos, photos_detected
+              (photos that needed the cascade) and errors
+    """
+    student_dir = Path(student_dir)
+    store = FaceFeatureStore(store_root)
+    rois = []
+    detected = 0
+    errors = []
+    photos = sorted(p for p in student_dir.iterdir() if p.suffix.lower() in PHOTO_EXTENSIONS)
+
+    for photo in photos:
+        try:
+            photo_bytes = photo.read_bytes()
+            key = store.key_for(photo_bytes, config)
+            photo_rois = store.get(key)
+            if photo_rois is None:
+                photo_rois = detect_photo_rois(photo_bytes, config)
+                store.put(key, photo_rois)
+                detected += 1
+            rois.extend(photo_rois)
+        except Exception as e:
+            errors.append(f"{photo.name}: {e}")
+
+    width, height = config["img_size"]
+    roi_batch = np.stack(rois) if rois else np.empty((0, height, width), dtype=np.uint8)
+    return {
+        'matric_number': student_dir.name,
+        'samples': augment_faces(roi_batch, augmentation_config),
+        'photos': len(photos),
+        'photos_detected': detected,
+        'errors': errors
+    }
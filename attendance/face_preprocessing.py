@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Batched Face Preprocessing
+
+The recognition service preprocesses every face it predicts: gamma
+correction, CLAHE, bilateral denoising, sharpening, min-max normalization
+and a resize to the model's input size. Building the gamma lookup table,
+the CLAHE object and the sharpening kernel for each face cost more Python
+time than the OpenCV calls themselves on 35-face frames.
+
+Lookup tables are built once per gamma value, CLAHE objects are kept per
+thread (they are not safe to share between threads), and the faces of a
+batch are resized straight into one preallocated (N, height, width)
+array, which then goes through contrast enhancement and prediction as a
+whole.
+"""
+
+import threading
+from functools import lru_cache
+from typing import Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Sharpening kernel for distant faces
+SHARPEN_KERNEL = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]], dtype=np.float32)
+
+_local = threading.local()
+
+
+@lru_cache(maxsize=16)
+def gamma_lut(gamma: float) -> np.ndarray:
+    """256-entry uint8 gamma correction table"""
+    table = ((np.arange(256) / 255.0) ** (1.0 / gamma) * 255).astype(np.uint8)
+    table.setflags(write=False)
+    return table
+
+
+def apply_gamma(image: np.ndarray, gamma: float) -> np.ndarray:
+    return cv2.LUT(image, gamma_lut(gamma))
+
+
+def get_clahe(clip_limit: float, tile_grid_size: Tuple[int, int]):
+    """CLAHE object of this thread for the given parameters"""
+    cache = getattr(_local, 'clahe', None)
+    if cache is None:
+        cache = _local.clahe = {}
+    key = (clip_limit, tile_grid_size)
+    clahe = cache.get(key)
+    if clahe is None:
+        clahe = cache[key] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+    return clahe
+
+
+def enhance_contrast(faces: np.ndarray, alpha: float = 1.2, beta: float = 10) -> np.ndarray:
+    """Contrast-stretched copy of a face or a whole (N, height, width) batch"""
+    if faces.size == 0:
+        return faces.copy()
+    flat = faces.reshape(-1, faces.shape[-1])
+    return cv2.convertScaleAbs(flat, alpha=alpha, beta=beta).reshape(faces.shape)
+
+
+class FacePreprocessor:
+    """Preprocesses face ROIs into fixed-size model inputs"""
+
+    GAMMA = 1.3  # Gamma correction for poor lighting
+    CLAHE_CLIP_LIMIT = 3.5  # Aggressive CLAHE for local contrast
+    CLAHE_TILE_GRID = (4, 4)
+
+    def __init__(self, img_size: Tuple[int, int] = (100, 100)):
+        self.img_size = img_size  # (width, height)
+
+    def preprocess(self, face_roi: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """Enhanced face preprocessing optimized for poor lighting and distant faces"""
+        gamma_corrected = apply_gamma(face_roi, self.GAMMA)
+        enhanced = get_clahe(self.CLAHE_CLIP_LIMIT, self.CLAHE_TILE_GRID).apply(gamma_corrected)
+        # Bilateral filtering reduces noise while preserving edges
+        denoised = cv2.bilateralFilter(enhanced, 5, 50, 50)
+        sharpened = cv2.filter2D(denoised, -1, SHARPEN_KERNEL)
+        normalized = cv2.normalize(sharpened, None, 0, 255, cv2.NORM_MINMAX)
+        # Resize to standard size with high-quality interpolation
+        if out is None:
+            return cv2.resize(normalized, self.img_size, interpolation=cv2.INTER_CUBIC)
+        cv2.resize(normalized, self.img_size, dst=out, interpolation=cv2.INTER_CUBIC)
+        return out
+
+    def preprocess_batch(self, face_rois: Sequence[np.ndarray]) -> np.ndarray:
+        """Preprocess face ROIs into one (N, height, width) uint8 array"""
+        width, height = self.img_size
+        batch = np.empty((len(face_rois), height, width), dtype=np.uint8)
+        for face_roi, out in zip(face_rois, batch):
+            self.preprocess(face_roi, out=out)
+        return batch
@@ -7,21 +7,28 @@ Integrates with Django models, Timetables, and Student Course Selections
 import cv2
 import pickle
 import numpy as np
-import base64
-import io
+from time import perf_counter
 from datetime import datetime, date, time
 from pathlib import Path
-from PIL import Image
 import logging
 
 # Django imports
 from django.conf import settings
 from django.utils import timezone
 from students.models import Student, StudentCourseSelection, StudentLevelSelection
-from attendance.models import Attendance, CourseRegistration
+from attendance.models import Attendance
 from courses.models import TimetableSlot, Timetable
 from academics.models import Course
 from live_sessions.models import LiveSession, LiveSessionParticipant
+from attendance.camera_sessions import camera_session_manager
+from attendance.roster_index import roster_index, roster_version, shard_keys_for
+from attendance.attendance_buffer import attendance_buffer
+from attendance.model_registry import model_registry, LBPH_MODEL
+from attendance.detection_planner import DetectionPlanner, timed_ms
+from attendance.frame_decoding import decode_frame, scale_box
+from attendance.recognition_cache import RecognitionCache, CachedStudent
+from attendance.stage_timing import StageTimer
+from attendance.face_preprocessing import FacePreprocessor, apply_gamma, enhance_contrast, get_clahe
 
 logger = logging.getLogger(__name__)
 
@@ -43,55 +50,57 @@ class FaceRecognitionService:
         self.FACE_QUALITY_THRESHOLD = 0.15  # Very low threshold for group detection
         self.BATCH_PROCESSING_SIZE = 8  # Smaller batches for better performance
         
-        # Initialize components
-        self.recognizer = None
-        self.label_map = {}
-        self.id_to_matric = {}
+        # Cascade passes: (name, cascade, scale factor, min neighbors, preprocessed image)
+        self.DETECTION_PASSES = [
+            # Configuration for distant faces (3-5 meters)
+            ('frontal_1.03_denoised', 'frontal', 1.03, 3, 'denoised'),
+            ('frontal_1.05_contrast', 'frontal', 1.05, 4, 'enhanced_contrast'),
+            ('frontal_1.08_gamma', 'frontal', 1.08, 5, 'gamma_corrected'),
+            # Configuration for medium distance faces
+            ('frontal_1.1_denoised', 'frontal', 1.1, 4, 'denoised'),
+            ('frontal_1.15_contrast', 'frontal', 1.15, 5, 'enhanced_contrast'),
+            # Configuration for closer faces (front rows)
+            ('frontal_1.2_gray', 'frontal', 1.2, 6, 'gray'),
+            # Profile faces with enhanced parameters for classroom
+            ('profile_1.05_denoised', 'profile', 1.05, 3, 'denoised'),
+            ('profile_1.05_contrast', 'profile', 1.05, 3, 'enhanced_contrast'),
+        ]
+        self.DETECTION_BUDGET_MS = getattr(settings, 'FACE_DETECTION_BUDGET_MS', None)
+        self.DETECTION_MAX_DIMENSION = getattr(settings, 'FACE_DETECTION_MAX_DIMENSION', None)
+        # Planner for frames that do not come from a streaming camera
+        self.detection_planner = DetectionPlanner(
+            [name for name, *_ in self.DETECTION_PASSES], self.DETECTION_BUDGET_MS
+        )
+        
+        # Initialize components (the LBPH model itself lives in the model registry)
         self.face_cascade = None
         self.profile_cascade = None  # For side profile detection
         
-        # Performance tracking
-        self.recognition_cache = {}  # Cache recent recognitions
+        # Cache recent recognitions per camera face track / position
         self.cache_timeout = 5  # seconds
+        self.recognition_cache = RecognitionCache(ttl=self.cache_timeout)
         
-        # Session tracking
-        self.recognized_today = {}
+        # Reusable LUTs/CLAHE; faces of a batch are preprocessed into one array
+        self.face_preprocessor = FacePreprocessor(self.IMG_SIZE)
         
         self._load_models()
     
     def _load_models(self):
-        """Load face recognition models and cascade classifier"""
+        """
+        Load cascade classifiers and check the trained model is available
+        
+        The LBPH model and labels are loaded lazily, once per process, by the
+        model registry on the first frame.
+        """
         try:
-            # Load face recognizer with optimized parameters
-            self.recognizer = cv2.face.LBPHFaceRecognizer_create(
-                radius=2,        # Increased for better texture analysis
-                neighbors=12,    # More neighbors for better accuracy
-                grid_x=10,       # Higher grid resolution
-                grid_y=10,
-                threshold=self.CONFIDENCE_THRESHOLD
-            )
-            
             if not self.model_file.exists():
                 logger.error(f"Model file not found: {self.model_file}")
                 raise FileNotFoundError("Face recognition model not found. Please train the model first.")
             
-            self.recognizer.read(str(self.model_file))
-            logger.info("Enhanced face recognition model loaded successfully")
-            
-            # Load label mappings
             if not self.labels_file.exists():
                 logger.error(f"Labels file not found: {self.labels_file}")
                 raise FileNotFoundError("Labels file not found. Please train the model first.")
             
-            with open(self.labels_file, "rb") as f:
-                self.label_map = pickle.load(f)
-            
-            # Create reverse mapping (label_id -> matric_number)
-            self.id_to_matric = {v: k for k, v in self.label_map.items()}
-            
-            logger.info(f"Loaded {len(self.label_map)} student labels")
-            logger.info(f"Label mappings: {self.label_map}")
-            
             # Load face cascades (frontal and profile)
             self.face_cascade = cv2.CascadeClassifier(self.cascade_path)
             if self.face_cascade.empty():
@@ -107,6 +116,23 @@ class FaceRecognitionService:
             logger.error(f"Failed to load face recognition models: {e}")
             raise
     
+    @property
+    def lbph_model(self):
+        """Current LBPH model snapshot from the process-wide registry"""
+        return model_registry.get(LBPH_MODEL).model
+    
+    @property
+    def recognizer(self):
+        return self.lbph_model.recognizer
+    
+    @property
+    def label_map(self):
+        return self.lbph_model.label_map
+    
+    @property
+    def id_to_matric(self):
+        return self.lbph_model.id_to_matric
+    
     def _calculate_face_quality(self, face_roi):
         """Calculate face quality score based on various factors"""
         if face_roi.size == 0:
@@ -130,124 +156,115 @@ class FaceRecognitionService:
     
     def _preprocess_face(self, face_roi):
         """Enhanced face preprocessing optimized for poor lighting and distant faces"""
-        # Multi-stage enhancement for challenging conditions
-        
-        # Stage 1: Gamma correction for poor lighting
-        gamma_corrected = self._apply_gamma_correction(face_roi, gamma=1.3)
-        
-        # Stage 2: Aggressive CLAHE for local contrast
-        clahe = cv2.createCLAHE(clipLimit=3.5, tileGridSize=(4, 4))
-        enhanced = clahe.apply(gamma_corrected)
-        
-        # Stage 3: Bilateral filtering to reduce noise while preserving edges
-        denoised = cv2.bilateralFilter(enhanced, 5, 50, 50)
-        
-        # Stage 4: Sharpening for distant faces
-        kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-        sharpened = cv2.filter2D(denoised, -1, kernel)
-        
-        # Stage 5: Normalize intensity
-        normalized = cv2.normalize(sharpened, None, 0, 255, cv2.NORM_MINMAX)
-        
-        # Resize to standard size with high-quality interpolation
-        resized = cv2.resize(normalized, self.IMG_SIZE, interpolation=cv2.INTER_CUBIC)
-        
-        return resized
+        # Gamma, CLAHE, bilateral denoise, sharpen, normalize and resize
+        return self.face_preprocessor.preprocess(face_roi)
+    
+    def _get_detection_planner(self, camera_session=None):
+        """Detection planner of a streaming camera, or the shared one for single frames"""
+        if camera_session is None:
+            return self.detection_planner
+        with camera_session.lock:
+            if camera_session.detection_planner is None:
+                camera_session.detection_planner = DetectionPlanner(
+                    [name for name, *_ in self.DETECTION_PASSES], self.DETECTION_BUDGET_MS
+                )
+            return camera_session.detection_planner
     
-    def _detect_faces_multi_scale(self, gray):
+    def _detect_faces_multi_scale(self, gray, planner=None):
         """Enhanced face detection optimized for classroom conditions (50+ students, 3-5m distance, poor lighting)"""
+        planner = planner or self.detection_planner
+        detection_start = perf_counter()
         all_faces = []
-        
-        # Apply advanced preprocessing for poor lighting conditions
-        # 1. Gamma correction for better visibility in poor lighting
-        gamma_corrected = self._apply_gamma_correction(gray, gamma=1.5)
-        
-        # 2. Multi-level CLAHE for extreme contrast enhancement
-        clahe_aggressive = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(4, 4))
-        enhanced_contrast = clahe_aggressive.apply(gamma_corrected)
-        
-        # 3. Bilateral filter to reduce noise while preserving edges
-        denoised = cv2.bilateralFilter(enhanced_contrast, 9, 75, 75)
-        
-        # Multiple detection passes with different parameters for classroom distance
-        detection_configs = [
-            # Configuration for distant faces (3-5 meters)
-            {'scale': 1.03, 'neighbors': 3, 'image': denoised},
-            {'scale': 1.05, 'neighbors': 4, 'image': enhanced_contrast},
-            {'scale': 1.08, 'neighbors': 5, 'image': gamma_corrected},
-            
-            # Configuration for medium distance faces
-            {'scale': 1.1, 'neighbors': 4, 'image': denoised},
-            {'scale': 1.15, 'neighbors': 5, 'image': enhanced_contrast},
-            
-            # Configuration for closer faces (front rows)
-            {'scale': 1.2, 'neighbors': 6, 'image': gray},
-        ]
-        
-        for config in detection_configs:
-            faces = self.face_cascade.detectMultiScale(
-                config['image'],
-                scaleFactor=config['scale'],
-                minNeighbors=config['neighbors'],
-                minSize=self.MIN_FACE_SIZE,
-                maxSize=self.MAX_FACE_SIZE,
-                flags=cv2.CASCADE_SCALE_IMAGE | cv2.CASCADE_DO_CANNY_PRUNING
-            )
-            all_faces.extend(faces)
-        
-        # Detect profile faces with enhanced parameters for classroom
-        if self.profile_cascade and not self.profile_cascade.empty():
-            for enhanced_img in [denoised, enhanced_contrast]:
-                profile_faces = self.profile_cascade.detectMultiScale(
-                    enhanced_img,
-                    scaleFactor=1.05,
-                    minNeighbors=3,  # Lower for distant profile faces
+        face_sources = []
+        
+        # Preprocessed images are built lazily, only for the passes that run
+        images = {'gray': gray}
+        
+        def get_image(key):
+            if key not in images:
+                if key == 'gamma_corrected':
+                    # 1. Gamma correction for better visibility in poor lighting
+                    images[key] = self._apply_gamma_correction(gray, gamma=1.5)
+                elif key == 'enhanced_contrast':
+                    # 2. Multi-level CLAHE for extreme contrast enhancement
+                    images[key] = get_clahe(4.0, (4, 4)).apply(get_image('gamma_corrected'))
+                elif key == 'denoised':
+                    # 3. Bilateral filter to reduce noise while preserving edges
+                    images[key] = cv2.bilateralFilter(get_image('enhanced_contrast'), 9, 75, 75)
+            return images[key]
+        
+        has_profile_cascade = self.profile_cascade is not None and not self.profile_cascade.empty()
+        passes = {name: (cascade, scale, neighbors, image_key)
+                  for name, cascade, scale, neighbors, image_key in self.DETECTION_PASSES}
+        
+        for name in planner.plan():
+            cascade, scale, neighbors, image_key = passes[name]
+            if cascade == 'profile':
+                if not has_profile_cascade:
+                    continue
+                pass_start = perf_counter()
+                faces = self.profile_cascade.detectMultiScale(
+                    get_image(image_key),
+                    scaleFactor=scale,
+                    minNeighbors=neighbors,  # Lower for distant profile faces
                     minSize=self.MIN_FACE_SIZE,
                     maxSize=self.MAX_FACE_SIZE
                 )
-                all_faces.extend(profile_faces)
-        
-        # Advanced Non-Maximum Suppression for classroom density
-        if len(all_faces) > 0:
-            faces_array = np.array(all_faces)
-            
-            # Convert to (x, y, x2, y2) format for NMS
-            boxes = []
-            scores = []
-            for (x, y, w, h) in faces_array:
-                boxes.append([x, y, x + w, y + h])
-                # Calculate confidence score based on face size (larger = closer = higher confidence)
-                size_score = (w * h) / (self.MAX_FACE_SIZE[0] * self.MAX_FACE_SIZE[1])
-                scores.append(min(size_score * 2, 1.0))
-            
-            if len(boxes) > 0:
-                boxes = np.array(boxes, dtype=np.float32)
-                scores = np.array(scores, dtype=np.float32)
-                
-                # Aggressive NMS for dense classroom
-                indices = cv2.dnn.NMSBoxes(
-                    boxes.tolist(), 
-                    scores.tolist(),
-                    score_threshold=0.1,  # Lower threshold for distant faces
-                    nms_threshold=0.2     # More aggressive overlap removal
+            else:
+                pass_start = perf_counter()
+                faces = self.face_cascade.detectMultiScale(
+                    get_image(image_key),
+                    scaleFactor=scale,
+                    minNeighbors=neighbors,
+                    minSize=self.MIN_FACE_SIZE,
+                    maxSize=self.MAX_FACE_SIZE,
+                    flags=cv2.CASCADE_SCALE_IMAGE | cv2.CASCADE_DO_CANNY_PRUNING
                 )
-                
-                if len(indices) > 0:
-                    indices = indices.flatten()
-                    filtered_faces = [all_faces[i] for i in indices]
-                    
-                    # Sort by face size (larger faces first - likely closer/clearer)
-                    filtered_faces.sort(key=lambda face: face[2] * face[3], reverse=True)
-                    
-                    return filtered_faces[:self.MAX_FACES_PER_FRAME]
+            planner.record_pass(name, timed_ms(pass_start))
+            all_faces.extend(faces)
+            face_sources.extend([name] * len(faces))
+        
+        kept = self._suppress_overlapping_faces(all_faces)
+        
+        contributions = {}
+        for i in kept:
+            contributions[face_sources[i]] = contributions.get(face_sources[i], 0) + 1
+        planner.record_frame(contributions, timed_ms(detection_start))
         
-        return all_faces[:self.MAX_FACES_PER_FRAME]
+        filtered_faces = [all_faces[i] for i in kept]
+        # Sort by face size (larger faces first - likely closer/clearer)
+        filtered_faces.sort(key=lambda face: face[2] * face[3], reverse=True)
+        return filtered_faces[:self.MAX_FACES_PER_FRAME]
+    
+    def _suppress_overlapping_faces(self, all_faces):
+        """Indices of the detections kept by non-maximum suppression"""
+        if len(all_faces) == 0:
+            return []
+        
+        # Advanced Non-Maximum Suppression for classroom density
+        boxes = []
+        scores = []
+        for (x, y, w, h) in all_faces:
+            boxes.append([int(x), int(y), int(x + w), int(y + h)])
+            # Calculate confidence score based on face size (larger = closer = higher confidence)
+            size_score = (w * h) / (self.MAX_FACE_SIZE[0] * self.MAX_FACE_SIZE[1])
+            scores.append(float(min(size_score * 2, 1.0)))
+        
+        # Aggressive NMS for dense classroom
+        indices = cv2.dnn.NMSBoxes(
+            boxes,
+            scores,
+            score_threshold=0.1,  # Lower threshold for distant faces
+            nms_threshold=0.2     # More aggressive overlap removal
+        )
+        
+        if len(indices) > 0:
+            return [int(i) for i in np.array(indices).flatten()]
+        return list(range(len(all_faces)))
     
     def _apply_gamma_correction(self, image, gamma=1.0):
         """Apply gamma correction for better visibility in poor lighting"""
-        inv_gamma = 1.0 / gamma
-        table = np.array([((i / 255.0) ** inv_gamma) * 255 for i in np.arange(0, 256)]).astype("uint8")
-        return cv2.LUT(image, table)
+        return apply_gamma(image, gamma)
     
     def _estimate_distance(self, face_width, face_height):
         """Estimate distance category based on face size"""
@@ -296,65 +313,49 @@ class FaceRecognitionService:
         
         return active_slots
     
-    def get_students_for_timetable_slot(self, timetable_slot):
-        """
-        Get students who should be present for a specific timetable slot
-        
-        Args:
-            timetable_slot: TimetableSlot instance
-            
-        Returns:
-            QuerySet: Students who have selected this course and are offering it
-        """
-        return Student.objects.filter(
-            course_selections__course=timetable_slot.course,
-            course_selections__level=timetable_slot.level,
-            course_selections__is_offered=True,
-            course_selections__is_approved=True,
-            department=timetable_slot.timetable.department,
-            is_active=True,
-            is_approved=True
-        ).distinct()
-    
-    def process_frame(self, frame_data, session_id=None, department_id=None):
+    def process_frame(self, frame_data, session_id=None, department_id=None, camera_id=None):
         """
         Enhanced frame processing for multiple simultaneous face recognition
         
         Args:
-            frame_data: Base64 encoded image data or numpy array
+            frame_data: Base64 encoded image data, encoded image bytes or numpy array
             session_id: Optional live session ID for attendance linking
             department_id: Optional department ID to filter timetable slots
+            camera_id: Optional camera identifier; tracked faces of a streaming
+                camera are only re-recognized every few frames
             
         Returns:
             dict: Processing results with detected faces and recognized students
         """
+        timer = StageTimer('lbph')
         try:
-            # Convert frame data to OpenCV format
-            if isinstance(frame_data, str):
-                # Base64 encoded image
-                image_data = base64.b64decode(frame_data.split(',')[1])
-                image = Image.open(io.BytesIO(image_data))
-                frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            else:
-                # Assume numpy array
-                frame = frame_data
-            
-            # Enhanced preprocessing for better face detection
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Apply multiple preprocessing techniques
-            # 1. Histogram equalization for better contrast
-            gray_eq = cv2.equalizeHist(gray)
+            # One model snapshot per frame, unaffected by concurrent reloads
+            lbph_handle = model_registry.get(LBPH_MODEL)
+            lbph = lbph_handle.model
             
-            # 2. CLAHE for local contrast enhancement
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-            gray_clahe = clahe.apply(gray)
+            # Decode straight to grayscale; very large frames are decoded at a
+            # reduced resolution and boxes are scaled back with frame_scale
+            with timer.span('decode'):
+                gray, frame_scale = decode_frame(frame_data, grayscale=True,
+                                                 max_dimension=self.DETECTION_MAX_DIMENSION)
             
-            # 3. Combine both techniques
-            gray_enhanced = cv2.addWeighted(gray_eq, 0.5, gray_clahe, 0.5, 0)
+            # Enhanced preprocessing for better face detection
+            with timer.span('enhance'):
+                # Apply multiple preprocessing techniques
+                # 1. Histogram equalization for better contrast
+                gray_eq = cv2.equalizeHist(gray)
+                
+                # 2. CLAHE for local contrast enhancement
+                gray_clahe = get_clahe(3.0, (8, 8)).apply(gray)
+                
+                # 3. Combine both techniques
+                gray_enhanced = cv2.addWeighted(gray_eq, 0.5, gray_clahe, 0.5, 0)
             
-            # Detect faces using enhanced multi-scale detection
-            faces = self._detect_faces_multi_scale(gray_enhanced)
+            # Detect faces using the camera's planned multi-scale detection passes
+            camera_session = camera_session_manager.get_session(camera_id) if camera_id else None
+            planner = self._get_detection_planner(camera_session)
+            with timer.span('detect'):
+                faces = self._detect_faces_multi_scale(gray_enhanced, planner)
             
             # Get current active timetable slots
             active_slots = self.get_current_timetable_slots()
@@ -373,36 +374,33 @@ class FaceRecognitionService:
                     'total_faces_detected': len(faces),
                     'faces_processed': 0,
                     'high_quality_faces': 0,
-                    'successful_recognitions': 0
+                    'successful_recognitions': 0,
+                    'tracked_faces': 0,
+                    'cached_faces': 0,
+                    'detection': planner.get_stats()
                 }
             }
             
-            # Add active timetable slot information
-            for slot in active_slots:
-                expected_students = self.get_students_for_timetable_slot(slot)
-                slot_info = {
-                    'id': slot.id,
-                    'course_code': slot.course.code,
-                    'course_title': slot.course.title,
-                    'level': slot.level.name,
-                    'department': slot.timetable.department.name,
-                    'lecturer': slot.lecturer.user.get_full_name(),
-                    'time_slot': f"{slot.start_time} - {slot.end_time}",
-                    'venue': slot.venue,
-                    'expected_students_count': expected_students.count()
-                }
-                results['active_timetable_slots'].append(slot_info)
+            # Add active timetable slot information from the cached rosters
+            with timer.span('timetable'):
+                slot_rosters = [(slot, roster_index.get_roster(slot)) for slot in active_slots]
+            expected_matrics = set()
+            for slot, roster in slot_rosters:
+                results['active_timetable_slots'].append(roster.slot_info)
                 
                 # Add expected students for this slot
-                for student in expected_students:
-                    if student.matric_number not in [s['matric_number'] for s in results['expected_students']]:
-                        results['expected_students'].append({
-                            'student_id': student.id,
-                            'matric_number': student.matric_number,
-                            'full_name': student.full_name,
-                            'course_code': slot.course.code,
-                            'level': slot.level.name
-                        })
+                for matric_number, summary in roster.students_by_matric.items():
+                    if matric_number not in expected_matrics:
+                        expected_matrics.add(matric_number)
+                        results['expected_students'].append(summary)
+            
+            results['roster_version'] = roster_version(roster for _, roster in slot_rosters)
+            
+            # Only the department/level shards of the active slots are searched
+            shard_keys = shard_keys_for(roster for _, roster in slot_rosters)
+            results['processing_stats']['lbph_shards'] = [
+                key for key in shard_keys if lbph.shards is not None and key in lbph.shards
+            ]
             
             # Process faces in batches for better performance with 50+ students
             processed_faces = 0
@@ -412,7 +410,12 @@ class FaceRecognitionService:
             # Sort faces by size (larger faces first - likely clearer)
             faces_with_size = [(face, face[2] * face[3]) for face in faces]
             faces_with_size.sort(key=lambda x: x[1], reverse=True)
-            sorted_faces = [face[0] for face in faces_with_size]
+            sorted_faces = [face[0] for face in faces_with_size][:self.MAX_FACES_PER_FRAME]
+            
+            # Follow faces across frames of a streaming camera
+            tracks = camera_session.track_faces(sorted_faces) if camera_session else [None] * len(sorted_faces)
+            tracked_faces = 0
+            cached_faces = 0
             
             # Process in batches to avoid memory issues
             batch_size = self.BATCH_PROCESSING_SIZE
@@ -420,8 +423,11 @@ class FaceRecognitionService:
                 batch_end = min(batch_start + batch_size, len(sorted_faces), self.MAX_FACES_PER_FRAME)
                 batch_faces = sorted_faces[batch_start:batch_end]
                 
+                # Pass 1: crop and score the faces, and find the ones that need a prediction
+                prepared = []
                 for i, (x, y, w, h) in enumerate(batch_faces):
                     face_index = batch_start + i
+                    track = tracks[face_index]
                     
                     # Extract face region with adaptive padding for distant faces
                     padding = max(3, min(w, h) // 15)  # Smaller padding for distant faces
@@ -439,44 +445,79 @@ class FaceRecognitionService:
                     processed_faces += 1
                     
                     # Calculate face quality with adjusted thresholds for distant faces
-                    quality_score = self._calculate_face_quality(face_roi)
+                    with timer.span('quality'):
+                        quality_score = self._calculate_face_quality(face_roi)
+                    
+                    # Sizes and positions are reported in original frame coordinates
+                    frame_box = scale_box(x, y, w, h, frame_scale)
+                    frame_w, frame_h = frame_box[2], frame_box[3]
                     
                     # Boost quality score for larger faces (likely closer/clearer)
-                    size_boost = min((w * h) / (100 * 100), 1.0) * 0.2
+                    size_boost = min((frame_w * frame_h) / (100 * 100), 1.0) * 0.2
                     adjusted_quality = min(quality_score + size_boost, 1.0)
                     
                     face_info = {
-                        'box': {'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h)},
+                        'box': {'x': frame_box[0], 'y': frame_box[1], 'width': frame_w, 'height': frame_h},
                         'quality_score': float(adjusted_quality),
                         'face_index': face_index,
-                        'face_size': w * h,
-                        'distance_estimate': self._estimate_distance(w, h)
+                        'face_size': frame_w * frame_h,
+                        'distance_estimate': self._estimate_distance(frame_w, frame_h)
                     }
+                    if track is not None:
+                        face_info['track_id'] = track.track_id
                     
-                    # Process faces that meet quality threshold
+                    # Multiple recognition attempts with different preprocessing
+                    face = {'index': face_index, 'box': (x, y, w, h), 'frame_box': frame_box, 'track': track,
+                            'roi': face_roi, 'quality': adjusted_quality, 'info': face_info,
+                            'cache_key': None, 'cached': None, 'predictions': [], 'predict': False}
                     if adjusted_quality >= self.FACE_QUALITY_THRESHOLD:
-                        high_quality_faces += 1
-                        
-                        # Enhanced preprocessing for challenging conditions
-                        face_processed = self._preprocess_face(face_roi)
-                        
-                        # Multiple recognition attempts with different preprocessing
-                        predictions = []
+                        face['cache_key'] = self.recognition_cache.key_for(camera_id, track, (x, y, w, h))
+                        face['cached'] = self.recognition_cache.get(face['cache_key'], lbph_handle.version)
                         
-                        # Attempt 1: Standard preprocessing
-                        try:
-                            label_id, confidence = self.recognizer.predict(face_processed)
-                            predictions.append((label_id, confidence, 'standard'))
-                        except Exception as e:
-                            logger.warning(f"Standard recognition failed for face {face_index}: {e}")
-                        
-                        # Attempt 2: Enhanced contrast (for poor lighting)
+                        if face['cached'] is not None:
+                            # Confirmed identity from recent frames: no prediction, no student query
+                            face['predictions'].append((face['cached'].label_id, face['cached'].confidence, 'cached'))
+                            cached_faces += 1
+                        elif camera_session and not camera_session.should_recognize(track):
+                            # Identity carried over from a recent prediction on this track
+                            face['predictions'].append((track.label_id, track.confidence, 'tracked'))
+                            tracked_faces += 1
+                        else:
+                            face['predict'] = True
+                    prepared.append(face)
+                
+                # Enhanced preprocessing for challenging conditions, packed into one array,
+                # and one predict pass over the standard and the enhanced contrast versions
+                pending = [face for face in prepared if face['predict']]
+                if pending:
+                    with timer.span('preprocess'):
+                        standard = self.face_preprocessor.preprocess_batch([face['roi'] for face in pending])
+                        # Enhanced contrast (for poor lighting)
+                        enhanced = enhance_contrast(standard)
+                    
+                    with timer.span('predict'):
                         try:
-                            enhanced_face = cv2.convertScaleAbs(face_processed, alpha=1.2, beta=10)
-                            label_id, confidence = self.recognizer.predict(enhanced_face)
-                            predictions.append((label_id, confidence, 'enhanced'))
+                            batch_predictions = lbph.predict_batch(np.concatenate([standard, enhanced]), shard_keys)
                         except Exception as e:
-                            logger.warning(f"Enhanced recognition failed for face {face_index}: {e}")
+                            logger.warning(f"Recognition failed for faces {batch_start}-{batch_end - 1}: {e}")
+                            batch_predictions = []
+                    
+                    if batch_predictions:
+                        for j, face in enumerate(pending):
+                            face['predictions'].append((*batch_predictions[j], 'standard'))
+                            face['predictions'].append((*batch_predictions[len(pending) + j], 'enhanced'))
+                
+                # Pass 2: identify the faces from their predictions
+                for face in prepared:
+                    face_index, track, face_info = face['index'], face['track'], face['info']
+                    x, y, w, h = face['box']
+                    frame_x, frame_y, frame_w, frame_h = face['frame_box']
+                    adjusted_quality, predictions = face['quality'], face['predictions']
+                    cache_key, cached = face['cache_key'], face['cached']
+                    
+                    # Process faces that meet quality threshold
+                    if adjusted_quality >= self.FACE_QUALITY_THRESHOLD:
+                        high_quality_faces += 1
                         
                         if predictions:
                             # Use the prediction with highest confidence (lowest value)
@@ -499,18 +540,39 @@ class FaceRecognitionService:
                             
                             # Check if recognition is confident enough
                             if confidence < adjusted_threshold:
-                                matric_number = self.id_to_matric.get(label_id, None)
+                                matric_number = lbph.id_to_matric.get(label_id, None)
+                                
+                                if track is not None and method not in ('tracked', 'cached'):
+                                    if matric_number is not None:
+                                        track.record_identity(label_id, confidence)
+                                    else:
+                                        track.clear_identity()
                                 
                                 if matric_number is not None:
                                     # Get student information
                                     try:
-                                        student = Student.objects.get(matric_number=matric_number)
+                                        if cached is not None:
+                                            student = cached.student
+                                        elif method == 'tracked' and track.identity is not None:
+                                            student = track.identity
+                                        else:
+                                            with timer.span('student_lookup'):
+                                                student = CachedStudent.from_student(
+                                                    Student.objects.get(matric_number=matric_number)
+                                                )
+                                            if track is not None:
+                                                # Later frames carrying this track's identity reuse the student
+                                                track.identity = student
+                                            if method != 'tracked':
+                                                # Only a fresh prediction confirms the cache entry
+                                                self.recognition_cache.put(
+                                                    cache_key, label_id, confidence, student, lbph_handle.version
+                                                )
+                                        if student is None:
+                                            raise Student.DoesNotExist
                                         
                                         # Check if student is expected in current timetable slots
-                                        is_expected = any(
-                                            student in self.get_students_for_timetable_slot(slot) 
-                                            for slot in active_slots
-                                        )
+                                        is_expected = any(student.id in roster for _, roster in slot_rosters)
                                         
                                         face_info.update({
                                             'recognized': True,
@@ -523,10 +585,11 @@ class FaceRecognitionService:
                                         
                                         # Mark attendance for active timetable slots
                                         attendance_results = []
-                                        for slot in active_slots:
-                                            if student in self.get_students_for_timetable_slot(slot):
-                                                attendance_result = self._mark_timetable_attendance(student, slot, session_id)
-                                                attendance_results.append(attendance_result)
+                                        with timer.span('attendance'):
+                                            for slot, roster in slot_rosters:
+                                                if student.id in roster:
+                                                    attendance_result = self._mark_timetable_attendance(student, slot, session_id)
+                                                    attendance_results.append(attendance_result)
                                         
                                         face_info['attendance_results'] = attendance_results
                                         
@@ -546,7 +609,7 @@ class FaceRecognitionService:
                                                 'timestamp': timezone.now().isoformat(),
                                                 'is_expected': is_expected,
                                                 'attendance_marked': len(attendance_results) > 0,
-                                                'face_position': {'x': x, 'y': y, 'w': w, 'h': h},
+                                                'face_position': {'x': frame_x, 'y': frame_y, 'w': frame_w, 'h': frame_h},
                                                 'distance_estimate': face_info['distance_estimate'],
                                                 'recognition_method': method
                                             })
@@ -556,6 +619,10 @@ class FaceRecognitionService:
                                                   f"Confidence: {confidence:.2f}, Distance: {face_info['distance_estimate']}")
                                         
                                     except Student.DoesNotExist:
+                                        if cached is None and method != 'tracked':
+                                            self.recognition_cache.put(
+                                                cache_key, label_id, confidence, None, lbph_handle.version
+                                            )
                                         logger.warning(f"Student not found in database for matric: {matric_number}")
                                         face_info.update({
                                             'recognized': False,
@@ -565,6 +632,7 @@ class FaceRecognitionService:
                                         })
                                         results['unrecognized_faces'].append(face_info)
                                 else:
+                                    self.recognition_cache.discard(cache_key)
                                     logger.warning(f"Label ID {label_id} not found in trained labels")
                                     face_info.update({
                                         'recognized': False,
@@ -573,6 +641,9 @@ class FaceRecognitionService:
                                     })
                                     results['unrecognized_faces'].append(face_info)
                             else:
+                                if track is not None:
+                                    track.clear_identity()
+                                self.recognition_cache.discard(cache_key)
                                 logger.info(f"Low confidence recognition: {confidence:.2f} >= {adjusted_threshold:.2f}")
                                 face_info.update({
                                     'recognized': False,
@@ -604,6 +675,8 @@ class FaceRecognitionService:
                 'faces_processed': processed_faces,
                 'high_quality_faces': high_quality_faces,
                 'successful_recognitions': successful_recognitions,
+                'tracked_faces': tracked_faces,
+                'cached_faces': cached_faces,
                 'recognition_rate': (successful_recognitions / max(high_quality_faces, 1)) * 100
             })
             
@@ -611,6 +684,7 @@ class FaceRecognitionService:
                        f"{successful_recognitions} recognized, "
                        f"{results['processing_stats']['recognition_rate']:.1f}% success rate")
             
+            timer.finish(results)
             return results
             
         except Exception as e:
@@ -637,6 +711,9 @@ class FaceRecognitionService:
         """
         Mark attendance for a student in a specific timetable slot
         
+        The mark is deduplicated in memory and written in bulk by the
+        attendance write buffer instead of one transaction per face.
+        
         Args:
             student: Student model instance
             timetable_slot: TimetableSlot instance
@@ -645,100 +722,38 @@ class FaceRecognitionService:
         Returns:
             dict: Attendance marking result
         """
-        try:
-            today = timezone.now().date()
-            
-            # Check if attendance already marked for this student, course, and date
-            existing_attendance = Attendance.objects.filter(
-                student=student,
-                date=today,
-                course_registration__course=timetable_slot.course
-            ).first()
-            
-            if existing_attendance:
-                return {
-                    'success': False,
-                    'message': f'Attendance already marked for {timetable_slot.course.code}',
-                    'attendance_id': existing_attendance.id,
-                    'course_code': timetable_slot.course.code
-                }
-            
-            # Get or create course registration for the student
-            course_registration, created = CourseRegistration.objects.get_or_create(
-                student=student,
-                course=timetable_slot.course,
-                defaults={
-                    'academic_year': '2025/2026',  # You might want to make this dynamic
-                    'semester': 'Semester 1'
-                }
-            )
-            
-            # Create attendance record
-            attendance = Attendance.objects.create(
-                student=student,
-                course_registration=course_registration,
-                date=today,
-                status='present',
-                recorded_at=timezone.now(),
-                is_manual_override=False
-            )
-            
-            # Add to live session if provided
-            if session_id:
-                try:
-                    session = LiveSession.objects.get(id=session_id, status='live')
-                    participant, created = LiveSessionParticipant.objects.get_or_create(
-                        session=session,
-                        user=student.user,
-                        defaults={
-                            'joined_at': timezone.now(),
-                            'is_active': True,
-                            'has_video': True
-                        }
-                    )
-                    
-                    if not created and not participant.is_active:
-                        participant.is_active = True
-                        participant.joined_at = timezone.now()
-                        participant.save()
-                        
-                except LiveSession.DoesNotExist:
-                    logger.warning(f"Live session {session_id} not found")
-            
-            logger.info(f"Timetable attendance marked for {student.matric_number} in {timetable_slot.course.code}")
-            
-            return {
-                'success': True,
-                'message': f'Attendance marked for {timetable_slot.course.code}',
-                'attendance_id': attendance.id,
-                'course_code': timetable_slot.course.code,
-                'timetable_slot_id': timetable_slot.id
-            }
-            
-        except Exception as e:
-            logger.error(f"Error marking timetable attendance: {e}")
-            return {
-                'success': False,
-                'message': str(e),
-                'course_code': timetable_slot.course.code
-            }
+        result = attendance_buffer.mark(student.id, timetable_slot, session_id, user_id=student.user_id)
+        if result['success']:
+            logger.info(f"Timetable attendance queued for {student.matric_number} in {timetable_slot.course.code}")
+        return result
     
     def get_model_status(self):
         """Get the status of loaded models"""
+        try:
+            handle = model_registry.get(LBPH_MODEL)
+        except Exception as e:
+            logger.error(f"Face recognition model unavailable: {e}")
+            handle = None
+        
         return {
-            'model_loaded': self.recognizer is not None,
-            'labels_loaded': len(self.label_map) > 0,
+            'model_loaded': handle is not None,
+            'model_version': handle.version if handle else None,
+            'labels_loaded': handle is not None and len(handle.model.label_map) > 0,
             'cascade_loaded': self.face_cascade is not None and not self.face_cascade.empty(),
-            'total_students': len(self.label_map),
+            'total_students': len(handle.model.label_map) if handle else 0,
+            'lbph_shards': len(handle.model.shards.keys()) if handle and handle.model.shards else 0,
             'model_file_exists': self.model_file.exists(),
-            'labels_file_exists': self.labels_file.exists()
+            'labels_file_exists': self.labels_file.exists(),
+            'recognition_cache': self.recognition_cache.get_stats()
         }
     
     def reload_models(self):
         """Reload face recognition models (useful after retraining)"""
         try:
             self._load_models()
-            return {'success': True, 'message': 'Models reloaded successfully'}
+            handle = model_registry.reload(LBPH_MODEL)
+            self.recognition_cache.clear()
+            return {'success': True, 'message': 'Models reloaded successfully', 'model_version': handle.version}
         except Exception as e:
             return {'success': False, 'message': str(e)}
 
@@ -2,16 +2,19 @@
 Face Tracking API Views for Real-time Attendance
 """
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.http import JsonResponse
+from django.conf import settings
 from datetime import timedelta
 import json
 import logging
+import math
 
 # Try to import face recognition service, handle gracefully if models don't exist
 try:
@@ -35,9 +38,80 @@ from live_sessions.models import LiveSession
 from students.models import Student
 from attendance.models import Attendance, CourseRegistration
 from .presence_tracking_service import presence_tracking_service
+from .camera_sessions import camera_session_manager
+from .frame_gate import frame_gates
+from .frame_protocol import frame_encoders
+from .edge_events import ingest_events
+from .stage_timing import stage_timings
+from .attendance_buffer import attendance_buffer
+from .presence_accumulator import presence_accumulator
+from . import attendance_counters
+from .model_registry import model_registry
+from .recognition_workers import recognition_pool, FrameDropped
+from .training_jobs import training_jobs
 
 logger = logging.getLogger(__name__)
 
+def _is_true(value):
+    return value is True or str(value).lower() in ('1', 'true', 'yes')
+
+
+def _frame_response(results, compact, roster_version, camera_id=None):
+    """Full result, or the compact delta against what the camera's client has received"""
+    return Response({
+        'success': True,
+        'data': frame_encoders.encode(camera_id, roster_version, results) if compact else results
+    })
+
+
+def _recognize_frame(frame_data, session_id, department_id, camera_id, compact=False, roster_version=None):
+    """Validate the live session and run one frame through the recognizer"""
+    # Validate session if provided
+    if session_id:
+        try:
+            session = LiveSession.objects.get(id=session_id)
+            if session.status != 'live':
+                return Response({
+                    'success': False,
+                    'message': 'Session is not currently live'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        except LiveSession.DoesNotExist:
+            return Response({
+                'success': False,
+                'message': 'Live session not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+    
+    # Unchanged scenes of a streaming camera reuse the last result
+    gate = frame_gates.get_gate(camera_id)
+    thumbnail = gate.fingerprint(frame_data) if gate else None
+    reused = gate.reuse(thumbnail, (session_id, department_id)) if gate else None
+    if reused is not None:
+        return _frame_response(reused, compact, roster_version, camera_id)
+    
+    # Process the frame with timetable integration
+    if recognition_pool.enabled:
+        try:
+            future = recognition_pool.submit(frame_data, session_id, department_id, camera_id)
+        except FrameDropped as e:
+            response = Response({
+                'success': False,
+                'dropped': True,
+                'message': 'Recognition workers are busy; frame dropped',
+                'retry_after': e.retry_after
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(math.ceil(e.retry_after))
+            return response
+        results = future.result(timeout=getattr(settings, 'FACE_RECOGNITION_TIMEOUT', 30))
+    else:
+        results = face_recognition_service.process_frame(
+            frame_data, session_id, department_id, camera_id=camera_id
+        )
+    if gate:
+        gate.record(thumbnail, (session_id, department_id), results)
+    
+    return _frame_response(results, compact, roster_version, camera_id)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def process_face_frame(request):
@@ -48,8 +122,17 @@ def process_face_frame(request):
     {
         "frame_data": "data:image/jpeg;base64,/9j/4AAQSkZJRgABAQAAAQ...",
         "session_id": "uuid-string" (optional),
-        "department_id": "1" (optional - filter by department)
+        "department_id": "1" (optional - filter by department),
+        "camera_id": "hall-a-cam-1" (optional - enables face tracking across frames),
+        "compact": true (optional - compact faces, roster only when roster_version is stale),
+        "roster_version": "3f9a0c1d2e4b" (optional - last roster_version received)
     }
+    
+    With compact and a camera_id, each recognition is only sent once per
+    roster to that camera; without a camera_id only the roster is omitted.
+    
+    Cameras that stream continuously should prefer the WebSocket endpoint
+    ws/face-tracking/<camera_id>/ which avoids the per-frame HTTP overhead.
     """
     try:
         if not FACE_RECOGNITION_AVAILABLE:
@@ -62,6 +145,7 @@ def process_face_frame(request):
         frame_data = data.get('frame_data')
         session_id = data.get('session_id')
         department_id = data.get('department_id')
+        camera_id = data.get('camera_id')
         
         if not frame_data:
             return Response({
@@ -69,31 +153,120 @@ def process_face_frame(request):
                 'message': 'Frame data is required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Validate session if provided
-        if session_id:
-            try:
-                session = LiveSession.objects.get(id=session_id)
-                if session.status != 'live':
-                    return Response({
-                        'success': False,
-                        'message': 'Session is not currently live'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-            except LiveSession.DoesNotExist:
-                return Response({
-                    'success': False,
-                    'message': 'Live session not found'
-                }, status=status.HTTP_404_NOT_FOUND)
+        return _recognize_frame(frame_data, session_id, department_id, camera_id,
+                                _is_true(data.get('compact')), data.get('roster_version'))
         
-        # Process the frame with timetable integration
-        results = face_recognition_service.process_frame(frame_data, session_id, department_id)
+    except Exception as e:
+        logger.error(f"Error processing face frame: {e}")
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def process_face_frame_binary(request):
+    """
+    Process a single encoded frame uploaded without base64 inflation
+    
+    Accepts either a raw image body (Content-Type: image/jpeg, image/png or
+    application/octet-stream) with session_id, department_id and camera_id
+    as query parameters, or a multipart form with the image in a "frame"
+    file field and the same values as form fields. compact and
+    roster_version work as for process_face_frame.
+    
+    The frame is decoded straight to grayscale, at reduced resolution when
+    it is larger than the detector needs; boxes are reported in the
+    original frame coordinates.
+    """
+    try:
+        if not FACE_RECOGNITION_AVAILABLE:
+            return Response({
+                'success': False,
+                'message': 'Face recognition models not available. Please train models first.'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('frame')
+            frame_data = upload.read() if upload else None
+            params = request.data
+        else:
+            frame_data = request.body
+            params = request.query_params
+        
+        if not frame_data:
+            return Response({
+                'success': False,
+                'message': 'Frame image is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return _recognize_frame(
+            frame_data, params.get('session_id'), params.get('department_id'), params.get('camera_id'),
+            _is_true(params.get('compact')), params.get('roster_version')
+        )
+        
+    except Exception as e:
+        logger.error(f"Error processing binary face frame: {e}")
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def ingest_edge_events(request):
+    """
+    Ingest recognition events from classroom PCs that recognize faces locally
+    
+    Expected payload:
+    {
+        "events": [
+            {
+                "event_id": "hall-a-cam-1:000123",
+                "matric_number": "CSC/2021/001",
+                "slot_id": "uuid-string",
+                "session_id": "uuid-string" (optional),
+                "timestamp": "2026-03-02T09:15:04Z",
+                "confidence": 0.91,
+                "camera_id": "hall-a-cam-1" (optional),
+                "bounding_box": {"x": 10, "y": 20, "width": 80, "height": 80} (optional)
+            }
+        ]
+    }
+    
+    Events already ingested (same event_id) are counted as duplicates, so
+    a batch can safely be resent. Invalid events are reported one by one
+    and do not prevent the rest of the batch from being applied.
+    """
+    try:
+        user = request.user
+        if not (user.is_staff or user.is_admin() or user.is_lecturer()):
+            return Response({
+                'success': False,
+                'message': 'Only staff, admin and lecturer accounts can submit recognition events'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        events = request.data.get('events')
+        max_events = getattr(settings, 'FACE_EDGE_MAX_EVENTS', 500)
+        if not isinstance(events, list) or not events:
+            return Response({
+                'success': False,
+                'message': 'A non-empty list of events is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(events) > max_events:
+            return Response({
+                'success': False,
+                'message': f'At most {max_events} events per request'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'success': True,
-            'data': results
+            'data': ingest_events(events)
         })
         
     except Exception as e:
-        logger.error(f"Error processing face frame: {e}")
+        logger.error(f"Error ingesting edge recognition events: {e}")
         return Response({
             'success': False,
             'message': str(e)
@@ -196,6 +369,7 @@ def get_face_model_status(request):
             })
         
         status_info = face_recognition_service.get_model_status()
+        status_info['model_registry'] = model_registry.get_status()
         return Response({
             'success': True,
             'data': status_info
@@ -462,16 +636,34 @@ def get_face_recognition_stats(request):
             detection_count__gt=0
         ).values('student').distinct().count()
         
+        # Mean frame time over the recent frames of every service
+        timing_stats = stage_timings.get_stats()
+        frame_totals = [
+            (service['stages']['total']['mean_ms'], service['stages']['total']['samples'])
+            for service in timing_stats.values()
+        ]
+        total_samples = sum(samples for _, samples in frame_totals)
+        processing_time_avg = (
+            sum(mean_ms * samples for mean_ms, samples in frame_totals) / total_samples / 1000
+            if total_samples else 0
+        )
+        
         stats = {
             'total_faces_processed': total_processed,
             'successful_recognitions': successful_recognitions,
             'failed_recognitions': failed_recognitions,
             'accuracy_rate': round(accuracy_rate, 1),
-            'processing_time_avg': 0.45,  # This would come from actual processing metrics
+            'processing_time_avg': round(processing_time_avg, 4),
             'active_sessions': active_sessions,
             'students_detected_today': students_today,
             'avg_detections_per_session': round(total_detections['avg_detections'] or 0, 1),
-            'avg_presence_percentage': round(total_detections['avg_confidence'] or 0, 1)
+            'avg_presence_percentage': round(total_detections['avg_confidence'] or 0, 1),
+            'camera_sessions': camera_session_manager.get_stats(),
+            'frame_gate': frame_gates.get_stats(),
+            'attendance_buffer': attendance_buffer.get_stats(),
+            'presence_accumulator': presence_accumulator.get_stats(),
+            'recognition_workers': recognition_pool.get_stats(),
+            'stage_timings': timing_stats
         }
         
         return Response({
@@ -605,14 +797,20 @@ def manual_attendance_override(request):
             # Update existing attendance records to absent
             course_registration = CourseRegistration.objects.filter(student=student).first()
             if course_registration:
-                Attendance.objects.filter(
+                records = Attendance.objects.filter(
                     student=student,
                     course_registration=course_registration,
                     date=today
-                ).update(
+                )
+                changes = [
+                    (student.id, course_registration.id, status, 'absent')
+                    for status in records.values_list('status', flat=True)
+                ]
+                records.update(
                     status='absent',
                     is_manual_override=True
                 )
+                attendance_counters.record_status_changes(changes)
             
             message = f"Manually marked {student.full_name} as absent"
         
@@ -631,7 +829,12 @@ def manual_attendance_override(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def retrain_face_models(request):
-    """Retrain face recognition models with all available student photos"""
+    """
+    Retrain face recognition models with all available student photos
+
+    Training runs in the background; returns 202 with the queued job, whose
+    progress is polled at face-tracking/training-jobs/<job_id>/.
+    """
     try:
         # Check if user has admin permissions
         if not request.user.is_staff:
@@ -661,34 +864,19 @@ def retrain_face_models(request):
                 'message': 'No students with photos found for training'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Trigger model retraining
-        force_retrain = request.data.get('force_retrain', False)
-        result = face_recognition_service.train_models(
-            students=students_with_photos,
-            force_retrain=force_retrain
+        # Queue model retraining; every retrain rebuilds the model from all photos
+        from .simple_face_trainer import train_face_recognition
+        job = training_jobs.submit(
+            'full_train', 'Full LBPH retrain from student photos', train_face_recognition,
+            requested_by=request.user.email
         )
+        logger.info(f"Face recognition model retraining queued by {request.user.email}")
         
-        if result.get('success', False):
-            # Log the training activity
-            logger.info(f"Face recognition models retrained by {request.user.email}")
-            
-            return Response({
-                'success': True,
-                'message': 'Face recognition models retrained successfully',
-                'data': {
-                    'total_students': students_with_photos.count(),
-                    'total_face_samples': result.get('total_samples', 0),
-                    'processed_students': result.get('processed_students', []),
-                    'training_time': result.get('training_time', 0),
-                    'model_accuracy': result.get('accuracy', 0)
-                }
-            })
-        else:
-            return Response({
-                'success': False,
-                'message': result.get('message', 'Training failed'),
-                'error': result.get('error')
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({
+            'success': True,
+            'message': 'Face recognition model retraining started',
+            'data': dict(job.to_dict(), total_students=students_with_photos.count())
+        }, status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
         logger.error(f"Error retraining face models: {e}")
@@ -700,7 +888,13 @@ def retrain_face_models(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def simple_train_face_models(request):
-    """Train face recognition models using simple proven approach"""
+    """
+    Retrain the LBPH model from every student's photos in the background
+
+    Returns 202 with the queued job; poll face-tracking/training-jobs/<job_id>/
+    for progress. To add or refresh a single student use
+    face-tracking/enroll-student/ instead, which does not rebuild the model.
+    """
     try:
         # Check if user has admin permissions
         if not request.user.is_staff:
@@ -708,76 +902,107 @@ def simple_train_face_models(request):
                 'success': False,
                 'message': 'Admin permissions required'
             }, status=status.HTTP_403_FORBIDDEN)
-        
-        # Import simple face recognition service
-        if not FACE_RECOGNITION_AVAILABLE:
+
+        from .simple_face_trainer import train_face_recognition
+        job = training_jobs.submit(
+            'full_train', 'Full LBPH retrain from student photos', train_face_recognition,
+            requested_by=request.user.email
+        )
+
+        return Response({
+            'success': True,
+            'message': 'Face recognition training started',
+            'data': job.to_dict()
+        }, status=status.HTTP_202_ACCEPTED)
+
+    except Exception as e:
+        logger.error(f"Error training simple face models: {e}")
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def enroll_student_face(request):
+    """
+    Add one student to the face model, or replace their face data
+
+    Expected payload:
+    {
+        "matric_number": "CSC/2021/001"
+    }
+
+    Photos are read from ml_models/student_photos/<matric_number>/. The job
+    runs in the background and only processes this student's photos.
+    """
+    try:
+        if not request.user.is_staff:
             return Response({
                 'success': False,
-                'message': 'Face recognition service not available'
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        
-        # Get training parameters
-        min_samples = request.data.get('min_samples', 10)
-        confidence_threshold = request.data.get('confidence_threshold', 0.8)
-        
-        # Get students with sufficient photo samples
-        from students.models import Student
-        students_for_training = Student.objects.filter(
-            is_active=True,
-            is_approved=True,
-            photo__isnull=False
-        ).exclude(photo='')
-        
-        if students_for_training.count() == 0:
+                'message': 'Admin permissions required'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        matric_number = request.data.get('matric_number')
+        if not matric_number:
             return Response({
                 'success': False,
-                'message': 'No students available for training'
+                'message': 'matric_number is required'
             }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Use simple face recognition service for training
-        try:
-            result = simple_face_recognition_service.train_simple_model(
-                students=students_for_training,
-                min_samples=min_samples,
-                confidence_threshold=confidence_threshold
-            )
-            
-            if result.get('success', False):
-                return Response({
-                    'success': True,
-                    'message': 'Simple face recognition model trained successfully',
-                    'data': {
-                        'total_students': result.get('total_students', 0),
-                        'total_samples': result.get('total_samples', 0),
-                        'configuration': {
-                            'student_count': result.get('total_students', 0),
-                            'confidence_threshold': confidence_threshold,
-                            'min_samples': min_samples,
-                            'model_type': 'simple_opencv'
-                        },
-                        'training_time': result.get('training_time', 0)
-                    }
-                })
-            else:
-                return Response({
-                    'success': False,
-                    'message': result.get('message', 'Training failed')
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                
-        except AttributeError:
-            # Fallback if simple service doesn't have train_simple_model method
+
+        if not Student.objects.filter(matric_number=matric_number).exists():
             return Response({
                 'success': False,
-                'message': 'Simple training method not available. Please use the standard training endpoint.'
-            }, status=status.HTTP_501_NOT_IMPLEMENTED)
-        
+                'message': 'Student not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        from .simple_face_trainer import enroll_student
+        job = training_jobs.submit(
+            'enroll', f'Enroll {matric_number}', enroll_student,
+            requested_by=request.user.email, matric_number=matric_number
+        )
+
+        return Response({
+            'success': True,
+            'message': f'Enrollment of {matric_number} started',
+            'data': job.to_dict()
+        }, status=status.HTTP_202_ACCEPTED)
+
     except Exception as e:
-        logger.error(f"Error training simple face models: {e}")
+        logger.error(f"Error enrolling student face: {e}")
         return Response({
             'success': False,
             'message': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_training_jobs(request, job_id=None):
+    """Progress of one background training job, or of all recent jobs"""
+    if not request.user.is_staff:
+        return Response({
+            'success': False,
+            'message': 'Admin permissions required'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    if job_id is None:
+        return Response({
+            'success': True,
+            'data': [job.to_dict() for job in training_jobs.list_jobs()]
+        })
+
+    job = training_jobs.get(job_id)
+    if job is None:
+        return Response({
+            'success': False,
+            'message': 'Training job not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({
+        'success': True,
+        'data': job.to_dict()
+    })
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def face_recognition_config(request):
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Frame Decoding
+
+Turns whatever a camera sent (a base64 data URL, raw JPEG/PNG bytes or an
+already decoded numpy frame) into the image the detector works on, with as
+few full-frame copies as possible:
+
+- encoded images are decoded by cv2.imdecode straight to grayscale, with
+  no PIL image, RGB->BGR copy or BGR->GRAY conversion in between,
+- frames much larger than the detector needs are decoded at 1/2, 1/4 or
+  1/8 resolution by the JPEG decoder itself (IMREAD_REDUCED_*).
+
+The returned scale maps detector coordinates back to the original frame.
+"""
+
+import base64
+import binascii
+import io
+import logging
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Reduced decode flags by downscale factor, largest reduction first
+REDUCED_GRAYSCALE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+]
+REDUCED_COLOR_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+
+def frame_bytes(frame_data) -> bytes:
+    """Encoded image bytes of a base64 string (with or without data URL prefix) or raw bytes"""
+    if isinstance(frame_data, (bytes, bytearray, memoryview)):
+        return bytes(frame_data)
+    if frame_data.startswith('data:'):
+        frame_data = frame_data.split(',', 1)[1]
+    try:
+        return base64.b64decode(frame_data)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 frame data: {e}")
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) read from the image header without decoding pixels"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def reduction_factor(size: Optional[Tuple[int, int]], max_dimension: Optional[int]) -> int:
+    """Largest supported downscale that keeps the long side at or above max_dimension"""
+    if not size or not max_dimension:
+        return 1
+    long_side = max(size)
+    for factor, _ in REDUCED_GRAYSCALE_FLAGS:
+        if long_side // factor >= max_dimension:
+            return factor
+    return 1
+
+
+def decode_frame(frame_data, grayscale: bool = True,
+                 max_dimension: Optional[int] = None) -> Tuple[np.ndarray, float]:
+    """
+    Decode a frame for detection
+
+    Args:
+        frame_data: Base64 (data URL) string, encoded image bytes or a BGR/gray ndarray
+        grayscale: Decode to single-channel grayscale instead of BGR
+        max_dimension: Long side the detector needs; larger encoded frames are
+            decoded at a reduced resolution that still covers it
+
+    Returns:
+        tuple: (image, scale) where original coordinates = detector coordinates * scale
+
+    Raises:
+        ValueError: If the data cannot be decoded
+    """
+    if isinstance(frame_data, np.ndarray):
+        if grayscale and frame_data.ndim == 3:
+            return cv2.cvtColor(frame_data, cv2.COLOR_BGR2GRAY), 1.0
+        return frame_data, 1.0
+
+    data = frame_bytes(frame_data)
+    buffer = np.frombuffer(data, dtype=np.uint8)
+
+    factor = reduction_factor(image_size(data), max_dimension)
+    if factor > 1:
+        flags = dict(REDUCED_GRAYSCALE_FLAGS if grayscale else REDUCED_COLOR_FLAGS)[factor]
+    else:
+        flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+
+    image = cv2.imdecode(buffer, flags)
+    if image is None:
+        raise ValueError("Could not decode frame")
+    return image, float(factor)
+
+
+def scale_box(x, y, w, h, scale: float) -> Tuple[int, int, int, int]:
+    """Map a detector box back to original frame coordinates"""
+    if scale == 1.0:
+        return int(x), int(y), int(w), int(h)
+    return int(round(x * scale)), int(round(y * scale)), int(round(w * scale)), int(round(h * scale))
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Scene-Change Gate for Camera Frames
+
+Classroom clients post frames on a timer, and during a seated lecture
+consecutive frames are nearly identical. Before a camera frame goes
+through detection and recognition, the gate decodes it at 1/8 resolution,
+shrinks it to a small grayscale thumbnail and compares it with the
+thumbnail of the last frame that was actually processed. If only a small
+fraction of thumbnail pixels changed, the previous result is returned
+again, flagged with 'reused': True.
+
+A result is reused for at most max_reused_frames frames or max_age
+seconds, so slow changes (a student walking in) are still picked up, and
+only for the same live session and department it was produced for.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .frame_decoding import decode_frame
+
+logger = logging.getLogger(__name__)
+
+
+class FrameGate:
+    """Decides whether a camera frame differs enough from the last processed one"""
+
+    THUMBNAIL_SIZE = (64, 48)  # (width, height) compared between frames
+    PIXEL_THRESHOLD = 12  # Gray-level difference for a thumbnail pixel to count as changed
+
+    def __init__(self, change_threshold: float = 0.02, max_reused_frames: int = 10, max_age: float = 5.0):
+        self.change_threshold = change_threshold
+        self.max_reused_frames = max_reused_frames
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+        self._thumbnail = None
+        self._context = None
+        self._result = None
+        self._result_at = 0.0
+        self._reused_in_a_row = 0
+
+        self.frames_seen = 0
+        self.frames_reused = 0
+        self.last_change = None
+
+    def fingerprint(self, frame_data) -> Optional[np.ndarray]:
+        """Small grayscale thumbnail of a frame, or None if it cannot be decoded"""
+        try:
+            image, _ = decode_frame(frame_data, grayscale=True, max_dimension=self.THUMBNAIL_SIZE[0])
+        except ValueError:
+            return None
+        return cv2.resize(image, self.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+    def change_ratio(self, thumbnail: np.ndarray) -> float:
+        """Fraction of thumbnail pixels that changed since the last processed frame"""
+        difference = cv2.absdiff(thumbnail, self._thumbnail)
+        return float(np.count_nonzero(difference > self.PIXEL_THRESHOLD)) / difference.size
+
+    def reuse(self, thumbnail: Optional[np.ndarray], context: Hashable) -> Optional[Dict[str, Any]]:
+        """
+        Previous result for an unchanged scene, or None if the frame must be processed
+
+        Args:
+            thumbnail: fingerprint() of the new frame
+            context: What the result depends on besides the image (session, department)
+        """
+        with self._lock:
+            self.frames_seen += 1
+            if thumbnail is None or self._result is None or context != self._context:
+                return None
+
+            self.last_change = self.change_ratio(thumbnail)
+            if (self.last_change >= self.change_threshold
+                    or self._reused_in_a_row >= self.max_reused_frames
+                    or time.time() - self._result_at > self.max_age):
+                return None
+
+            self._reused_in_a_row += 1
+            self.frames_reused += 1
+            reused = {key: value for key, value in self._result.items() if key != 'stage_timings'}
+            return dict(reused, reused=True, reused_frames=self._reused_in_a_row,
+                        scene_change=round(self.last_change, 4))
+
+    def record(self, thumbnail: Optional[np.ndarray], context: Hashable, result: Dict[str, Any]):
+        """Remember a freshly processed frame as the new reference"""
+        if thumbnail is None or 'error' in result:
+            return
+        with self._lock:
+            self._thumbnail = thumbnail
+            self._context = context
+            self._result = result
+            self._result_at = time.time()
+            self._reused_in_a_row = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'frames_seen': self.frames_seen,
+            'frames_reused': self.frames_reused,
+            'skip_ratio': round(self.frames_reused / self.frames_seen, 3) if self.frames_seen else 0,
+            'last_change': round(self.last_change, 4) if self.last_change is not None else None,
+            'change_threshold': self.change_threshold,
+            'max_reused_frames': self.max_reused_frames,
+            'max_age': self.max_age
+        }
+
+
+class FrameGateManager:
+    """One gate per camera; gating is off when FACE_FRAME_GATE_THRESHOLD is None"""
+
+    def __init__(self):
+        self._gates: Dict[str, FrameGate] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'FACE_FRAME_GATE_THRESHOLD', None) is not None
+
+    def get_gate(self, camera_id) -> Optional[FrameGate]:
+        """Gate of a camera, or None for cameraless frames or when gating is disabled"""
+        if not camera_id or not self.enabled:
+            return None
+        camera_id = str(camera_id)
+        with self._lock:
+            gate = self._gates.get(camera_id)
+            if gate is None:
+                gate = FrameGate(
+                    change_threshold=settings.FACE_FRAME_GATE_THRESHOLD,
+                    max_reused_frames=getattr(settings, 'FACE_FRAME_GATE_MAX_REUSED', 10),
+                    max_age=getattr(settings, 'FACE_FRAME_GATE_MAX_AGE', 5.0)
+                )
+                self._gates[camera_id] = gate
+            return gate
+
+    def end(self, camera_id):
+        with self._lock:
+            self._gates.pop(str(camera_id), None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            gates = {camera_id: gate.get_stats() for camera_id, gate in self._gates.items()}
+        frames_seen = sum(g['frames_seen'] for g in gates.values())
+        frames_reused = sum(g['frames_reused'] for g in gates.values())
+        return {
+            'enabled': self.enabled,
+            'change_threshold': getattr(settings, 'FACE_FRAME_GATE_THRESHOLD', None),
+            'frames_seen': frames_seen,
+            'frames_reused': frames_reused,
+            'skip_ratio': round(frames_reused / frames_seen, 3) if frames_seen else 0,
+            'cameras': gates
+        }
+
+
+# Global frame gates, consulted before frames are handed to recognition
+frame_gates = FrameGateManager()
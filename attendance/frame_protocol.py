@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Compact, Delta-Encoded Frame Responses
+
+A full process_frame result repeats the active timetable slots and every
+expected student on each frame, although they only change when the
+timetable or a roster does. Clients that ask for the compact format get:
+
+    {
+        "timestamp": ..., "faces_detected": 3,
+        "roster_version": "3f9a0c1d2e4b",
+        "roster": {...},          # only when the client's version is stale
+        "faces": [[x, y, width, height, status, matric_number, confidence, track_id], ...],
+        "recognized": [...]       # recognitions the client has not been sent yet
+    }
+
+The roster (slot info, expected students and the face field names) is
+sent with its version tag. A WebSocket connection keeps one
+FrameDeltaEncoder, which also remembers the students it already
+announced, so each recognition is sent once per roster. HTTP clients echo
+the last roster_version they received and get the encoder of their
+camera_id from frame_encoders; without a camera_id only the roster is
+delta encoded.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+FACE_FIELDS = ('x', 'y', 'width', 'height', 'status', 'matric_number', 'confidence', 'track_id')
+
+# Result keys passed through unchanged when present
+PASSTHROUGH_KEYS = ('error', 'reused', 'reused_frames', 'scene_change', 'stage_timings')
+
+
+def compact_face(face_info: Dict[str, Any]):
+    """One face_boxes entry as an array ordered like FACE_FIELDS"""
+    box = face_info.get('box', {})
+    confidence = face_info.get('confidence')
+    return [
+        box.get('x'), box.get('y'), box.get('width'), box.get('height'),
+        face_info.get('status'),
+        face_info.get('matric_number'),
+        round(confidence, 2) if confidence is not None else None,
+        face_info.get('track_id')
+    ]
+
+
+class FrameDeltaEncoder:
+    """Encodes frame results relative to what one client has already received"""
+
+    def __init__(self, roster_version: Optional[str] = None):
+        self.roster_version = roster_version
+        self.announced: Set[str] = set()
+
+    def encode(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        version = results.get('roster_version')
+        compact = {
+            'timestamp': results.get('timestamp'),
+            'faces_detected': results.get('faces_detected', 0),
+            'roster_version': version
+        }
+        for key in PASSTHROUGH_KEYS:
+            if key in results:
+                compact[key] = results[key]
+
+        if version is not None and version != self.roster_version:
+            compact['roster'] = {
+                'version': version,
+                'active_timetable_slots': results.get('active_timetable_slots', []),
+                'expected_students': results.get('expected_students', []),
+                'face_fields': FACE_FIELDS
+            }
+            self.roster_version = version
+            self.announced.clear()
+
+        compact['faces'] = [compact_face(face) for face in results.get('face_boxes', [])]
+
+        recognized = []
+        for student in results.get('recognized_students', []):
+            if student['matric_number'] not in self.announced:
+                self.announced.add(student['matric_number'])
+                recognized.append(student)
+        compact['recognized'] = recognized
+        return compact
+
+
+class FrameEncoderManager:
+    """One FrameDeltaEncoder per camera for HTTP clients, least recently used dropped first"""
+
+    def __init__(self, max_encoders: int = 256):
+        self.max_encoders = max_encoders
+        self._encoders: 'OrderedDict[str, FrameDeltaEncoder]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, camera_id, roster_version: Optional[str], results: Dict[str, Any]) -> Dict[str, Any]:
+        """Compact results for a camera's client, which last received roster_version"""
+        if not camera_id:
+            return FrameDeltaEncoder(roster_version).encode(results)
+
+        with self._lock:
+            camera_id = str(camera_id)
+            encoder = self._encoders.get(camera_id)
+            if encoder is None:
+                encoder = self._encoders[camera_id] = FrameDeltaEncoder(roster_version)
+                while len(self._encoders) > self.max_encoders:
+                    self._encoders.popitem(last=False)
+            elif encoder.roster_version != roster_version:
+                # The client missed a roster (or restarted); announce everything again
+                encoder.roster_version = roster_version
+                encoder.announced.clear()
+            self._encoders.move_to_end(camera_id)
+            return encoder.encode(results)
+
+    def end(self, camera_id):
+        with self._lock:
+            self._encoders.pop(str(camera_id), None)
+
+
+# Delta encoders of HTTP clients, by camera
+frame_encoders = FrameEncoderManager()
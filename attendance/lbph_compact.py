@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Compact LBPH Face Model
+
+OpenCV persists LBPH models as YAML, which stores every histogram bin as
+text. Parsing it dominates worker start-up and reload_models, and the
+whole float32 histogram matrix is copied into every worker.
+
+CompactLBPHRecognizer keeps the same model as a binary .npy matrix that
+is memory-mapped on load, so start-up is constant time and workers share
+the pages. LBPH histograms are bin counts divided by the cell area, so
+they are stored exactly as uint16 counts whenever possible (half the
+size of float32). Queries are matched with the same chi-square distance
+OpenCV uses, so predictions agree with cv2.face.LBPHFaceRecognizer.
+
+prune_histograms() keeps the k most representative histograms (medoids)
+of each student, which shrinks both the model and the predict time.
+
+This module has no Django imports.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAMS_FILE = "histograms.npy"
+LABELS_FILE = "labels.npy"
+META_FILE = "meta.json"
+
+DISTANCE_CHUNK_ROWS = 256  # Histograms compared per numpy pass
+FLT_EPSILON = np.finfo(np.float32).eps
+
+
+def lbp_codes(face: np.ndarray, radius: int = 1, neighbors: int = 8) -> np.ndarray:
+    """
+    Extended (circular) LBP codes of a grayscale image, as OpenCV computes them
+
+    Works on the last two axes, so a (N, rows, cols) stack of faces is
+    coded in one pass.
+    """
+    src = np.asarray(face, dtype=np.float32)
+    rows, cols = src.shape[-2:]
+    center = src[..., radius:rows - radius, radius:cols - radius]
+    codes = np.zeros(center.shape, dtype=np.int32)
+
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / np.float32(neighbors)))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / np.float32(neighbors)))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty, tx = np.float32(y - fy), np.float32(x - fx)
+        w1 = np.float32((1 - tx) * (1 - ty))
+        w2 = np.float32(tx * (1 - ty))
+        w3 = np.float32((1 - tx) * ty)
+        w4 = np.float32(tx * ty)
+
+        def shifted(dy, dx):
+            return src[..., radius + dy:rows - radius + dy, radius + dx:cols - radius + dx]
+
+        t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        codes += ((t > center) | (np.abs(t - center) < FLT_EPSILON)).astype(np.int32) << n
+
+    return codes
+
+
+def lbph_counts(face: np.ndarray, radius: int = 1, neighbors: int = 8,
+                grid_x: int = 8, grid_y: int = 8) -> Tuple[np.ndarray, int]:
+    """
+    Spatial LBP histogram of a face as raw bin counts
+
+    Returns:
+        tuple: (counts of length grid_x * grid_y * 2**neighbors, cell area);
+               OpenCV's histogram is counts / cell area
+    """
+    codes = lbp_codes(face, radius, neighbors)
+    patterns = 2 ** neighbors
+    width = codes.shape[1] // grid_x
+    height = codes.shape[0] // grid_y
+
+    cells = codes[:grid_y * height, :grid_x * width].reshape(grid_y, height, grid_x, width)
+    cell_index = np.arange(grid_y * grid_x, dtype=np.int64).reshape(grid_y, 1, grid_x, 1) * patterns
+    counts = np.bincount((cells + cell_index).ravel(), minlength=grid_y * grid_x * patterns)
+    return counts.astype(np.float64), width * height
+
+
+def lbph_counts_batch(faces: np.ndarray, radius: int = 1, neighbors: int = 8,
+                      grid_x: int = 8, grid_y: int = 8) -> Tuple[np.ndarray, int]:
+    """lbph_counts() of every face of a (N, rows, cols) stack, as an (N, bins) matrix"""
+    codes = lbp_codes(faces, radius, neighbors)
+    patterns = 2 ** neighbors
+    bins = grid_y * grid_x * patterns
+    width = codes.shape[2] // grid_x
+    height = codes.shape[1] // grid_y
+
+    cells = codes[:, :grid_y * height, :grid_x * width].reshape(len(codes), grid_y, height, grid_x, width)
+    cell_index = (np.arange(len(codes), dtype=np.int64).reshape(-1, 1, 1, 1, 1) * bins
+                  + np.arange(grid_y * grid_x, dtype=np.int64).reshape(1, grid_y, 1, grid_x, 1) * patterns)
+    counts = np.bincount((cells + cell_index).ravel(), minlength=len(codes) * bins)
+    return counts.reshape(len(codes), bins).astype(np.float64), width * height
+
+
+def chi_square_distances(histograms: np.ndarray, query: np.ndarray,
+                         row_sums: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    OpenCV's HISTCMP_CHISQR_ALT distance from every row of histograms to query
+
+    2 * sum((h - q)^2 / (h + q)) is rewritten as
+    2 * (sum(h) + sum(q) - 4 * sum(h * q / (h + q))), where the last sum
+    only runs over the bins the query actually uses. A face fills a
+    fraction of the 2**neighbors patterns of each cell, so this reads far
+    fewer columns than the full comparison.
+    """
+    query = np.asarray(query, dtype=np.float64).ravel()
+    used = np.flatnonzero(query)
+    query_used = query[used]
+    if row_sums is None:
+        row_sums = histogram_sums(histograms)
+
+    overlap = np.empty(len(histograms), dtype=np.float64)
+    for start in range(0, len(histograms), DISTANCE_CHUNK_ROWS):
+        chunk = np.asarray(histograms[start:start + DISTANCE_CHUNK_ROWS, used], dtype=np.float64)
+        overlap[start:start + len(chunk)] = (chunk * query_used / (chunk + query_used)).sum(axis=1)
+
+    return np.maximum(2 * (row_sums + query_used.sum() - 4 * overlap), 0)
+
+
+def histogram_sums(histograms: np.ndarray) -> np.ndarray:
+    return np.concatenate([
+        np.asarray(histograms[start:start + DISTANCE_CHUNK_ROWS], dtype=np.float64).sum(axis=1)
+        for start in range(0, len(histograms), DISTANCE_CHUNK_ROWS)
+    ]) if len(histograms) else np.empty(0)
+
+
+def prune_histograms(histograms: np.ndarray, labels: np.ndarray, per_label: int) -> np.ndarray:
+    """
+    Indices of the per_label most representative histograms of each label
+
+    Medoids are chosen greedily (the BUILD step of k-medoids): first the
+    histogram with the smallest total chi-square distance to the others,
+    then repeatedly the one that most reduces every histogram's distance
+    to its nearest chosen medoid.
+    """
+    keep = []
+    for label in np.unique(labels):
+        indices = np.flatnonzero(labels == label)
+        if len(indices) <= per_label:
+            keep.extend(indices)
+            continue
+
+        members = np.asarray(histograms[indices], dtype=np.float64)
+        sums = members.sum(axis=1)
+        distances = np.stack([chi_square_distances(members, member, sums) for member in members])
+
+        chosen = [int(np.argmin(distances.sum(axis=1)))]
+        nearest = distances[chosen[0]]
+        while len(chosen) < per_label:
+            cost = np.minimum(distances, nearest).sum(axis=1)
+            cost[chosen] = np.inf
+            best = int(np.argmin(cost))
+            chosen.append(best)
+            nearest = np.minimum(nearest, distances[best])
+
+        keep.extend(indices[sorted(chosen)])
+
+    return np.sort(np.asarray(keep, dtype=np.int64))
+
+
+class CompactLBPHRecognizer:
+    """
+    Read-only LBPH recognizer over a (memory-mapped) histogram matrix
+
+    Offers the parts of the cv2.face.LBPHFaceRecognizer interface the
+    model registry uses: predict() and the parameter/histogram getters.
+    """
+
+    def __init__(self, histograms: np.ndarray, labels: np.ndarray, radius: int = 1, neighbors: int = 8,
+                 grid_x: int = 8, grid_y: int = 8, threshold: float = float("inf"), scale: float = 1.0):
+        self.histograms = histograms
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.threshold = threshold
+        self.scale = scale  # Stored value * scale = OpenCV histogram value
+        self._row_sums = None
+
+    @classmethod
+    def from_recognizer(cls, recognizer, keep: Optional[Iterable[int]] = None) -> "CompactLBPHRecognizer":
+        """Convert a trained cv2 LBPH recognizer, optionally keeping only some histograms"""
+        histograms = np.asarray(recognizer.getHistograms(), dtype=np.float32)
+        labels = recognizer.getLabels().ravel()
+        if histograms.size:
+            histograms = histograms.reshape(len(histograms), -1)
+        if keep is not None:
+            keep = np.asarray(list(keep), dtype=np.int64)
+            histograms, labels = histograms[keep], labels[keep]
+
+        stored, scale = _counts_or_floats(histograms)
+        return cls(
+            stored, labels, recognizer.getRadius(), recognizer.getNeighbors(),
+            recognizer.getGridX(), recognizer.getGridY(), recognizer.getThreshold(), scale
+        )
+
+    @classmethod
+    def load(cls, directory, mmap: bool = True) -> "CompactLBPHRecognizer":
+        directory = Path(directory)
+        with open(directory / META_FILE) as f:
+            meta = json.load(f)
+        return cls(
+            np.load(directory / HISTOGRAMS_FILE, mmap_mode="r" if mmap else None),
+            np.load(directory / LABELS_FILE),
+            meta["radius"], meta["neighbors"], meta["grid_x"], meta["grid_y"],
+            meta["threshold"], meta["scale"]
+        )
+
+    @staticmethod
+    def read_meta(directory) -> Optional[Dict[str, Any]]:
+        meta_file = Path(directory) / META_FILE
+        if not meta_file.exists():
+            return None
+        with open(meta_file) as f:
+            return json.load(f)
+
+    def save(self, directory, **extra_meta):
+        """
+        Write histograms.npy, labels.npy and meta.json
+
+        meta.json is written last, so a reader that finds it also finds
+        complete arrays.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        meta_file = directory / META_FILE
+        if meta_file.exists():
+            meta_file.unlink()
+
+        for name, array in ((HISTOGRAMS_FILE, self.histograms), (LABELS_FILE, self.labels)):
+            tmp_path = directory / f"{name}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp_path, directory / name)
+
+        meta = {
+            "radius": self.radius,
+            "neighbors": self.neighbors,
+            "grid_x": self.grid_x,
+            "grid_y": self.grid_y,
+            "threshold": self.threshold,
+            "scale": self.scale,
+            "dtype": str(self.histograms.dtype),
+            "histograms": len(self.labels),
+            **extra_meta
+        }
+        tmp_path = directory / f"{META_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_file)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.histograms.nbytes + self.labels.nbytes)
+
+    def predict(self, face) -> Tuple[int, float]:
+        """(label, distance) of the nearest histogram, or (-1, inf) beyond the threshold"""
+        if len(self.labels) == 0:
+            return -1, float("inf")
+
+        counts, area = lbph_counts(face, self.radius, self.neighbors, self.grid_x, self.grid_y)
+        return self._nearest(counts / area)
+
+    def predict_batch(self, faces: np.ndarray) -> List[Tuple[int, float]]:
+        """predict() for every face of a (N, rows, cols) stack, coding all faces in one pass"""
+        faces = np.asarray(faces)
+        if len(self.labels) == 0:
+            return [(-1, float("inf"))] * len(faces)
+        if len(faces) == 0:
+            return []
+
+        counts, area = lbph_counts_batch(faces, self.radius, self.neighbors, self.grid_x, self.grid_y)
+        return [self._nearest(row / area) for row in counts]
+
+    def _nearest(self, histogram: np.ndarray) -> Tuple[int, float]:
+        # Compare in the stored units: chi-square scales linearly with the histograms
+        query = histogram / self.scale
+        if self._row_sums is None:
+            self._row_sums = histogram_sums(self.histograms)
+        distances = chi_square_distances(self.histograms, query, self._row_sums) * self.scale
+
+        best = int(np.argmin(distances))
+        if distances[best] >= self.threshold:
+            return -1, float("inf")
+        return int(self.labels[best]), float(distances[best])
+
+    # cv2.face.LBPHFaceRecognizer getters, used when cutting shards or copies
+    def getHistograms(self) -> List[np.ndarray]:
+        return [(np.asarray(row, dtype=np.float32) * np.float32(self.scale)).reshape(1, -1)
+                for row in self.histograms]
+
+    def getLabels(self) -> np.ndarray:
+        return self.labels.reshape(-1, 1)
+
+    def getRadius(self):
+        return self.radius
+
+    def getNeighbors(self):
+        return self.neighbors
+
+    def getGridX(self):
+        return self.grid_x
+
+    def getGridY(self):
+        return self.grid_y
+
+    def getThreshold(self):
+        return self.threshold
+
+
+def _counts_or_floats(histograms: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Store histograms as exact uint16 bin counts when they are counts / area
+
+    The smallest non-zero bin of a trained model is one pixel of a cell,
+    i.e. 1 / area. If every bin is a whole multiple of it the model is
+    stored as counts; otherwise it is kept as float32.
+    """
+    nonzero = histograms[histograms > 0]
+    if nonzero.size:
+        area = round(1.0 / float(nonzero.min()))
+        counts = np.rint(histograms.astype(np.float64) * area)
+        if 0 < area <= np.iinfo(np.uint16).max and np.allclose(counts / area, histograms, rtol=0, atol=1e-6):
+            return counts.astype(np.uint16), 1.0 / area
+    return histograms.astype(np.float32), 1.0
@@ -0,0 +1,105 @@
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.face_detectors import DETECTOR_BACKENDS, FaceDetector
+from attendance.face_feature_store import PHOTO_EXTENSIONS
+from attendance.model_registry import get_model_dir
+
+
+def box_iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    intersection = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the face detector backends at several detection resolutions: latency per "
+            "frame and recall against full-resolution HOG detection")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--frames', default=None,
+            help='Directory of frames/photos, searched recursively (default: ml_models/student_photos)'
+        )
+        parser.add_argument(
+            '--backends', default=','.join(DETECTOR_BACKENDS),
+            help=f"Comma-separated backends (default: {','.join(DETECTOR_BACKENDS)})"
+        )
+        parser.add_argument(
+            '--max-dimensions', default='0,1280,960,640,480',
+            help='Comma-separated detection resolutions (longest side in pixels, 0 = full frame)'
+        )
+        parser.add_argument('--iou', type=float, default=0.4, help='IoU for a detection to match a reference face')
+        parser.add_argument('--limit', type=int, default=None, help='Use at most this many frames')
+
+    def handle(self, *args, **options):
+        backends = [b.strip() for b in options['backends'].split(',') if b.strip()]
+        unknown = set(backends) - set(DETECTOR_BACKENDS)
+        if unknown:
+            raise CommandError(f"Unknown backends: {', '.join(sorted(unknown))}")
+        try:
+            dimensions = [int(d) or None for d in options['max_dimensions'].split(',')]
+        except ValueError:
+            raise CommandError("--max-dimensions must be comma-separated integers")
+
+        frames_dir = Path(options['frames']) if options['frames'] else get_model_dir() / "student_photos"
+        frames = self._load_frames(frames_dir, options['limit'])
+        if not frames:
+            raise CommandError(f"No frames found in {frames_dir}")
+
+        # Reference faces: HOG on the full-resolution frame, the engine's original detector
+        reference_detector = FaceDetector('hog', None, str(get_model_dir()))
+        references = [reference_detector.detect(frame) for frame in frames]
+        reference_faces = sum(len(faces) for faces in references)
+        pixels = np.mean([frame.shape[0] * frame.shape[1] for frame in frames])
+        self.stdout.write(f"{len(frames)} frames ({pixels / 1e6:.2f} MP average), "
+                          f"{reference_faces} faces found by full-resolution HOG\n")
+
+        self.stdout.write(f"{'backend':8} {'max dim':>8} {'mean ms':>9} {'p95 ms':>8} {'faces':>6} {'recall':>7}")
+        for backend in backends:
+            for max_dimension in dimensions:
+                detector = FaceDetector(backend, max_dimension, str(get_model_dir()))
+                if backend == 'dnn' and detector.describe()['dnn_available'] is False:
+                    self.stdout.write(self.style.WARNING("dnn      model files missing, skipped"))
+                    break
+                self._report(detector, frames, references, reference_faces, options['iou'])
+
+    def _report(self, detector, frames, references, reference_faces, iou):
+        timings = []
+        found = matched = 0
+        for frame, reference in zip(frames, references):
+            started = time.perf_counter()
+            faces = detector.detect(frame)
+            timings.append((time.perf_counter() - started) * 1000)
+            found += len(faces)
+            matched += sum(any(box_iou(ref, face) >= iou for face in faces) for ref in reference)
+
+        recall = f"{matched / reference_faces:.1%}" if reference_faces else "n/a"
+        self.stdout.write(
+            f"{detector.backend:8} {detector.max_dimension or 'full':>8} {np.mean(timings):9.1f} "
+            f"{np.percentile(timings, 95):8.1f} {found:6} {recall:>7}"
+        )
+
+    def _load_frames(self, frames_dir, limit):
+        """Frames as RGB arrays, like the engine decodes them"""
+        frames = []
+        for path in sorted(frames_dir.rglob('*')):
+            if path.suffix.lower() not in PHOTO_EXTENSIONS:
+                continue
+            image = cv2.imread(str(path))
+            if image is None:
+                self.stderr.write(f"{path}: could not be read")
+                continue
+            frames.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            if limit and len(frames) >= limit:
+                break
+        return frames
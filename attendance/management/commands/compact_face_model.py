@@ -0,0 +1,107 @@
+import pickle
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.face_config import face_config
+from attendance.face_feature_store import PHOTO_EXTENSIONS, detect_photo_rois
+from attendance.lbph_compact import CompactLBPHRecognizer, prune_histograms
+from attendance.model_registry import (
+    export_compact_lbph, get_compact_dir, get_model_dir, read_lbph_recognizer
+)
+
+
+class Command(BaseCommand):
+    help = ("Export face_trainer.yml to the compact memory-mapped format, optionally pruned to "
+            "k medoid histograms per student, and report size, load time, predict time and "
+            "accuracy on held-out photos against the YAML model")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune', type=int, default=getattr(settings, 'FACE_LBPH_PRUNE_PER_STUDENT', None),
+            help='Histograms kept per student (default: FACE_LBPH_PRUNE_PER_STUDENT, i.e. no pruning)'
+        )
+        parser.add_argument(
+            '--holdout', default=None,
+            help='Directory of <matric_number>/ photo folders not used for training '
+                 '(default: ml_models/holdout_photos)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report only, do not write ml_models/compact/')
+
+    def handle(self, *args, **options):
+        model_file = get_model_dir() / "face_trainer.yml"
+        if not model_file.exists():
+            raise CommandError("Face recognition model not found. Please train the model first.")
+        with open(get_model_dir() / "labels.pkl", "rb") as f:
+            id_to_matric = {label: matric for matric, label in pickle.load(f).items()}
+
+        started = time.perf_counter()
+        recognizer = read_lbph_recognizer()
+        yaml_load_ms = (time.perf_counter() - started) * 1000
+
+        if options['dry_run']:
+            compact = CompactLBPHRecognizer.from_recognizer(recognizer)
+            if options['prune']:
+                keep = prune_histograms(compact.histograms, compact.labels, options['prune'])
+                compact = CompactLBPHRecognizer.from_recognizer(recognizer, keep=keep)
+            compact_load_ms = None
+        else:
+            export_compact_lbph(recognizer, options['prune'])
+            started = time.perf_counter()
+            compact = CompactLBPHRecognizer.load(get_compact_dir())
+            compact_load_ms = (time.perf_counter() - started) * 1000
+
+        full_histograms = len(recognizer.getLabels())
+        full_bytes = sum(h.nbytes for h in recognizer.getHistograms())
+        self.stdout.write(f"YAML model:    {full_histograms} histograms, {model_file.stat().st_size / 2**20:.1f} MiB "
+                          f"on disk, {full_bytes / 2**20:.1f} MiB in memory, loaded in {yaml_load_ms:.0f} ms")
+        self.stdout.write(f"Compact model: {len(compact.labels)} histograms ({compact.histograms.dtype}), "
+                          f"{compact.nbytes / 2**20:.1f} MiB memory-mapped"
+                          + (f", loaded in {compact_load_ms:.1f} ms" if compact_load_ms is not None else ""))
+
+        holdout_dir = Path(options['holdout']) if options['holdout'] else get_model_dir() / "holdout_photos"
+        faces = self._holdout_faces(holdout_dir)
+        if not faces:
+            self.stdout.write(self.style.WARNING(f"No held-out faces found in {holdout_dir}; accuracy not measured"))
+            return
+
+        threshold = face_config.get_optimized_config()['confidence_threshold']
+        full = self._evaluate(recognizer, faces, id_to_matric, threshold)
+        reduced = self._evaluate(compact, faces, id_to_matric, threshold)
+
+        self.stdout.write(f"\nHeld-out faces: {len(faces)} (confidence threshold {threshold})")
+        for name, result in (('YAML', full), ('Compact', reduced)):
+            self.stdout.write(f"  {name:8} accuracy {result['accuracy']:.1%}, "
+                              f"predict {result['predict_ms']:.2f} ms/face")
+        delta = reduced['accuracy'] - full['accuracy']
+        style = self.style.SUCCESS if delta >= 0 else self.style.WARNING
+        self.stdout.write(style(f"  Accuracy delta: {delta * 100:+.1f} points"))
+
+    def _holdout_faces(self, holdout_dir):
+        """(matric_number, face ROI) for every face detected in the held-out photos"""
+        if not holdout_dir.is_dir():
+            return []
+        config = face_config.get_optimized_config()
+        faces = []
+        for student_dir in sorted(p for p in holdout_dir.iterdir() if p.is_dir()):
+            for photo in sorted(student_dir.iterdir()):
+                if photo.suffix.lower() not in PHOTO_EXTENSIONS:
+                    continue
+                try:
+                    rois = detect_photo_rois(photo.read_bytes(), config)
+                except ValueError as e:
+                    self.stderr.write(f"{photo}: {e}")
+                    continue
+                faces.extend((student_dir.name, roi) for roi in rois)
+        return faces
+
+    def _evaluate(self, recognizer, faces, id_to_matric, threshold):
+        correct = 0
+        started = time.perf_counter()
+        for matric_number, face in faces:
+            label, confidence = recognizer.predict(face)
+            correct += confidence < threshold and id_to_matric.get(label) == matric_number
+        elapsed = time.perf_counter() - started
+        return {'accuracy': correct / len(faces), 'predict_ms': elapsed * 1000 / len(faces)}
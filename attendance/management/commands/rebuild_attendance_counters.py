@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from attendance import attendance_counters
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the per-registration attendance counters (ExamEligibility total/attended classes, "
+            "percentage and eligibility) from the attendance records")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            written = attendance_counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} attendance counters in {time.perf_counter() - started:.2f}s"
+        ))
@@ -68,11 +68,20 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING('DRY RUN - No changes will be made'))
         
         try:
-            if not dry_run:
-                auto_mark_absent_enhanced()
+            report = auto_mark_absent_enhanced(dry_run=dry_run)
             
+            for slot in report['slots']:
+                self.stdout.write(
+                    f"  {slot['course_code']} ({slot['level']}, ended {slot['end_time']}): "
+                    f"{slot['absent']} students without attendance"
+                )
+            
+            if dry_run:
+                summary = f"{report['absent']} students would be marked absent"
+            else:
+                summary = f"{report['written']} students marked absent"
             self.stdout.write(
-                self.style.SUCCESS('✓ Auto-mark absent completed')
+                self.style.SUCCESS(f'✓ Auto-mark absent completed: {summary} for {len(report["slots"])} ended slots')
             )
         except Exception as e:
             self.stdout.write(
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0008_add_presence_tracking_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('course_id', models.UUIDField()),
+                ('department_id', models.UUIDField(blank=True, null=True)),
+                ('level', models.IntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('present', 'Present'), ('late', 'Late'), ('absent', 'Absent'), ('partial', 'Partial')], max_length=10)),
+                ('records', models.PositiveIntegerField(default=0)),
+                ('detected_records', models.PositiveIntegerField(default=0, help_text='Records with at least one face detection')),
+                ('detections', models.PositiveIntegerField(default=0, help_text='Sum of detection counts')),
+                ('presence_total', models.FloatField(default=0.0, help_text='Sum of presence percentages')),
+                ('presence_records', models.PositiveIntegerField(default=0, help_text='Records with a presence percentage')),
+                ('detected_presence_total', models.FloatField(default=0.0, help_text='Sum of presence percentages of detected records')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Attendance Rollup',
+                'verbose_name_plural': 'Daily Attendance Rollups',
+                'unique_together': {('date', 'course_id', 'status')},
+                'indexes': [
+                    models.Index(fields=['date', 'department_id'], name='attendance__date_197fd6_idx'),
+                    models.Index(fields=['date', 'status'], name='attendance__date_b68594_idx'),
+                ],
+            },
+        ),
+    ]
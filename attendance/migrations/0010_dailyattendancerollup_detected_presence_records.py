@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0009_dailyattendancerollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyattendancerollup',
+            name='detected_presence_records',
+            field=models.PositiveIntegerField(default=0, help_text='Detected records with a presence percentage'),
+        ),
+    ]
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Face Model Registry
+
+Loads each face recognition artifact (LBPH model and labels, SVM classifier
+and label encoder, dlib FaceProcessor) at most once per process, on first
+use. Callers receive an immutable, versioned ModelHandle. Reloading builds
+the new model off to the side and swaps the handle in one assignment, so
+frames that already hold the previous handle finish with a consistent
+model while new frames pick up the new one.
+"""
+
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+LBPH_MODEL = 'lbph'
+SVM_MODEL = 'svm'
+FACE_PROCESSOR = 'face_processor'
+
+
+@dataclass(frozen=True)
+class ModelHandle:
+    """An immutable snapshot of a loaded model"""
+    name: str
+    version: int
+    model: Any
+    loaded_at: datetime
+
+
+class LBPHShardSet:
+    """
+    Per-department / per-level LBPH recognizers cut from the global model
+
+    Each shard holds only the histograms of the students of one department
+    ("department-<id>") or level ("level-<id>"), so a prediction scans a
+    fraction of the model. Shards are read from disk on first use.
+    """
+
+    def __init__(self, directory, shard_labels: Mapping[str, Iterable[int]]):
+        self.directory = Path(directory)
+        self.shard_labels = {key: frozenset(labels) for key, labels in shard_labels.items()}
+        self._recognizers: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self.shard_labels
+
+    def keys(self):
+        return self.shard_labels.keys()
+
+    def get(self, key: str):
+        recognizer = self._recognizers.get(key)
+        if recognizer is None:
+            import cv2
+            with self._lock:
+                recognizer = self._recognizers.get(key)
+                if recognizer is None:
+                    recognizer = cv2.face.LBPHFaceRecognizer_create()
+                    recognizer.read(str(self.directory / f"{key}.yml"))
+                    self._recognizers[key] = recognizer
+        return recognizer
+
+
+@dataclass(frozen=True)
+class LBPHModel:
+    """LBPH recognizer together with the label mapping it was trained with"""
+    recognizer: Any
+    label_map: Mapping[str, int]
+    id_to_matric: Mapping[int, str]
+    shards: Optional[LBPHShardSet] = None
+
+    def recognizers_for(self, shard_keys=None) -> List[Any]:
+        """Shard recognizers for the keys, or the global recognizer as fallback"""
+        if self.shards is None or not shard_keys:
+            return [self.recognizer]
+        recognizers = [self.shards.get(key) for key in shard_keys if key in self.shards]
+        return recognizers or [self.recognizer]
+
+    def predict(self, face, shard_keys=None) -> Tuple[int, float]:
+        """Best (label, confidence) over the recognizers for the shard keys"""
+        return min(
+            (recognizer.predict(face) for recognizer in self.recognizers_for(shard_keys)),
+            key=lambda prediction: prediction[1]
+        )
+
+    def predict_batch(self, faces, shard_keys=None) -> List[Tuple[int, float]]:
+        """predict() for every face of an (N, height, width) stack"""
+        per_recognizer = [
+            recognizer.predict_batch(faces) if hasattr(recognizer, 'predict_batch')
+            else [recognizer.predict(face) for face in faces]
+            for recognizer in self.recognizers_for(shard_keys)
+        ]
+        return [min(predictions, key=lambda prediction: prediction[1]) for predictions in zip(*per_recognizer)]
+
+
+@dataclass(frozen=True)
+class SVMModel:
+    """SVM classifier over face embeddings and its label encoder"""
+    classifier: Any
+    label_encoder: Any
+
+
+def get_model_dir() -> Path:
+    return Path(settings.BASE_DIR) / "ml_models"
+
+
+def load_lbph_model() -> LBPHModel:
+    """
+    Load face_trainer.yml and labels.pkl from the model directory
+
+    When FACE_LBPH_COMPACT is enabled and ml_models/compact/ was exported
+    from the current face_trainer.yml, the memory-mapped compact model is
+    used instead of parsing the YAML.
+    """
+    model_file = get_model_dir() / "face_trainer.yml"
+    labels_file = get_model_dir() / "labels.pkl"
+
+    if not model_file.exists():
+        raise FileNotFoundError("Face recognition model not found. Please train the model first.")
+    if not labels_file.exists():
+        raise FileNotFoundError("Labels file not found. Please train the model first.")
+
+    recognizer = load_compact_lbph_recognizer() or read_lbph_recognizer()
+
+    with open(labels_file, "rb") as f:
+        label_map = pickle.load(f)
+
+    logger.info(f"Loaded LBPH model with {len(label_map)} student labels")
+    return LBPHModel(
+        recognizer=recognizer,
+        label_map=MappingProxyType(dict(label_map)),
+        id_to_matric=MappingProxyType({v: k for k, v in label_map.items()}),
+        shards=load_lbph_shards(label_map)
+    )
+
+
+def read_lbph_recognizer():
+    """Full, trainable cv2 recognizer parsed from face_trainer.yml"""
+    import cv2
+
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(str(get_model_dir() / "face_trainer.yml"))
+    return recognizer
+
+
+def get_compact_dir() -> Path:
+    return get_model_dir() / "compact"
+
+
+def _model_file_stamp() -> Dict[str, int]:
+    stat = (get_model_dir() / "face_trainer.yml").stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_compact_lbph_recognizer():
+    """Memory-mapped compact recognizer, if enabled and exported from the current YAML model"""
+    from .lbph_compact import CompactLBPHRecognizer
+
+    if not getattr(settings, 'FACE_LBPH_COMPACT', False):
+        return None
+    meta = CompactLBPHRecognizer.read_meta(get_compact_dir())
+    if meta is None or meta.get('source') != _model_file_stamp():
+        return None
+
+    recognizer = CompactLBPHRecognizer.load(get_compact_dir())
+    logger.info(f"Loaded compact LBPH model ({meta['histograms']} histograms, {meta['dtype']})")
+    return recognizer
+
+
+def export_compact_lbph(recognizer, prune_per_student: Optional[int] = None):
+    """
+    Write the compact form of a trained recognizer to ml_models/compact/
+
+    Args:
+        recognizer: cv2 recognizer matching the current face_trainer.yml
+        prune_per_student: Keep only this many medoid histograms per student
+
+    Returns:
+        CompactLBPHRecognizer: The exported (memory-mapped) model
+    """
+    from .lbph_compact import CompactLBPHRecognizer, prune_histograms
+
+    compact = CompactLBPHRecognizer.from_recognizer(recognizer)
+    if prune_per_student:
+        keep = prune_histograms(compact.histograms, compact.labels, prune_per_student)
+        compact = CompactLBPHRecognizer.from_recognizer(recognizer, keep=keep)
+
+    compact.save(get_compact_dir(), source=_model_file_stamp(), pruned_per_student=prune_per_student)
+    logger.info(f"Exported compact LBPH model with {len(compact.labels)} histograms")
+    return CompactLBPHRecognizer.load(get_compact_dir())
+
+
+def get_shards_dir() -> Path:
+    return get_model_dir() / "shards"
+
+
+def load_lbph_shards(label_map) -> Optional[LBPHShardSet]:
+    """Shard set described by shards/index.json, if it matches the label map"""
+    index_file = get_shards_dir() / "index.json"
+    if not index_file.exists():
+        return None
+
+    with open(index_file) as f:
+        index = json.load(f)
+    if index.get('label_map') != dict(label_map):
+        # Written by a different training run than the global model
+        logger.warning("Ignoring LBPH shards that do not match the current labels")
+        return None
+
+    return LBPHShardSet(get_shards_dir() / index['token'], index['shards'])
+
+
+def save_lbph_shards(recognizer, label_map, shard_labels: Mapping[str, Iterable[int]]) -> LBPHShardSet:
+    """
+    Cut shard recognizers out of a global recognizer and write them to disk
+
+    Shards are written to a fresh directory and published by atomically
+    replacing shards/index.json. The generation being replaced is kept, as
+    other processes may still hold a handle on it and load its shards
+    lazily until they reload; older generations are removed.
+    """
+    shards_dir = get_shards_dir()
+    shards_dir.mkdir(parents=True, exist_ok=True)
+    previous_token = None
+    try:
+        with open(shards_dir / "index.json") as f:
+            previous_token = json.load(f).get('token')
+    except (OSError, ValueError):
+        pass
+    token = uuid.uuid4().hex
+    directory = shards_dir / token
+    directory.mkdir()
+
+    shard_labels = {key: sorted(set(labels)) for key, labels in shard_labels.items() if labels}
+    for key, labels in shard_labels.items():
+        write_lbph_subset(recognizer, directory / f"{key}.yml", include_labels=labels)
+
+    index_tmp = shards_dir / "index.json.tmp"
+    with open(index_tmp, "w") as f:
+        json.dump({'token': token, 'label_map': dict(label_map), 'shards': shard_labels}, f)
+    os.replace(index_tmp, shards_dir / "index.json")
+
+    for old_directory in shards_dir.iterdir():
+        if old_directory.is_dir() and old_directory.name not in (token, previous_token):
+            shutil.rmtree(old_directory, ignore_errors=True)
+
+    logger.info(f"Saved {len(shard_labels)} LBPH shards")
+    return LBPHShardSet(directory, shard_labels)
+
+
+def save_lbph_model(recognizer, label_map, shard_labels=None) -> ModelHandle:
+    """
+    Persist a freshly trained LBPH model and publish it to this process
+
+    Files are written next to their destination and renamed into place, so
+    a concurrent reload never reads a half-written model. With
+    FACE_LBPH_COMPACT the compact model is exported too and published in
+    place of the cv2 recognizer.
+
+    Args:
+        recognizer: Trained global recognizer
+        label_map: matric_number -> label id
+        shard_labels: Optional shard key -> label ids to cut shards for
+    """
+    model_dir = get_model_dir()
+    model_dir.mkdir(exist_ok=True)
+    shards = save_lbph_shards(recognizer, label_map, shard_labels) if shard_labels else None
+
+    model_tmp = model_dir / "face_trainer.yml.tmp"
+    labels_tmp = model_dir / "labels.pkl.tmp"
+    recognizer.write(str(model_tmp))
+    with open(labels_tmp, "wb") as f:
+        pickle.dump(dict(label_map), f)
+    os.replace(model_tmp, model_dir / "face_trainer.yml")
+    os.replace(labels_tmp, model_dir / "labels.pkl")
+
+    if getattr(settings, 'FACE_LBPH_COMPACT', False):
+        recognizer = export_compact_lbph(recognizer, getattr(settings, 'FACE_LBPH_PRUNE_PER_STUDENT', None))
+
+    return model_registry.swap(LBPH_MODEL, LBPHModel(
+        recognizer=recognizer,
+        label_map=MappingProxyType(dict(label_map)),
+        id_to_matric=MappingProxyType({v: k for k, v in label_map.items()}),
+        shards=shards
+    ))
+
+
+def write_lbph_subset(recognizer, path, include_labels=None, exclude_labels=()) -> int:
+    """
+    Write the histograms of some labels of an LBPH recognizer as a model file
+
+    Args:
+        include_labels: Labels to keep (default: all)
+        exclude_labels: Labels to drop
+
+    Returns:
+        int: Number of histograms written
+    """
+    import cv2
+
+    include_labels = set(include_labels) if include_labels is not None else None
+    exclude_labels = set(exclude_labels)
+    histograms = recognizer.getHistograms()
+    labels = recognizer.getLabels()
+    keep = [
+        i for i, label in enumerate(labels.ravel())
+        if int(label) not in exclude_labels and (include_labels is None or int(label) in include_labels)
+    ]
+
+    storage = cv2.FileStorage(str(path), cv2.FILE_STORAGE_WRITE)
+    storage.startWriteStruct('opencv_lbphfaces', cv2.FileNode_MAP)
+    storage.write('threshold', float(recognizer.getThreshold()))
+    storage.write('radius', int(recognizer.getRadius()))
+    storage.write('neighbors', int(recognizer.getNeighbors()))
+    storage.write('grid_x', int(recognizer.getGridX()))
+    storage.write('grid_y', int(recognizer.getGridY()))
+    storage.startWriteStruct('histograms', cv2.FileNode_SEQ)
+    for i in keep:
+        storage.write('', histograms[i])
+    storage.endWriteStruct()
+    storage.write('labels', labels[keep].reshape(-1, 1))
+    storage.startWriteStruct('labelsInfo', cv2.FileNode_SEQ)
+    storage.endWriteStruct()
+    storage.endWriteStruct()
+    storage.release()
+    return len(keep)
+
+
+def copy_lbph_recognizer(recognizer, exclude_labels=()):
+    """
+    Independent copy of an LBPH recognizer, optionally without some labels
+
+    LBPH can only add histograms (update()), so a student's histograms are
+    replaced by copying the model without their label and updating the copy.
+    Copying also keeps the recognizer that live frames are using untouched.
+    """
+    import cv2
+
+    fd, path = tempfile.mkstemp(suffix='.yml', dir=get_model_dir())
+    os.close(fd)
+    try:
+        if write_lbph_subset(recognizer, path, exclude_labels=exclude_labels) == 0:
+            return cv2.face.LBPHFaceRecognizer_create(
+                recognizer.getRadius(), recognizer.getNeighbors(),
+                recognizer.getGridX(), recognizer.getGridY(), recognizer.getThreshold()
+            )
+        copy = cv2.face.LBPHFaceRecognizer_create()
+        copy.read(path)
+        return copy
+    finally:
+        os.remove(path)
+
+
+def load_svm_model() -> SVMModel:
+    """Load the SVM face classifier and label encoder"""
+    import joblib
+
+    model_path = get_model_dir() / "svm_face_classifier.pkl"
+    encoder_path = get_model_dir() / "label_encoder.pkl"
+
+    if not model_path.exists():
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+    if not encoder_path.exists():
+        raise FileNotFoundError(f"Label encoder file not found: {encoder_path}")
+
+    classifier = joblib.load(str(model_path))
+    with open(encoder_path, 'rb') as f:
+        label_encoder = pickle.load(f)
+
+    logger.info("Loaded SVM face classifier")
+    return SVMModel(classifier=classifier, label_encoder=label_encoder)
+
+
+def load_face_processor():
+    """Build the dlib detector, shape predictor and ResNet encoder"""
+    from recognition.face_utils import FaceProcessor
+    return FaceProcessor()
+
+
+class ModelRegistry:
+    """Process-wide registry of lazily loaded, atomically swappable models"""
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._handles: Dict[str, ModelHandle] = {}
+        self._versions: Dict[str, int] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """Register the function that builds a model"""
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> ModelHandle:
+        """
+        Get the current handle for a model, loading it on first use
+
+        Raises:
+            KeyError: If no loader is registered under the name
+            Exception: Whatever the loader raises (e.g. FileNotFoundError)
+        """
+        handle = self._handles.get(name)
+        if handle is not None:
+            return handle
+
+        with self._load_locks[name]:
+            # Another thread may have finished loading while we waited
+            handle = self._handles.get(name)
+            if handle is None:
+                handle = self._build_handle(name, self._loaders[name]())
+                self._handles[name] = handle
+            return handle
+
+    def get_if_loaded(self, name: str) -> Optional[ModelHandle]:
+        return self._handles.get(name)
+
+    def version(self, name: str) -> int:
+        """Number of times the model was built in this process (0 if never), without loading it"""
+        return self._versions.get(name, 0)
+
+    def reload(self, name: str) -> ModelHandle:
+        """Rebuild a model from its loader and swap it in"""
+        with self._load_locks[name]:
+            model = self._loaders[name]()
+            return self._swap(name, model)
+
+    def swap(self, name: str, model: Any) -> ModelHandle:
+        """Publish an already built model (e.g. right after training)"""
+        with self._load_locks[name]:
+            return self._swap(name, model)
+
+    def _swap(self, name: str, model: Any) -> ModelHandle:
+        handle = self._build_handle(name, model)
+        self._handles[name] = handle
+        logger.info(f"Model '{name}' swapped to version {handle.version}")
+        return handle
+
+    def _build_handle(self, name: str, model: Any) -> ModelHandle:
+        with self._lock:
+            version = self._versions.get(name, 0) + 1
+            self._versions[name] = version
+        return ModelHandle(name=name, version=version, model=model, loaded_at=timezone.now())
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            name: {
+                'loaded': name in self._handles,
+                'version': self._handles[name].version if name in self._handles else None,
+                'loaded_at': self._handles[name].loaded_at.isoformat() if name in self._handles else None
+            }
+            for name in self._loaders
+        }
+
+
+# Global model registry
+model_registry = ModelRegistry()
+model_registry.register(LBPH_MODEL, load_lbph_model)
+model_registry.register(SVM_MODEL, load_svm_model)
+model_registry.register(FACE_PROCESSOR, load_face_processor)
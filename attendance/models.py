@@ -278,6 +278,13 @@ class AttendanceDetection(models.Model):
         blank=True,
         help_text="Additional context about the detection session"
     )
+    idempotency_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Client event id of detections ingested from edge recognizers"
+    )
 
     class Meta:
         ordering = ['-detected_at']
@@ -372,6 +379,40 @@ class ExamEligibility(models.Model):
         status = "Eligible" if self.is_eligible else "Not Eligible"
         return f"{self.student.matric_number} - {self.course_registration.course.code} - {status}"
 
+
+class DailyAttendanceRollup(models.Model):
+    """Attendance counts per day, course and status for admin analytics"""
+    date = models.DateField()
+    # Dimensions copied from the course, so rollups survive course edits and need no joins
+    course_id = models.UUIDField()
+    department_id = models.UUIDField(null=True, blank=True)
+    level = models.IntegerField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=Attendance.STATUS_CHOICES)
+
+    records = models.PositiveIntegerField(default=0)
+    detected_records = models.PositiveIntegerField(default=0, help_text="Records with at least one face detection")
+    detections = models.PositiveIntegerField(default=0, help_text="Sum of detection counts")
+    presence_total = models.FloatField(default=0.0, help_text="Sum of presence percentages")
+    presence_records = models.PositiveIntegerField(default=0, help_text="Records with a presence percentage")
+    detected_presence_total = models.FloatField(default=0.0, help_text="Sum of presence percentages of detected records")
+    detected_presence_records = models.PositiveIntegerField(
+        default=0, help_text="Detected records with a presence percentage"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('date', 'course_id', 'status')
+        verbose_name = "Daily Attendance Rollup"
+        verbose_name_plural = "Daily Attendance Rollups"
+        indexes = [
+            models.Index(fields=['date', 'department_id']),
+            models.Index(fields=['date', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.course_id} - {self.status}: {self.records}"
+
+
 # Legacy model for backward compatibility
 class Timetable(models.Model):
     """Legacy timetable model"""
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Coalescing Presence Accumulator
+
+With presence tracking every recognition of a student updated the
+Attendance row (detection count, first/last detection, presence duration
+and percentage) and inserted an AttendanceDetection row, at the frame rate
+of every camera.
+
+The accumulator merges detections in memory per attendance record (first
+and last seen, count, confidence sum) and writes them every FLUSH_INTERVAL
+seconds, and before a class session is finalized, as one bulk_update of
+the touched Attendance rows plus one batched AttendanceDetection insert.
+Only every DETECTION_SAMPLING-th detection of a record is kept as an
+AttendanceDetection row; detection_count still counts all of them.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import attendance_counters
+from .models import Attendance, AttendanceDetection
+from .presence_tracking_service import presence_tracking_service
+
+logger = logging.getLogger(__name__)
+
+ATTENDANCE_FIELDS = [
+    'detection_count', 'first_detected_at', 'last_detected_at', 'presence_duration',
+    'presence_percentage', 'status', 'avg_confidence', 'updated_at'
+]
+
+
+@dataclass
+class PresenceEntry:
+    """Detections of one attendance record since the last flush"""
+    first_seen: datetime
+    last_seen: datetime
+    count: int = 0
+    confidence_sum: float = 0.0
+    detections: List[AttendanceDetection] = field(default_factory=list)
+
+    @property
+    def mean_confidence(self) -> float:
+        return self.confidence_sum / self.count if self.count else 0.0
+
+    def merge(self, other: 'PresenceEntry'):
+        self.first_seen = min(self.first_seen, other.first_seen)
+        self.last_seen = max(self.last_seen, other.last_seen)
+        self.count += other.count
+        self.confidence_sum += other.confidence_sum
+        self.detections.extend(other.detections)
+
+
+class PresenceAccumulator:
+    """Collects presence detections in memory and writes them in bulk"""
+
+    BATCH_SIZE = 500  # Rows per bulk_update / bulk_create statement
+
+    def __init__(self, flush_interval: Optional[float] = None, detection_sampling: Optional[int] = None):
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            getattr(settings, 'FACE_PRESENCE_FLUSH_INTERVAL', 10.0)
+        self.detection_sampling = detection_sampling if detection_sampling is not None else \
+            getattr(settings, 'FACE_PRESENCE_DETECTION_SAMPLING', 1)
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[Any, PresenceEntry] = {}
+        # Detections seen per attendance record, for sampling across flushes
+        self._seen: Dict[Any, int] = {}
+        self._timer: Optional[threading.Timer] = None
+
+        self.stats = {
+            'detections_recorded': 0,
+            'detection_rows_sampled': 0,
+            'flushes': 0,
+            'attendance_rows_updated': 0,
+            'last_flush_at': None,
+            'last_flush_duration': 0.0
+        }
+
+    def record(self, attendance: Attendance, confidence: float, detected_at: Optional[datetime] = None,
+               session_context: Optional[Dict[str, Any]] = None, bounding_box: Optional[Dict] = None,
+               camera_id: str = ''):
+        """Queue one detection of a student for an attendance record"""
+        detected_at = detected_at or timezone.now()
+
+        with self._lock:
+            entry = self._pending.get(attendance.id)
+            if entry is None:
+                entry = self._pending[attendance.id] = PresenceEntry(detected_at, detected_at)
+            entry.first_seen = min(entry.first_seen, detected_at)
+            entry.last_seen = max(entry.last_seen, detected_at)
+            entry.count += 1
+            entry.confidence_sum += confidence
+
+            seen = self._seen.get(attendance.id, 0)
+            self._seen[attendance.id] = seen + 1
+            if self.detection_sampling and seen % self.detection_sampling == 0:
+                entry.detections.append(AttendanceDetection(
+                    attendance_id=attendance.id,
+                    confidence_score=confidence,
+                    bounding_box=bounding_box,
+                    camera_id=camera_id,
+                    session_context=dict(session_context or {}, detected_at=detected_at.isoformat())
+                ))
+                self.stats['detection_rows_sampled'] += 1
+
+            self.stats['detections_recorded'] += 1
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self):
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def flush(self) -> int:
+        """
+        Write all accumulated detections
+
+        Returns:
+            int: Number of attendance records updated
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            if not pending:
+                return 0
+
+            start_time = time.time()
+            try:
+                with transaction.atomic():
+                    updated = self._write(pending)
+            except Exception as e:
+                logger.error(f"Error flushing presence detections for {len(pending)} attendance records: {e}")
+                # Keep the detections for the next flush
+                with self._lock:
+                    for attendance_id, entry in pending.items():
+                        newer = self._pending.get(attendance_id)
+                        if newer is not None:
+                            entry.merge(newer)
+                        self._pending[attendance_id] = entry
+                    self._schedule_flush()
+                return 0
+
+            duration = time.time() - start_time
+            self.stats['flushes'] += 1
+            self.stats['attendance_rows_updated'] += updated
+            self.stats['last_flush_at'] = timezone.now().isoformat()
+            self.stats['last_flush_duration'] = round(duration, 4)
+            logger.debug(f"Flushed presence of {updated} attendance records in {duration:.3f}s")
+            return updated
+
+    def _write(self, pending: Dict[Any, PresenceEntry]) -> int:
+        now = timezone.now()
+        records = Attendance.objects.select_related('class_session').select_for_update(of=('self',)) \
+            .in_bulk(list(pending))
+
+        detections = []
+        status_changes = []
+        for attendance_id, attendance in records.items():
+            entry = pending[attendance_id]
+            previous_count = attendance.detection_count
+            previous_status = attendance.status
+            presence_tracking_service.apply_detections(attendance, entry.count, entry.first_seen, entry.last_seen)
+            # save() would derive the status the same way
+            if not attendance.is_manual_override:
+                attendance.status = attendance.determine_attendance_status()
+            previous_mean = attendance.avg_confidence if attendance.avg_confidence is not None else entry.mean_confidence
+            attendance.avg_confidence = (
+                previous_mean * previous_count + entry.confidence_sum
+            ) / attendance.detection_count
+            attendance.updated_at = now
+            detections.extend(entry.detections)
+            if attendance.status != previous_status:
+                status_changes.append(
+                    (attendance.student_id, attendance.course_registration_id, previous_status, attendance.status)
+                )
+
+        Attendance.objects.bulk_update(records.values(), ATTENDANCE_FIELDS, batch_size=self.BATCH_SIZE)
+        AttendanceDetection.objects.bulk_create(detections, batch_size=self.BATCH_SIZE)
+        attendance_counters.record_status_changes(status_changes)
+        return len(records)
+
+    def forget(self, attendance_ids):
+        """Drop sampling state of finalized attendance records"""
+        with self._lock:
+            for attendance_id in attendance_ids:
+                self._seen.pop(attendance_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+            queued = sum(entry.count for entry in self._pending.values())
+        return dict(self.stats, pending_records=pending, pending_detections=queued,
+                    flush_interval=self.flush_interval, detection_sampling=self.detection_sampling)
+
+
+# Global presence accumulator
+presence_accumulator = PresenceAccumulator()
+atexit.register(presence_accumulator.flush)
@@ -13,6 +13,7 @@ from django.db import transaction
 from django.db.models import Q, Count, Avg, Sum
 import logging
 
+from . import attendance_counters
 from .models import Attendance, CourseRegistration
 from students.models import Student
 from courses.models import TimetableEntry
@@ -23,6 +24,8 @@ logger = logging.getLogger(__name__)
 class PresenceTrackingService:
     """Service for tracking student presence duration during classes"""
     
+    FINALIZE_BATCH_SIZE = 500  # Attendance rows per UPDATE when finalizing a session
+    
     def __init__(self):
         self.active_tracking_sessions = {}  # Track active presence sessions
         self.presence_thresholds = {
@@ -32,10 +35,11 @@ class PresenceTrackingService:
         }
     
     def start_presence_tracking(self, student: Student, course_registration: CourseRegistration, 
-                              timetable_entry: Optional[TimetableEntry] = None) -> Attendance:
-        """Start tracking presence for a student in a class session"""
+                              timetable_entry: Optional[TimetableEntry] = None,
+                              date: Optional[datetime] = None) -> Attendance:
+        """Start tracking presence for a student in a class session (today unless date is given)"""
         
-        today = timezone.now().date()
+        today = date or timezone.now().date()
         
         # Calculate expected class duration
         class_duration = self._calculate_class_duration(timetable_entry)
@@ -66,24 +70,18 @@ class PresenceTrackingService:
         if detection_timestamp is None:
             detection_timestamp = timezone.now()
         
+        return self.record_presence_detections(attendance, [detection_timestamp])
+    
+    def record_presence_detections(self, attendance: Attendance, detection_timestamps: List[datetime]) -> bool:
+        """Record several detection events for a student, saving the attendance once"""
+        
+        if not detection_timestamps:
+            return False
+        
         with transaction.atomic():
-            # Update detection count
-            attendance.detection_count += 1
-            
-            # Update first/last detection times
-            if not attendance.first_detected_at:
-                attendance.first_detected_at = detection_timestamp
-            attendance.last_detected_at = detection_timestamp
-            
-            # Calculate presence duration
-            self._update_presence_duration(attendance, detection_timestamp)
-            
-            # Update presence percentage
-            attendance.update_presence_percentage()
-            
-            # Update status based on current presence
-            self._update_attendance_status(attendance)
-            
+            self.apply_detections(
+                attendance, len(detection_timestamps), min(detection_timestamps), max(detection_timestamps)
+            )
             attendance.save()
             
             logger.debug(f"Recorded presence for {attendance.student.matric_number}: "
@@ -92,6 +90,27 @@ class PresenceTrackingService:
         
         return True
     
+    def apply_detections(self, attendance: Attendance, count: int, earliest: datetime, latest: datetime):
+        """Merge detection events into the attendance record in memory, without saving it"""
+        
+        # Update detection count
+        attendance.detection_count += count
+        
+        # Update first/last detection times
+        if not attendance.first_detected_at or earliest < attendance.first_detected_at:
+            attendance.first_detected_at = earliest
+        if not attendance.last_detected_at or latest > attendance.last_detected_at:
+            attendance.last_detected_at = latest
+        
+        # Calculate presence duration
+        self._update_presence_duration(attendance, latest)
+        
+        # Update presence percentage
+        attendance.update_presence_percentage()
+        
+        # Update status based on current presence
+        self._update_attendance_status(attendance)
+    
     def _update_presence_duration(self, attendance: Attendance, detection_timestamp: datetime):
         """Update the presence duration based on detection patterns"""
         
@@ -138,40 +157,10 @@ class PresenceTrackingService:
         if date is None:
             date = timezone.now().date()
         
-        # Get all attendance records for this session
-        attendance_records = Attendance.objects.filter(
-            course_registration=course_registration,
-            date=date
+        finalized_count, status_changes = self._finalize_records(
+            Attendance.objects.filter(course_registration=course_registration, date=date)
         )
         
-        finalized_count = 0
-        status_changes = []
-        
-        for attendance in attendance_records:
-            old_status = attendance.status
-            
-            # Final calculation of presence percentage
-            attendance.update_presence_percentage()
-            
-            # Final status determination
-            self._update_attendance_status(attendance)
-            
-            # Mark as finalized (locked)
-            attendance.is_locked = True
-            attendance.save()
-            
-            if old_status != attendance.status:
-                status_changes.append({
-                    'student_id': attendance.student.id,
-                    'matric_number': attendance.student.matric_number,
-                    'old_status': old_status,
-                    'new_status': attendance.status,
-                    'presence_percentage': attendance.presence_percentage,
-                    'presence_duration_minutes': attendance.presence_duration.total_seconds() / 60 if attendance.presence_duration else 0
-                })
-            
-            finalized_count += 1
-        
         logger.info(f"Finalized {finalized_count} attendance records for {course_registration.course.code}, "
                    f"{len(status_changes)} status changes")
         
@@ -182,6 +171,87 @@ class PresenceTrackingService:
             'date': date.isoformat()
         }
     
+    def finalize_class_sessions(self, course_registrations, date: Optional[datetime] = None) -> Dict:
+        """Finalize attendance for every registration of a class session in one transaction"""
+        
+        if date is None:
+            date = timezone.now().date()
+        
+        finalized_count, status_changes = self._finalize_records(
+            Attendance.objects.filter(course_registration__in=course_registrations, date=date)
+        )
+        
+        logger.info(f"Finalized {finalized_count} attendance records, {len(status_changes)} status changes")
+        
+        return {
+            'finalized_count': finalized_count,
+            'status_changes': status_changes,
+            'date': date.isoformat()
+        }
+    
+    def _finalize_records(self, attendance_records) -> Tuple[int, List[Dict]]:
+        """
+        Recompute presence and status of the records in memory and lock them
+        
+        Records whose percentage or status changed are written with bulk_update,
+        the rest are locked with one UPDATE.
+        """
+        
+        now = timezone.now()
+        changed = []
+        lock_only = []
+        status_changes = []
+        counted_changes = []
+        
+        # Detections still held by the accumulator belong to this session
+        from .presence_accumulator import presence_accumulator
+        presence_accumulator.flush()
+        
+        with transaction.atomic():
+            records = list(
+                attendance_records.select_related('student', 'class_session').select_for_update(of=('self',))
+            )
+            
+            for attendance in records:
+                old_status = attendance.status
+                old_percentage = attendance.presence_percentage
+                
+                # Final calculation of presence percentage and status, as save() would derive them
+                attendance.update_presence_percentage()
+                attendance.status = attendance.determine_attendance_status()
+                attendance.is_locked = True
+                attendance.updated_at = now
+                
+                if attendance.status != old_status or attendance.presence_percentage != old_percentage:
+                    changed.append(attendance)
+                else:
+                    lock_only.append(attendance.id)
+                
+                if old_status != attendance.status:
+                    counted_changes.append(
+                        (attendance.student_id, attendance.course_registration_id, old_status, attendance.status)
+                    )
+                    status_changes.append({
+                        'student_id': attendance.student.id,
+                        'matric_number': attendance.student.matric_number,
+                        'old_status': old_status,
+                        'new_status': attendance.status,
+                        'presence_percentage': attendance.presence_percentage,
+                        'presence_duration_minutes': attendance.presence_duration.total_seconds() / 60 if attendance.presence_duration else 0
+                    })
+            
+            Attendance.objects.bulk_update(
+                changed, ['presence_percentage', 'status', 'is_locked', 'updated_at'],
+                batch_size=self.FINALIZE_BATCH_SIZE
+            )
+            for start in range(0, len(lock_only), self.FINALIZE_BATCH_SIZE):
+                Attendance.objects.filter(id__in=lock_only[start:start + self.FINALIZE_BATCH_SIZE]) \
+                    .update(is_locked=True, updated_at=now)
+            attendance_counters.record_status_changes(counted_changes)
+        
+        presence_accumulator.forget([attendance.id for attendance in records])
+        return len(records), status_changes
+    
     def get_real_time_attendance_stats(self, course_registration: CourseRegistration, 
                                      date: Optional[datetime] = None) -> Dict:
         """Get real-time attendance statistics for a course"""
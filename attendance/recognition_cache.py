@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Recognition Result Cache
+
+In a classroom most faces sit still for the whole lecture, yet every frame
+used to re-run the LBPH predictions and re-load the Student row for every
+face. This cache remembers the outcome per face position, keyed by camera
+and face track (when the camera is tracked) or by a coarse spatial bucket
+of the face box otherwise. Frames without a camera id are never cached:
+their grid cells would be shared by every such client, so a face confirmed
+in one room could be served for a different person in another.
+
+An entry is only served once the same label has been recorded for it
+confirmations_required times in a row, so a single lucky (or unlucky)
+prediction is never frozen in. Entries expire after a short TTL and are
+tied to the model version they were computed with; the least recently
+used entries are evicted when the cache is full.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, NamedTuple, Optional
+
+class CachedStudent(NamedTuple):
+    """The Student fields frame processing and attendance marking need"""
+    id: int
+    user_id: Optional[int]
+    matric_number: str
+    full_name: str
+
+    @classmethod
+    def from_student(cls, student) -> 'CachedStudent':
+        return cls(student.id, student.user_id, student.matric_number, student.full_name)
+
+
+@dataclass
+class CachedRecognition:
+    """Last recognizer outcome for one face position"""
+    label_id: int
+    confidence: float
+    student: Optional[CachedStudent]
+    model_version: Optional[int]
+    confirmed_at: float
+    confirmations: int = 1
+
+
+class RecognitionCache:
+    """Bounded TTL/LRU cache of recognition results"""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 5.0,
+                 confirmations_required: int = 2, bucket_size: int = 48):
+        """
+        Args:
+            max_entries: Entries kept before the least recently used are evicted
+            ttl: Seconds an entry stays valid after it was last confirmed
+            confirmations_required: Matching predictions before an entry is served
+            bucket_size: Pixel size of the spatial grid for untracked faces
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.confirmations_required = confirmations_required
+        self.bucket_size = bucket_size
+
+        self._entries: 'OrderedDict[Hashable, CachedRecognition]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'unconfirmed': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+    def key_for(self, camera_id=None, track=None, box=None) -> Optional[Hashable]:
+        """Cache key of a face: its track if tracked, else a spatial bucket of its box; None without a camera"""
+        if not camera_id:
+            return None
+        camera = str(camera_id)
+        if track is not None:
+            return ('track', camera, track.track_id)
+
+        x, y, w, h = box
+        bucket = self.bucket_size
+        return ('cell', camera, int(x + w / 2) // bucket, int(y + h / 2) // bucket, int(max(w, h)) // bucket)
+
+    def get(self, key: Hashable, model_version: Optional[int] = None) -> Optional[CachedRecognition]:
+        """Return a confirmed, fresh entry for the key, or None"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            if time.time() - entry.confirmed_at > self.ttl or entry.model_version != model_version:
+                del self._entries[key]
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            if entry.confirmations < self.confirmations_required:
+                self.stats['unconfirmed'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def put(self, key: Optional[Hashable], label_id: int, confidence: float,
+            student: Optional[CachedStudent], model_version: Optional[int] = None) -> Optional[CachedRecognition]:
+        """
+        Record a fresh recognizer outcome
+
+        A prediction matching the stored label confirms the entry and renews
+        its TTL; a different label replaces it and starts confirmation over.
+        Only outcomes of an actual prediction should be recorded.
+        """
+        if key is None:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None and entry.label_id == label_id
+                    and entry.model_version == model_version and now - entry.confirmed_at <= self.ttl):
+                entry.confirmations += 1
+                entry.confidence = confidence
+                entry.student = student
+                entry.confirmed_at = now
+            else:
+                entry = CachedRecognition(label_id, confidence, student, model_version, now)
+                self._entries[key] = entry
+
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+            return entry
+
+    def discard(self, key: Optional[Hashable]):
+        if key is None:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(
+                self.stats,
+                entries=len(self._entries),
+                max_entries=self.max_entries,
+                ttl=self.ttl,
+                hit_rate=round(self.stats['hits'] / lookups * 100, 1) if lookups else 0
+            )
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Recognition Worker Pool
+
+Frame recognition is CPU-bound (cascade passes, filters, LBPH predictions)
+and, when run in the request thread, holds the GIL for the OpenCV glue and
+makes every camera wait on every other one. When FACE_RECOGNITION_WORKERS is
+set, frames are handed to that many worker processes instead. Each worker
+loads the face model at startup and keeps its own camera tracking state, so
+a camera is always routed to the same worker.
+
+Reloads, retraining and enrollment only swap the model in the web
+process's registry. Every frame therefore carries the web process's LBPH
+model version, and a worker that is behind reloads its model from disk
+before processing the frame.
+
+Every worker accepts at most FACE_RECOGNITION_QUEUE_SIZE frames in flight.
+A frame arriving while its worker is full is dropped immediately with a
+retry-after hint rather than queued behind stale frames.
+
+With FACE_RECOGNITION_WORKERS = 0 (the default) frames are processed in the
+calling thread exactly as before.
+"""
+
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from .model_registry import model_registry, LBPH_MODEL
+from .stage_timing import return_stage_timings, stage_timings
+
+logger = logging.getLogger(__name__)
+
+# Web process LBPH version the model of this worker process matches
+_worker_model_version: Optional[int] = None
+
+
+class FrameDropped(Exception):
+    """Raised when every slot of the target worker is busy"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Recognition workers busy, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def run_frame(frame_data, session_id=None, department_id=None, camera_id=None, model_version=None):
+    """
+    Process one frame with the configured recognition service (runs in a worker)
+
+    Encoded image bytes are passed through untouched; the service decodes
+    them straight to the image it needs. model_version is the web process's
+    LBPH version when the frame was submitted to a worker.
+    """
+    from attendance import face_tracking_views
+
+    _sync_model(face_tracking_views.face_recognition_service, model_version)
+    return face_tracking_views.face_recognition_service.process_frame(
+        frame_data, session_id, department_id, camera_id=camera_id
+    )
+
+
+def _sync_model(service, model_version):
+    """Reload the worker's model when the web process has published a newer one"""
+    global _worker_model_version
+    if model_version is None or _worker_model_version is None or model_version <= _worker_model_version:
+        return
+    # Recorded even if the reload fails, so a broken model is not re-read for every frame
+    _worker_model_version = model_version
+    result = service.reload_models()
+    if result.get('success'):
+        logger.info(f"Recognition worker {os.getpid()} reloaded its model for version {model_version}")
+    else:
+        logger.error(f"Recognition worker {os.getpid()} could not reload its model: {result.get('message')}")
+
+
+def end_camera_session(camera_id):
+    """Drop a camera's tracking state in the worker that holds it"""
+    from .camera_sessions import camera_session_manager
+    return camera_session_manager.end_session(camera_id)
+
+
+def _init_worker(settings_module, model_version):
+    """Set up Django in a freshly spawned worker and warm the face model"""
+    global _worker_model_version
+    # The files loaded below are at least as new as the web process's model
+    _worker_model_version = model_version
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    django.setup()
+
+    # Stage timings travel back with each result to the web process's aggregator
+    from attendance.stage_timing import attach_timings_to_results
+    attach_timings_to_results()
+
+    from attendance.model_registry import model_registry, LBPH_MODEL
+    try:
+        model_registry.get(LBPH_MODEL)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Recognition worker {os.getpid()} could not load model: {e}")
+
+
+class RecognitionWorkerPool:
+    """Fixed set of single-process executors with bounded in-flight frames"""
+
+    def __init__(self, worker_count: int, queue_size: int):
+        self.worker_count = worker_count
+        self.queue_size = queue_size
+        self._executors: List[Optional[ProcessPoolExecutor]] = [None] * worker_count
+        self._in_flight = [0] * worker_count
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()
+
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'dropped': 0,
+            'avg_processing_time': 0.0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.worker_count > 0
+
+    def _select_worker(self, camera_id) -> int:
+        if camera_id:
+            # Sticky routing keeps a camera's face tracks on one worker
+            return zlib.crc32(str(camera_id).encode()) % self.worker_count
+        # Cameraless frames go to the least busy worker
+        start = next(self._round_robin) % self.worker_count
+        order = [(start + i) % self.worker_count for i in range(self.worker_count)]
+        return min(order, key=lambda index: self._in_flight[index])
+
+    def _get_executor(self, index: int) -> ProcessPoolExecutor:
+        executor = self._executors[index]
+        if executor is None:
+            executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(
+                    os.environ.get("DJANGO_SETTINGS_MODULE", "backend.settings"),
+                    model_registry.version(LBPH_MODEL)
+                )
+            )
+            self._executors[index] = executor
+            logger.info(f"Started recognition worker {index}")
+        return executor
+
+    def retry_after(self) -> float:
+        """Rough time until a slot frees up, for Retry-After headers"""
+        return max(1.0, round(self.stats['avg_processing_time'] * self.queue_size, 1))
+
+    def submit(self, frame_data, session_id=None, department_id=None, camera_id=None) -> Future:
+        """
+        Queue a frame on a worker
+
+        Raises:
+            FrameDropped: If the selected worker already has queue_size frames in flight
+        """
+        with self._lock:
+            index = self._select_worker(camera_id)
+            if self._in_flight[index] >= self.queue_size:
+                self.stats['dropped'] += 1
+                raise FrameDropped(self.retry_after())
+            self._in_flight[index] += 1
+            self.stats['submitted'] += 1
+            executor = self._get_executor(index)
+
+        submitted_at = time.time()
+        try:
+            future = executor.submit(
+                run_frame, frame_data, session_id, department_id, camera_id, model_registry.version(LBPH_MODEL)
+            )
+        except Exception:
+            with self._lock:
+                self._in_flight[index] -= 1
+                # A crashed worker is replaced on the next frame
+                self._executors[index] = None
+            raise
+
+        # Callers get the result only after the worker's stage timings were recorded here
+        result = Future()
+        future.add_done_callback(lambda f: self._on_done(index, submitted_at, f, result))
+        return result
+
+    def _on_done(self, index: int, submitted_at: float, future: Future, result: Future):
+        elapsed = time.time() - submitted_at
+        with self._lock:
+            self._in_flight[index] -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.stats['failed'] += 1
+            else:
+                self.stats['completed'] += 1
+                completed = self.stats['completed']
+                self.stats['avg_processing_time'] += (elapsed - self.stats['avg_processing_time']) / completed
+
+        if future.cancelled():
+            result.cancel()
+        elif future.exception() is not None:
+            result.set_exception(future.exception())
+        else:
+            frame_results = future.result()
+            timings = frame_results.get('stage_timings') if isinstance(frame_results, dict) else None
+            if timings:
+                stage_timings.record(timings)
+                if not return_stage_timings():
+                    del frame_results['stage_timings']
+            result.set_result(frame_results)
+
+    def end_session(self, camera_id) -> Optional[Future]:
+        """Ask the camera's worker to drop its tracking state, if that worker is running"""
+        with self._lock:
+            executor = self._executors[self._select_worker(camera_id)]
+        if executor is None:
+            return None
+        try:
+            return executor.submit(end_camera_session, camera_id)
+        except Exception as e:
+            logger.warning(f"Could not end session of camera {camera_id} on its worker: {e}")
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                self.stats,
+                enabled=self.enabled,
+                workers=self.worker_count,
+                queue_size=self.queue_size,
+                queue_depth=sum(self._in_flight),
+                queue_depth_per_worker=list(self._in_flight),
+                avg_processing_time=round(self.stats['avg_processing_time'], 4)
+            )
+
+    def shutdown(self):
+        for executor in self._executors:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._executors = [None] * self.worker_count
+
+
+# Global recognition worker pool
+recognition_pool = RecognitionWorkerPool(
+    worker_count=getattr(settings, 'FACE_RECOGNITION_WORKERS', 0),
+    queue_size=getattr(settings, 'FACE_RECOGNITION_QUEUE_SIZE', 2)
+)
+atexit.register(recognition_pool.shutdown)
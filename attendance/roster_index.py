@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Roster Index for Active Timetable Slots
+
+Frame processing needs to know, for every active timetable slot, which
+students are expected in the room. Rather than evaluating the multi-join
+student queryset for every slot on every frame (and again for every
+recognized face), the roster of a slot is built once and kept in memory
+until a course selection, student or timetable slot change invalidates it
+(see the receivers in students/caching.py).
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from django.conf import settings
+
+from students.models import Student
+
+logger = logging.getLogger(__name__)
+
+
+def roster_students(slot):
+    """Queryset of the students expected in a timetable slot"""
+    return Student.objects.filter(
+        course_selections__course_id=slot.course_id,
+        course_selections__level_id=slot.level_id,
+        course_selections__is_offered=True,
+        course_selections__is_approved=True,
+        department_id=slot.timetable.department_id,
+        is_active=True,
+        is_approved=True
+    ).distinct()
+
+
+class SlotRoster:
+    """Immutable snapshot of the students expected in one timetable slot"""
+
+    def __init__(self, slot, students: List[Dict[str, Any]]):
+        self.slot_id = slot.id
+        self.course_id = slot.course_id
+        self.level_id = slot.level_id
+        self.department_id = slot.timetable.department_id
+        self.built_at = time.time()
+
+        self.student_ids: FrozenSet[int] = frozenset(s['student_id'] for s in students)
+        self.students_by_matric: Dict[str, Dict[str, Any]] = {s['matric_number']: s for s in students}
+
+        self.slot_info = {
+            'id': slot.id,
+            'course_code': slot.course.code,
+            'course_title': slot.course.title,
+            'level': slot.level.name,
+            'department': slot.timetable.department.name,
+            'lecturer': slot.lecturer.get_full_name() if slot.lecturer else '',
+            'time_slot': f"{slot.start_time} - {slot.end_time}",
+            'venue': slot.venue,
+            'expected_students_count': len(self.student_ids)
+        }
+        # Content hash, identical in every process that builds the same roster
+        self.version = _content_version([self.slot_info, sorted(self.students_by_matric.items())])
+
+    def shard_key(self, sharding: Optional[str]) -> Optional[str]:
+        """Key of the LBPH shard holding this slot's students ('department' or 'level' sharding)"""
+        if sharding == 'department':
+            return f"department-{self.department_id}"
+        if sharding == 'level':
+            return f"level-{self.level_id}"
+        return None
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def __contains__(self, student_id):
+        return student_id in self.student_ids
+
+
+class RosterIndex:
+    """Per-process cache of slot rosters keyed by timetable slot id"""
+
+    # Upper bound on staleness for changes made in other worker processes,
+    # whose signals never reach this process
+    ROSTER_TTL = 300  # seconds
+
+    def __init__(self):
+        self._rosters: Dict[Any, SlotRoster] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_roster(self, slot) -> SlotRoster:
+        """Get the roster for a timetable slot, building it on first use"""
+        roster = self._rosters.get(slot.id)
+        if roster is not None and time.time() - roster.built_at < self.ROSTER_TTL:
+            self.hits += 1
+            return roster
+
+        self.misses += 1
+        roster = self._build_roster(slot)
+        with self._lock:
+            self._rosters[slot.id] = roster
+        return roster
+
+    def get_rosters(self, slots: Iterable) -> List[SlotRoster]:
+        return [self.get_roster(slot) for slot in slots]
+
+    def _build_roster(self, slot) -> SlotRoster:
+        students = roster_students(slot).values('id', 'matric_number', 'full_name')
+
+        roster = SlotRoster(slot, [
+            {
+                'student_id': s['id'],
+                'matric_number': s['matric_number'],
+                'full_name': s['full_name'],
+                'course_code': slot.course.code,
+                'level': slot.level.name
+            }
+            for s in students
+        ])
+        logger.debug(f"Built roster for slot {slot.id}: {len(roster)} students")
+        return roster
+
+    def _invalidate(self, predicate):
+        with self._lock:
+            stale = [slot_id for slot_id, roster in self._rosters.items() if predicate(roster)]
+            for slot_id in stale:
+                del self._rosters[slot_id]
+        return len(stale)
+
+    def invalidate_slot(self, slot_id):
+        return self._invalidate(lambda roster: roster.slot_id == slot_id)
+
+    def invalidate_course(self, course_id, level_id=None):
+        """Drop rosters affected by a course selection change"""
+        return self._invalidate(
+            lambda roster: roster.course_id == course_id and (level_id is None or roster.level_id == level_id)
+        )
+
+    def invalidate_department(self, department_id):
+        """Drop rosters of a department, e.g. after a student record changes"""
+        return self._invalidate(lambda roster: roster.department_id == department_id)
+
+    def clear(self):
+        with self._lock:
+            self._rosters.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'cached_rosters': len(self._rosters),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+def _content_version(content) -> str:
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+def roster_version(rosters: Iterable[SlotRoster]) -> str:
+    """
+    Version tag of the slot info and expected students of a set of rosters
+
+    Frame responses carry it so clients only need the roster itself when
+    the tag changes (see frame_protocol).
+    """
+    return _content_version(sorted(roster.version for roster in rosters))
+
+
+def shard_keys_for(rosters: Iterable[SlotRoster]) -> List[str]:
+    """
+    LBPH shard keys covering the students of the active slots
+
+    An empty list (sharding disabled or no active slots) means the global
+    model is used.
+    """
+    sharding = getattr(settings, 'FACE_RECOGNITION_SHARDING', None)
+    return sorted({roster.shard_key(sharding) for roster in rosters} - {None})
+
+
+# Global roster index
+roster_index = RosterIndex()
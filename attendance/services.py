@@ -3,6 +3,7 @@ from attendance.models import Attendance
 from students.models import Student
 from courses.models import TimetableEntry, CourseRegistration
 from attendance.utils import get_current_timetable_entry
+from attendance.absence_marking import mark_absent_for_ended_slots
 
 
 def record_attendance(student):
@@ -27,36 +28,14 @@ def auto_mark_absent():
     """
     Marks students ABSENT if class ended and no attendance was recorded
     """
-    now = timezone.localtime()
-    current_day = now.strftime('%a').upper()[:3]
-
-    ended_classes = TimetableEntry.objects.filter(
-        day_of_week=current_day,
-        end_time__lt=now.time()
-    )
+    return mark_absent_for_ended_slots()
 
-    for entry in ended_classes:
-        students = StudentCourse.objects.filter(
-            course_offering=entry.course_offering,
-            is_active=True
-        ).values_list('student', flat=True)
-
-        for student_id in students:
-            Attendance.objects.get_or_create(
-                student_id=student_id,
-                timetable_entry=entry,
-                defaults={"status": "absent"}
-            )
-            
 def lock_finished_attendance():
     now = timezone.localtime()
-    attendances = Attendance.objects.filter(
+    return Attendance.objects.filter(
         timetable_entry__end_time__lt=now.time(),
         is_locked=False
-    )
-
-    for record in attendances:
-        record.lock()
+    ).update(is_locked=True, updated_at=timezone.now())
 
 def mark_attendance(student_matric):
     try:
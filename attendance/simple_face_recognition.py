@@ -7,11 +7,8 @@ Integrates with Django models and timetable system
 import cv2
 import pickle
 import numpy as np
-import base64
-import io
 from datetime import datetime, date
 from pathlib import Path
-from PIL import Image
 import logging
 import csv
 
@@ -19,13 +16,20 @@ import csv
 from django.conf import settings
 from django.utils import timezone
 from students.models import Student, StudentCourseSelection
-from attendance.models import Attendance, CourseRegistration
+from attendance.models import Attendance
 from courses.models import TimetableSlot
 from live_sessions.models import LiveSession, LiveSessionParticipant
 
 logger = logging.getLogger(__name__)
 
 from .face_config import face_config
+from .camera_sessions import camera_session_manager
+from .roster_index import roster_index, roster_version, shard_keys_for
+from .attendance_buffer import attendance_buffer
+from .model_registry import model_registry, LBPH_MODEL
+from .frame_decoding import decode_frame, scale_box
+from .recognition_cache import CachedStudent
+from .stage_timing import StageTimer
 
 class SimpleFaceRecognitionService:
     def __init__(self):
@@ -43,16 +47,11 @@ class SimpleFaceRecognitionService:
         self.SCALE_FACTOR = self.config["scale_factor"]
         self.MIN_NEIGHBORS = self.config["min_neighbors"]
         self.MAX_FACES_PER_FRAME = self.config["max_faces_per_frame"]
+        self.DETECTION_MAX_DIMENSION = getattr(settings, 'FACE_DETECTION_MAX_DIMENSION', None)
         
-        # Initialize components
-        self.recognizer = None
-        self.label_map = {}
-        self.id_to_matric = {}
+        # Initialize components (the LBPH model itself lives in the model registry)
         self.face_cascade = None
         
-        # Daily attendance tracking (like your logged_today)
-        self.logged_today = {}
-        
         self._load_models()
     
     def reload_config(self):
@@ -66,32 +65,21 @@ class SimpleFaceRecognitionService:
         logger.info(f"Configuration reloaded for {self.config['student_count']} students")
     
     def _load_models(self):
-        """Load face recognition models using your proven approach"""
+        """
+        Load the face cascade and check the trained model is available
+        
+        The LBPH model and labels are loaded lazily, once per process, by the
+        model registry on the first frame.
+        """
         try:
-            # Create recognizer
-            self.recognizer = cv2.face.LBPHFaceRecognizer_create()
-            
             if not self.model_file.exists():
                 logger.error(f"Model file not found: {self.model_file}")
                 raise FileNotFoundError("Face recognition model not found. Please train the model first.")
             
-            self.recognizer.read(str(self.model_file))
-            logger.info("Simple face recognition model loaded successfully")
-            
-            # Load label mappings
             if not self.labels_file.exists():
                 logger.error(f"Labels file not found: {self.labels_file}")
                 raise FileNotFoundError("Labels file not found. Please train the model first.")
             
-            with open(self.labels_file, "rb") as f:
-                self.label_map = pickle.load(f)
-            
-            # Create reverse mapping (label_id -> matric_number)
-            self.id_to_matric = {v: k for k, v in self.label_map.items()}
-            
-            logger.info(f"Loaded {len(self.label_map)} student labels")
-            logger.info(f"Label mappings: {self.label_map}")
-            
             # Load face cascade
             self.face_cascade = cv2.CascadeClassifier(self.cascade_path)
             if self.face_cascade.empty():
@@ -104,91 +92,34 @@ class SimpleFaceRecognitionService:
             logger.error(f"Failed to load face recognition models: {e}")
             raise
     
-    def _mark_attendance(self, matric_number, course_code=None, timetable_slot_id=None):
-        """Mark attendance using existing database approach"""
-        today = timezone.now().date()
-        
-        # Check if already logged today
-        cache_key = f"{matric_number}_{course_code or 'general'}"
-        last_logged = self.logged_today.get(cache_key)
-        if last_logged == today:
-            return {
-                'success': False,
-                'message': f'Already marked today for {matric_number}',
-                'already_marked': True
-            }
-        
-        timestamp = timezone.now()
-        
-        try:
-            # Get student
-            student = Student.objects.get(matric_number=matric_number)
-            
-            # Write to database using existing approach
-            if course_code:
-                # Find course registration
-                course_registration = CourseRegistration.objects.filter(
-                    student=student,
-                    course__code=course_code
-                ).first()
-                
-                if not course_registration:
-                    # Create basic course registration if needed
-                    from courses.models import Course
-                    course = Course.objects.filter(code=course_code).first()
-                    if course:
-                        course_registration = CourseRegistration.objects.create(
-                            student=student,
-                            course=course,
-                            academic_year='2025/2026',
-                            semester='Semester 1'
-                        )
-            else:
-                # General attendance - use first available course registration
-                course_registration = CourseRegistration.objects.filter(student=student).first()
-            
-            if course_registration:
-                # Check if attendance already exists
-                existing_attendance = Attendance.objects.filter(
-                    student=student,
-                    course_registration=course_registration,
-                    date=today
-                ).first()
-                
-                if not existing_attendance:
-                    Attendance.objects.create(
-                        student=student,
-                        course_registration=course_registration,
-                        date=today,
-                        status='present',
-                        recorded_at=timestamp,
-                        is_manual_override=False
-                    )
-            
-            # Update cache
-            self.logged_today[cache_key] = today
-            
-            logger.info(f"[{timestamp.strftime('%Y-%m-%d %H:%M:%S')}] MARKED: {matric_number} ({student.full_name})")
-            
-            return {
-                'success': True,
-                'message': f'Attendance marked for {student.full_name}',
+    @property
+    def lbph_model(self):
+        """Current LBPH model snapshot from the process-wide registry"""
+        return model_registry.get(LBPH_MODEL).model
+    
+    @property
+    def recognizer(self):
+        return self.lbph_model.recognizer
+    
+    @property
+    def label_map(self):
+        return self.lbph_model.label_map
+    
+    @property
+    def id_to_matric(self):
+        return self.lbph_model.id_to_matric
+    
+    def _mark_attendance(self, student, timetable_slot):
+        """Queue attendance in the write buffer, which dedupes per slot and writes in bulk"""
+        result = attendance_buffer.mark(student.id, timetable_slot, user_id=student.user_id)
+        if result['success']:
+            timestamp = timezone.now()
+            logger.info(f"[{timestamp.strftime('%Y-%m-%d %H:%M:%S')}] MARKED: {student.matric_number} ({student.full_name})")
+            result.update({
                 'student_name': student.full_name,
                 'timestamp': timestamp.isoformat()
-            }
-            
-        except Student.DoesNotExist:
-            logger.warning(f"Student not found: {matric_number}")
-            return {
-                'success': False,
-                'message': f'Student {matric_number} not found in database'
-            }
-        except Exception as e:
-            logger.error(f"Error marking attendance for {matric_number}: {e}")
-            return {
-                'success': False,
-                'message': str(e)
-            }
+            })
+        return result
     
     def get_current_timetable_slots(self):
         """Get current active timetable slots"""
@@ -211,38 +142,31 @@ class SimpleFaceRecognitionService:
         
         return active_slots
     
-    def get_students_for_timetable_slot(self, timetable_slot):
-        """Get students expected for a timetable slot"""
-        return Student.objects.filter(
-            course_selections__course=timetable_slot.course,
-            course_selections__level=timetable_slot.level,
-            course_selections__is_offered=True,
-            course_selections__is_approved=True,
-            department=timetable_slot.timetable.department,
-            is_active=True,
-            is_approved=True
-        ).distinct()
-    
-    def process_frame(self, frame_data, session_id=None, department_id=None):
-        """Process frame using your proven recognition approach"""
+    def process_frame(self, frame_data, session_id=None, department_id=None, camera_id=None):
+        """
+        Process frame using your proven recognition approach
+
+        When camera_id is given, faces are tracked across frames of that camera
+        and an already identified face is only re-predicted every few frames.
+        """
+        timer = StageTimer('simple_lbph')
         try:
-            # Convert frame data to OpenCV format
-            if isinstance(frame_data, str):
-                image_data = base64.b64decode(frame_data.split(',')[1])
-                image = Image.open(io.BytesIO(image_data))
-                frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            else:
-                frame = frame_data
+            # One model snapshot per frame, unaffected by concurrent reloads
+            lbph = self.lbph_model
             
-            # Convert to grayscale (your approach)
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            # Decode straight to grayscale (your approach); very large frames are
+            # decoded at a reduced resolution and boxes are scaled back with frame_scale
+            with timer.span('decode'):
+                gray, frame_scale = decode_frame(frame_data, grayscale=True,
+                                                 max_dimension=self.DETECTION_MAX_DIMENSION)
             
             # Detect faces using your proven parameters
-            faces = self.face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=self.SCALE_FACTOR,
-                minNeighbors=self.MIN_NEIGHBORS
-            )
+            with timer.span('detect'):
+                faces = self.face_cascade.detectMultiScale(
+                    gray,
+                    scaleFactor=self.SCALE_FACTOR,
+                    minNeighbors=self.MIN_NEIGHBORS
+                )
             
             # Limit faces for performance with 30+ users
             if len(faces) > self.MAX_FACES_PER_FRAME:
@@ -266,61 +190,79 @@ class SimpleFaceRecognitionService:
                 'expected_students': []
             }
             
-            # Add timetable information
-            for slot in active_slots:
-                expected_students = self.get_students_for_timetable_slot(slot)
-                slot_info = {
-                    'id': slot.id,
-                    'course_code': slot.course.code,
-                    'course_title': slot.course.title,
-                    'level': slot.level.name,
-                    'department': slot.timetable.department.name,
-                    'lecturer': slot.lecturer.user.get_full_name(),
-                    'time_slot': f"{slot.start_time} - {slot.end_time}",
-                    'venue': slot.venue,
-                    'expected_students_count': expected_students.count()
-                }
-                results['active_timetable_slots'].append(slot_info)
+            # Add timetable information from the cached rosters
+            with timer.span('timetable'):
+                slot_rosters = [(slot, roster_index.get_roster(slot)) for slot in active_slots]
+            expected_matrics = set()
+            for slot, roster in slot_rosters:
+                results['active_timetable_slots'].append(roster.slot_info)
                 
                 # Add expected students
-                for student in expected_students:
-                    if student.matric_number not in [s['matric_number'] for s in results['expected_students']]:
-                        results['expected_students'].append({
-                            'student_id': student.id,
-                            'matric_number': student.matric_number,
-                            'full_name': student.full_name,
-                            'course_code': slot.course.code,
-                            'level': slot.level.name
-                        })
+                for matric_number, summary in roster.students_by_matric.items():
+                    if matric_number not in expected_matrics:
+                        expected_matrics.add(matric_number)
+                        results['expected_students'].append(summary)
+            
+            results['roster_version'] = roster_version(roster for _, roster in slot_rosters)
+            
+            # Only the department/level shards of the active slots are searched
+            shard_keys = shard_keys_for(roster for _, roster in slot_rosters)
+            results['lbph_shards'] = [key for key in shard_keys if lbph.shards is not None and key in lbph.shards]
+            
+            # Follow faces across frames of a streaming camera
+            camera_session = camera_session_manager.get_session(camera_id) if camera_id else None
+            tracks = camera_session.track_faces(faces) if camera_session else [None] * len(faces)
             
             # Process each detected face
             for i, (x, y, w, h) in enumerate(faces):
-                # Extract and resize face ROI (your approach)
-                roi = gray[y:y+h, x:x+w]
-                roi_resized = cv2.resize(roi, self.IMG_SIZE)
+                track = tracks[i]
                 
-                # Predict using your proven approach
-                label_id, confidence = self.recognizer.predict(roi_resized)
+                if camera_session and not camera_session.should_recognize(track):
+                    # Identity carried over from a recent prediction on this track
+                    label_id, confidence = track.label_id, track.confidence
+                else:
+                    # Extract and resize face ROI (your approach)
+                    with timer.span('preprocess'):
+                        roi = gray[y:y+h, x:x+w]
+                        roi_resized = cv2.resize(roi, self.IMG_SIZE)
+                    
+                    # Predict using your proven approach
+                    with timer.span('predict'):
+                        label_id, confidence = lbph.predict(roi_resized, shard_keys)
+                    
+                    if track is not None:
+                        if confidence < self.CONFIDENCE_THRESHOLD and label_id in lbph.id_to_matric:
+                            track.record_identity(label_id, confidence)
+                        else:
+                            track.clear_identity()
                 
                 face_info = {
-                    'box': {'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h)},
+                    'box': dict(zip(('x', 'y', 'width', 'height'), scale_box(x, y, w, h, frame_scale))),
                     'confidence': float(confidence),
                     'face_index': i
                 }
+                if track is not None:
+                    face_info['track_id'] = track.track_id
                 
                 # Check confidence using your proven threshold
                 if confidence < self.CONFIDENCE_THRESHOLD:
-                    matric_number = self.id_to_matric.get(label_id, "Unknown")
+                    matric_number = lbph.id_to_matric.get(label_id, "Unknown")
                     
                     if matric_number != "Unknown":
                         try:
-                            student = Student.objects.get(matric_number=matric_number)
+                            if track is not None and track.identity is not None and track.label_id == label_id:
+                                # Resolved on an earlier frame of this track
+                                student = track.identity
+                            else:
+                                with timer.span('student_lookup'):
+                                    student = CachedStudent.from_student(
+                                        Student.objects.get(matric_number=matric_number)
+                                    )
+                                if track is not None and track.label_id == label_id:
+                                    track.identity = student
                             
                             # Check if student is expected in current timetable
-                            is_expected = any(
-                                student in self.get_students_for_timetable_slot(slot) 
-                                for slot in active_slots
-                            )
+                            is_expected = any(student.id in roster for _, roster in slot_rosters)
                             
                             face_info.update({
                                 'recognized': True,
@@ -333,14 +275,11 @@ class SimpleFaceRecognitionService:
                             
                             # Mark attendance for active slots
                             attendance_results = []
-                            for slot in active_slots:
-                                if student in self.get_students_for_timetable_slot(slot):
-                                    result = self._mark_attendance(
-                                        matric_number, 
-                                        slot.course.code, 
-                                        slot.id
-                                    )
-                                    attendance_results.append(result)
+                            with timer.span('attendance'):
+                                for slot, roster in slot_rosters:
+                                    if student.id in roster:
+                                        result = self._mark_attendance(student, slot)
+                                        attendance_results.append(result)
                             
                             # Add to recognized students (avoid duplicates)
                             existing = next(
@@ -386,6 +325,7 @@ class SimpleFaceRecognitionService:
                 
                 results['face_boxes'].append(face_info)
             
+            timer.finish(results)
             return results
             
         except Exception as e:
@@ -403,11 +343,19 @@ class SimpleFaceRecognitionService:
     
     def get_model_status(self):
         """Get model status with configuration info"""
+        try:
+            handle = model_registry.get(LBPH_MODEL)
+        except Exception as e:
+            logger.error(f"Face recognition model unavailable: {e}")
+            handle = None
+        
         return {
-            'model_loaded': self.recognizer is not None,
-            'labels_loaded': len(self.label_map) > 0,
+            'model_loaded': handle is not None,
+            'model_version': handle.version if handle else None,
+            'labels_loaded': handle is not None and len(handle.model.label_map) > 0,
             'cascade_loaded': self.face_cascade is not None and not self.face_cascade.empty(),
-            'total_students': len(self.label_map),
+            'total_students': len(handle.model.label_map) if handle else 0,
+            'lbph_shards': len(handle.model.shards.keys()) if handle and handle.model.shards else 0,
             'model_file_exists': self.model_file.exists(),
             'labels_file_exists': self.labels_file.exists(),
             'configuration': self.config
@@ -418,7 +366,12 @@ class SimpleFaceRecognitionService:
         try:
             self.reload_config()
             self._load_models()
-            return {'success': True, 'message': 'Models and configuration reloaded successfully'}
+            handle = model_registry.reload(LBPH_MODEL)
+            return {
+                'success': True,
+                'message': 'Models and configuration reloaded successfully',
+                'model_version': handle.version
+            }
         except Exception as e:
             return {'success': False, 'message': str(e)}
 
@@ -5,11 +5,13 @@ Integrates with Django models and dynamic configuration
 """
 
 import os
+import logging
+import multiprocessing
 import cv2
 import pickle
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from PIL import Image
 import django
 
 # Django setup
@@ -17,8 +19,14 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 django.setup()
 
-from students.models import Student
+from django.conf import settings
+from students.models import Student, StudentCourseSelection, StudentLevelSelection
 from .face_config import face_config
+from .face_feature_store import extract_student_dir
+from .lbph_compact import CompactLBPHRecognizer
+from .model_registry import model_registry, save_lbph_model, copy_lbph_recognizer, read_lbph_recognizer, LBPH_MODEL
+
+logger = logging.getLogger(__name__)
 
 # Paths and constants
 MODEL_DIR = BASE_DIR / "ml_models"
@@ -26,16 +34,90 @@ STUDENT_PHOTOS_DIR = MODEL_DIR / "student_photos"
 MODEL_FILE = MODEL_DIR / "face_trainer.yml"
 LABELS_FILE = MODEL_DIR / "labels.pkl"
 
-# Face detection
-cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-face_cascade = cv2.CascadeClassifier(cascade_path)
+def get_feature_store_dir():
+    return MODEL_DIR / "feature_store"
+
+
+def extract_student_samples(student_dir, config, augmentation_config):
+    """Cropped and augmented training faces for one student's photo directory"""
+    extracted = extract_student_dir(student_dir, config, augmentation_config, get_feature_store_dir())
+    for error in extracted['errors']:
+        print(f"     ❌ Error processing {error}")
+    return list(extracted['samples'])
 
-def train_face_recognition():
-    """Train face recognition model using dynamic configuration"""
+
+def _extract_student_dirs(student_dirs, config, augmentation_config, progress=None):
+    """
+    Run extract_student_dir over many directories, in parallel when configured
+    
+    Yields:
+        dict: One extract_student_dir result per directory, in completion order
+    """
+    workers = min(getattr(settings, 'FACE_TRAINING_WORKERS', os.cpu_count() or 1), len(student_dirs))
+    store_root = get_feature_store_dir()
+    
+    if workers <= 1:
+        results = (extract_student_dir(d, config, augmentation_config, store_root) for d in student_dirs)
+        for index, extracted in enumerate(results):
+            if progress:
+                progress(int((index + 1) / len(student_dirs) * 90), f"Processed {extracted['matric_number']}")
+            yield extracted
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [
+            executor.submit(extract_student_dir, str(d), config, augmentation_config, str(store_root))
+            for d in student_dirs
+        ]
+        for index, future in enumerate(as_completed(futures)):
+            extracted = future.result()
+            if progress:
+                progress(int((index + 1) / len(student_dirs) * 90), f"Processed {extracted['matric_number']}")
+            yield extracted
+
+
+def student_shard_labels(label_map):
+    """
+    Shard key -> label ids for the students of a label map
+
+    A student belongs to the "level-<id>" shard of every level they have
+    selected or offer courses in, and to the "department-<id>" shard of
+    those levels' departments (the departments timetables are keyed by).
+    """
+    levels_by_matric = {}
+    selections = StudentLevelSelection.objects.filter(
+        student__matric_number__in=label_map
+    ).values_list('student__matric_number', 'level_id', 'level__department_id')
+    course_selections = StudentCourseSelection.objects.filter(
+        student__matric_number__in=label_map, is_offered=True
+    ).values_list('student__matric_number', 'level_id', 'level__department_id')
+    for matric_number, level_id, department_id in list(selections) + list(course_selections.distinct()):
+        levels_by_matric.setdefault(matric_number, set()).add((level_id, department_id))
+    
+    shard_labels = {}
+    for matric_number, levels in levels_by_matric.items():
+        for level_id, department_id in levels:
+            shard_labels.setdefault(f"level-{level_id}", set()).add(label_map[matric_number])
+            shard_labels.setdefault(f"department-{department_id}", set()).add(label_map[matric_number])
+    return shard_labels
+
+
+def train_face_recognition(progress=None):
+    """
+    Train face recognition model using dynamic configuration
+    
+    Student directories are processed in parallel (FACE_TRAINING_WORKERS
+    processes) and face crops come from the feature store, so only photos
+    that were added or changed since the last run go through detection.
+    
+    Args:
+        progress: Optional callable(percent, message) for background jobs
+    """
     
     # Get current configuration
     config = face_config.get_optimized_config()
     IMG_SIZE = config["img_size"]
+    augmentation_config = face_config.get_augmentation_config()
     
     print(f"🔧 Using configuration for {config['student_count']} students:")
     print(f"   📏 Image size: {IMG_SIZE}")
@@ -47,113 +129,44 @@ def train_face_recognition():
     # Create recognizer with your proven approach
     recognizer = cv2.face.LBPHFaceRecognizer_create()
     
-    label_ids = {}
-    current_id = 0
-    x_train = []
-    y_labels = []
-    
     print(f"\n🔍 Scanning student photos: {STUDENT_PHOTOS_DIR}")
     
     if not STUDENT_PHOTOS_DIR.exists():
         raise SystemExit(f"❌ Student photos directory not found: {STUDENT_PHOTOS_DIR}")
     
+    student_dirs = [student_dir for student_dir in STUDENT_PHOTOS_DIR.iterdir() if student_dir.is_dir()]
+    
+    # Verify students exist in database
+    known_matrics = set(Student.objects.filter(
+        matric_number__in=[student_dir.name for student_dir in student_dirs]
+    ).values_list('matric_number', flat=True))
+    for student_dir in student_dirs:
+        if student_dir.name not in known_matrics:
+            print(f"   ⚠️  Student {student_dir.name} not found in database - skipping")
+    student_dirs = [student_dir for student_dir in student_dirs if student_dir.name in known_matrics]
+    
+    # Assign label IDs in directory order
+    label_ids = {student_dir.name: label_id for label_id, student_dir in enumerate(student_dirs)}
+    
     # Process each student directory
-    for student_dir in STUDENT_PHOTOS_DIR.iterdir():
-        if not student_dir.is_dir():
-            continue
-            
-        matric_number = student_dir.name
-        print(f"📸 Processing student: {matric_number}")
-        
-        # Verify student exists in database
-        try:
-            student = Student.objects.get(matric_number=matric_number)
-            print(f"   ✅ Found in database: {student.full_name}")
-        except Student.DoesNotExist:
-            print(f"   ⚠️  Student {matric_number} not found in database - skipping")
-            continue
-        
-        # Assign label ID
-        if matric_number not in label_ids:
-            label_ids[matric_number] = current_id
-            current_id += 1
-        
-        id_ = label_ids[matric_number]
-        student_faces = 0
-        
-        # Process all images for this student
-        for img_path in student_dir.glob("*"):
-            if img_path.suffix.lower() not in [".jpg", ".jpeg", ".png"]:
-                continue
-                
-            try:
-                # Load image as grayscale (your approach)
-                img = Image.open(img_path).convert("L")
-                img_array = np.array(img, "uint8")
-                
-                # Detect faces using dynamic parameters
-                faces = face_cascade.detectMultiScale(
-                    img_array, 
-                    scaleFactor=config["scale_factor"], 
-                    minNeighbors=config["min_neighbors"]
-                )
-                
-                if len(faces) == 0:
-                    print(f"     ⚠️  No face found in {img_path.name} - skipping")
-                    continue
-                
-                # Process each detected face
-                for (x, y, w, h) in faces:
-                    roi = img_array[y:y+h, x:x+w]
-                    roi_resized = cv2.resize(roi, IMG_SIZE)
-                    
-                    # Add original face
-                    x_train.append(roi_resized)
-                    y_labels.append(id_)
-                    student_faces += 1
-                    
-                    # Add data augmentation based on configuration
-                    augmentation_config = face_config.get_augmentation_config()
-                    
-                    # Add rotations
-                    for angle in augmentation_config["rotations"]:
-                        rows, cols = roi_resized.shape
-                        rotation_matrix = cv2.getRotationMatrix2D((cols/2, rows/2), angle, 1)
-                        rotated_face = cv2.warpAffine(roi_resized, rotation_matrix, (cols, rows))
-                        x_train.append(rotated_face)
-                        y_labels.append(id_)
-                        student_faces += 1
-                    
-                    # Add brightness variations
-                    for brightness in augmentation_config["brightness_variations"]:
-                        bright_face = cv2.convertScaleAbs(roi_resized, alpha=brightness, beta=0)
-                        x_train.append(bright_face)
-                        y_labels.append(id_)
-                        student_faces += 1
-                    
-                    # Add horizontal flip if enabled
-                    if augmentation_config["enable_flipping"]:
-                        flipped_face = cv2.flip(roi_resized, 1)
-                        x_train.append(flipped_face)
-                        y_labels.append(id_)
-                        student_faces += 1
-                    
-                    # Add noise if enabled
-                    if augmentation_config["enable_noise"]:
-                        noise = np.random.randint(0, 25, roi_resized.shape, dtype=np.uint8)
-                        noisy_face = cv2.add(roi_resized, noise)
-                        x_train.append(noisy_face)
-                        y_labels.append(id_)
-                        student_faces += 1
-                    
-            except Exception as e:
-                print(f"     ❌ Error processing {img_path.name}: {e}")
-                continue
+    sample_batches = []
+    y_labels = []
+    photos_detected = 0
+    for extracted in _extract_student_dirs(student_dirs, config, augmentation_config, progress):
+        matric_number = extracted['matric_number']
+        for error in extracted['errors']:
+            print(f"     ❌ Error processing {error}")
+        print(f"📸 {matric_number}: {len(extracted['samples'])} training samples (including augmentation), "
+              f"{extracted['photos_detected']}/{extracted['photos']} photos detected")
+        photos_detected += extracted['photos_detected']
         
-        print(f"   📊 Generated {student_faces} training samples (including augmentation)")
+        if len(extracted['samples']):
+            sample_batches.append(extracted['samples'])
+            y_labels.extend([label_ids[matric_number]] * len(extracted['samples']))
     
-    if len(x_train) == 0:
+    if not y_labels:
         raise SystemExit("❌ No training data found. Add images to ml_models/student_photos/<matric_number>/ and re-run.")
+    x_train = list(np.concatenate(sample_batches))
     
     # Update student count in configuration
     actual_student_count = len(label_ids)
@@ -165,16 +178,14 @@ def train_face_recognition():
     print(f"\n🎯 Training model...")
     print(f"   📊 {len(x_train)} samples from {len(label_ids)} students")
     print(f"   👥 Students: {list(label_ids.keys())}")
+    if progress:
+        progress(90, f"Training on {len(x_train)} samples")
     
     # Train the model
     recognizer.train(x_train, np.array(y_labels))
     
-    # Save model and labels
-    MODEL_DIR.mkdir(exist_ok=True)
-    recognizer.write(str(MODEL_FILE))
-    
-    with open(LABELS_FILE, "wb") as f:
-        pickle.dump(label_ids, f)
+    # Save model, labels and department/level shards, and swap them into this process's model registry
+    model_handle = save_lbph_model(recognizer, label_ids, shard_labels=student_shard_labels(label_ids))
     
     print(f"\n✅ Training complete!")
     print(f"   💾 Model saved to: {MODEL_FILE}")
@@ -186,12 +197,85 @@ def train_face_recognition():
         'success': True,
         'total_students': len(label_ids),
         'total_samples': len(x_train),
+        'photos_detected': photos_detected,
         'label_mapping': label_ids,
         'model_file': str(MODEL_FILE),
         'labels_file': str(LABELS_FILE),
+        'model_version': model_handle.version,
         'configuration': config
     }
 
+
+def enroll_student(matric_number, progress=None):
+    """
+    Add one student to the trained model, or replace their face data
+    
+    Only this student's photos are processed. Their LBPH histograms are
+    added to a copy of the current model with update() (after dropping
+    any histograms they already had) and labels.pkl is extended; every
+    other student keeps their existing label and histograms. The
+    department/level shards are cut again from the updated model.
+    
+    The face configuration (crop size etc.) is left as the model was
+    trained with; a full retrain re-tunes it for the new student count.
+    
+    Args:
+        matric_number: Student whose photos are in ml_models/student_photos/<matric_number>/
+        progress: Optional callable(percent, message) for background jobs
+    """
+    student = Student.objects.get(matric_number=matric_number)
+    student_dir = STUDENT_PHOTOS_DIR / matric_number
+    if not student_dir.is_dir():
+        raise FileNotFoundError(f"No photo directory for {matric_number}: {student_dir}")
+    
+    config = face_config.get_optimized_config()
+    if progress:
+        progress(10, f"Processing photos for {matric_number}")
+    samples = extract_student_samples(student_dir, config, face_config.get_augmentation_config())
+    if not samples:
+        raise ValueError(f"No faces found in the photos of {matric_number}")
+    
+    try:
+        current = model_registry.get(LBPH_MODEL).model
+    except FileNotFoundError:
+        current = None
+    
+    label_map = dict(current.label_map) if current else {}
+    replaced = matric_number in label_map
+    if replaced:
+        label_id = label_map[matric_number]
+    else:
+        label_id = max(label_map.values(), default=-1) + 1
+        label_map[matric_number] = label_id
+    
+    if progress:
+        progress(60, f"Updating model with {len(samples)} samples")
+    if current:
+        # The served model may be a pruned compact export; build on the full YAML model
+        source = current.recognizer
+        if isinstance(source, CompactLBPHRecognizer):
+            source = read_lbph_recognizer()
+        recognizer = copy_lbph_recognizer(source, exclude_labels=[label_id] if replaced else ())
+    else:
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.update(samples, np.array([label_id] * len(samples)))
+    
+    if progress:
+        progress(90, "Saving model")
+    model_handle = save_lbph_model(recognizer, label_map, shard_labels=student_shard_labels(label_map))
+    
+    logger.info(f"{'Re-enrolled' if replaced else 'Enrolled'} {student.full_name} ({matric_number}) "
+                f"with {len(samples)} samples as label {label_id}")
+    return {
+        'success': True,
+        'matric_number': matric_number,
+        'label_id': label_id,
+        'replaced': replaced,
+        'total_samples': len(samples),
+        'total_students': len(label_map),
+        'model_version': model_handle.version
+    }
+
 if __name__ == "__main__":
     try:
         result = train_face_recognition()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Per-Stage Timing for Frame Processing
+
+Each recognition service times the stages of a frame (decode, contrast
+enhancement, cascade detection, face preprocessing, model prediction,
+database lookups, attendance marking) with a StageTimer. Spans of the
+same stage within a frame add up, so per-face work such as predictions is
+reported as one total per frame.
+
+Finished frames are recorded in the process-wide `stage_timings`, which
+keeps a rolling window of recent frames per service and stage and reports
+p50/p95/p99 for the stats endpoint. Frames processed by recognition
+worker processes carry their timings back in the result and are recorded
+by the pool in the web process.
+"""
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Deque, Dict, Optional
+
+import numpy as np
+from django.conf import settings
+
+TOTAL_STAGE = 'total'
+
+# Set in recognition worker processes, whose results always carry their timings
+_attach_to_results = False
+
+
+def attach_timings_to_results(enabled: bool = True):
+    global _attach_to_results
+    _attach_to_results = enabled
+
+
+def return_stage_timings() -> bool:
+    """Whether per-frame stage timings are included in frame results"""
+    return getattr(settings, 'FACE_RECOGNITION_RETURN_STAGE_TIMINGS', False)
+
+
+class StageTimer:
+    """Accumulates the time spent in each stage of one frame"""
+
+    def __init__(self, service: str):
+        self.service = service
+        self.stages: Dict[str, float] = {}
+        self._started = perf_counter()
+
+    @contextmanager
+    def span(self, stage: str):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage] = self.stages.get(stage, 0.0) + (perf_counter() - started) * 1000
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'service': self.service,
+            'stages_ms': {stage: round(ms, 3) for stage, ms in self.stages.items()},
+            'total_ms': round((perf_counter() - self._started) * 1000, 3)
+        }
+
+    def finish(self, results: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Record the frame in stage_timings and, if enabled, attach it to results"""
+        timings = self.as_dict()
+        stage_timings.record(timings)
+        if results is not None and (_attach_to_results or return_stage_timings()):
+            results['stage_timings'] = timings
+        return timings
+
+
+class StageTimings:
+    """Rolling per-service, per-stage latency percentiles"""
+
+    WINDOW = 1000  # Most recent frames kept per stage
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self._samples: Dict[str, Dict[str, Deque[float]]] = {}
+        self._frames: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, timings: Dict[str, Any]):
+        """Add one frame's as_dict() timings"""
+        service = timings['service']
+        with self._lock:
+            stages = self._samples.setdefault(service, {})
+            for stage, ms in list(timings['stages_ms'].items()) + [(TOTAL_STAGE, timings['total_ms'])]:
+                stages.setdefault(stage, deque(maxlen=self.window)).append(ms)
+            self._frames[service] = self._frames.get(service, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._frames.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {
+                service: {stage: np.array(samples) for stage, samples in stages.items()}
+                for service, stages in self._samples.items()
+            }
+            frames = dict(self._frames)
+
+        stats = {}
+        for service, stages in snapshot.items():
+            summary = {}
+            for stage, samples in stages.items():
+                p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+                summary[stage] = {
+                    'samples': len(samples),
+                    'mean_ms': round(float(samples.mean()), 3),
+                    'p50_ms': round(float(p50), 3),
+                    'p95_ms': round(float(p95), 3),
+                    'p99_ms': round(float(p99), 3)
+                }
+            stats[service] = {'frames': frames.get(service, 0), 'stages': summary}
+        return stats
+
+
+# Global stage timing aggregator for this process
+stage_timings = StageTimings()
@@ -0,0 +1,71 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from attendance.absence_marking import mark_absent_for_ended_slots
+from attendance.attendance_buffer import get_course_registrations
+from attendance.models import Attendance
+from attendance.test_roster_index import TimetableFixtureMixin
+
+# A Monday, after the fixture slot (MON 09:00-11:00) has ended
+AFTER_CLASS = timezone.make_aware(datetime.datetime(2025, 9, 1, 12, 0))
+
+
+class MarkAbsentForEndedSlotsTest(TimetableFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_timetable_fixture()
+
+    def test_marks_expected_students_absent(self):
+        report = mark_absent_for_ended_slots(now=AFTER_CLASS)
+
+        self.assertEqual(report['absent'], 2)
+        self.assertEqual(report['written'], 2)
+        self.assertEqual(report['slots'][0]['course_code'], "CSC201")
+        absent = Attendance.objects.filter(status='absent', date=AFTER_CLASS.date())
+        self.assertEqual(
+            sorted(absent.values_list('student__matric_number', flat=True)), ['CSC000', 'CSC001']
+        )
+
+    def test_students_with_attendance_are_skipped(self):
+        registrations = get_course_registrations({(self.students[0].id, self.course.id)})
+        Attendance.objects.create(
+            student=self.students[0],
+            course_registration_id=registrations[(self.students[0].id, self.course.id)],
+            date=AFTER_CLASS.date(),
+            status='present'
+        )
+
+        report = mark_absent_for_ended_slots(now=AFTER_CLASS)
+
+        self.assertEqual(report['written'], 1)
+        self.assertEqual(Attendance.objects.get(student=self.students[0]).status, 'present')
+        self.assertEqual(Attendance.objects.get(student=self.students[1]).status, 'absent')
+
+    def test_second_run_marks_nobody(self):
+        mark_absent_for_ended_slots(now=AFTER_CLASS)
+        report = mark_absent_for_ended_slots(now=AFTER_CLASS)
+
+        self.assertEqual(report['absent'], 0)
+        self.assertEqual(Attendance.objects.count(), 2)
+
+    def test_dry_run_only_reports(self):
+        report = mark_absent_for_ended_slots(now=AFTER_CLASS, dry_run=True)
+
+        self.assertTrue(report['dry_run'])
+        self.assertEqual(report['absent'], 2)
+        self.assertEqual(report['written'], 0)
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_slot_still_running_is_ignored(self):
+        report = mark_absent_for_ended_slots(now=AFTER_CLASS.replace(hour=10))
+
+        self.assertEqual(report['slots'], [])
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_writes_in_chunks(self):
+        report = mark_absent_for_ended_slots(now=AFTER_CLASS, chunk_size=1)
+
+        self.assertEqual(report['written'], 2)
+        self.assertEqual(Attendance.objects.count(), 2)
@@ -0,0 +1,77 @@
+"""
+Tests for the write-behind attendance buffer
+"""
+
+from django.test import TestCase
+
+from attendance.attendance_buffer import AttendanceWriteBuffer
+from attendance.models import Attendance, CourseRegistration
+from attendance.test_roster_index import TimetableFixtureMixin
+
+
+class AttendanceWriteBufferTest(TimetableFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_timetable_fixture()
+        self.buffer = AttendanceWriteBuffer()
+        self.buffer.FLUSH_INTERVAL = 3600  # flush explicitly in tests
+
+    def tearDown(self):
+        with self.buffer._lock:
+            if self.buffer._timer is not None:
+                self.buffer._timer.cancel()
+
+    def test_marks_are_written_on_flush(self):
+        for student in self.students[:2]:
+            result = self.buffer.mark(student.id, self.slot, user_id=student.user_id)
+            self.assertTrue(result['success'])
+
+        self.assertEqual(Attendance.objects.count(), 0)
+        self.assertEqual(self.buffer.flush(), 2)
+
+        self.assertEqual(Attendance.objects.filter(status='present').count(), 2)
+        # Missing registrations are created for the current semester
+        self.assertEqual(CourseRegistration.objects.filter(semester=self.semester).count(), 2)
+
+    def test_repeated_marks_are_deduplicated_in_memory(self):
+        student = self.students[0]
+        self.buffer.mark(student.id, self.slot)
+        result = self.buffer.mark(student.id, self.slot)
+
+        self.assertTrue(result['already_marked'])
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.buffer.get_stats()['duplicates_skipped'], 1)
+
+    def test_unwritten_marks_can_be_retried(self):
+        student = self.students[0]
+        self.semester.is_current = False
+        self.semester.save()
+        self.buffer.mark(student.id, self.slot)
+        self.assertEqual(self.buffer.flush(), 0)
+
+        # No registration could be created, so the student is not left marked
+        self.semester.is_current = True
+        self.semester.save()
+        self.assertTrue(self.buffer.mark(student.id, self.slot)['success'])
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_existing_attendance_is_not_duplicated(self):
+        student = self.students[0]
+        self.buffer.mark(student.id, self.slot)
+        self.buffer.flush()
+
+        # A new buffer (e.g. another worker process) has no in-memory state
+        other_buffer = AttendanceWriteBuffer()
+        other_buffer.mark(student.id, self.slot)
+        self.assertEqual(other_buffer.flush(), 0)
+        self.assertEqual(Attendance.objects.filter(student=student).count(), 1)
+
+    def test_flush_uses_constant_number_of_queries(self):
+        for student in self.students:
+            self.buffer.mark(student.id, self.slot)
+
+        # existing attendance, registrations, current semester, create missing,
+        # reload registrations, insert attendance, select inserted ids, four queries
+        # building the new attendance counters, plus savepoint begin/release
+        with self.assertNumQueries(13):
+            self.assertEqual(self.buffer.flush(), 3)
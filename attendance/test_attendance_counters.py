@@ -0,0 +1,108 @@
+import datetime
+import io
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from attendance import attendance_counters
+from attendance.attendance_buffer import get_course_registrations
+from attendance.models import Attendance, ExamEligibility
+from attendance.test_roster_index import TimetableFixtureMixin
+
+CLASS_DATES = [datetime.date(2025, 9, 1) + datetime.timedelta(days=7 * week) for week in range(4)]
+
+
+class AttendanceCountersTest(TimetableFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_timetable_fixture()
+        self.student = self.students[0]
+        registrations = get_course_registrations({(self.student.id, self.course.id)})
+        self.registration_id = registrations[(self.student.id, self.course.id)]
+
+    def attend(self, date, status):
+        return Attendance.objects.create(
+            student=self.student, course_registration_id=self.registration_id, date=date, status=status
+        )
+
+    def counters(self):
+        return ExamEligibility.objects.get(course_registration_id=self.registration_id)
+
+    def test_created_attendance_is_counted(self):
+        self.attend(CLASS_DATES[0], 'present')
+        self.attend(CLASS_DATES[1], 'absent')
+        self.attend(CLASS_DATES[2], 'late')
+
+        counters = self.counters()
+        self.assertEqual((counters.total_classes, counters.attended_classes), (3, 2))
+        self.assertAlmostEqual(counters.attendance_percentage, 200 / 3)
+        self.assertFalse(counters.is_eligible)
+
+    def test_status_change_and_delete_adjust_counts(self):
+        for date in CLASS_DATES:
+            self.attend(date, 'present')
+        attendance = Attendance.objects.get(date=CLASS_DATES[3])
+        attendance.status = 'absent'
+        attendance.is_manual_override = True
+        attendance.save()
+
+        counters = self.counters()
+        self.assertEqual((counters.total_classes, counters.attended_classes), (4, 3))
+        self.assertTrue(counters.is_eligible)
+
+        Attendance.objects.get(date=CLASS_DATES[0]).delete()
+        counters = self.counters()
+        self.assertEqual((counters.total_classes, counters.attended_classes), (3, 2))
+        self.assertFalse(counters.is_eligible)
+
+    def test_bulk_written_attendance_is_reported(self):
+        self.attend(CLASS_DATES[0], 'present')
+        records = [
+            Attendance(student=self.student, course_registration_id=self.registration_id, date=date, status='absent')
+            for date in CLASS_DATES[1:]
+        ]
+        Attendance.objects.bulk_create(records)
+        attendance_counters.record_created(records)
+
+        counters = self.counters()
+        self.assertEqual((counters.total_classes, counters.attended_classes), (4, 1))
+        self.assertAlmostEqual(counters.attendance_percentage, 25.0)
+
+    def test_conflicting_bulk_inserts_are_not_counted(self):
+        self.attend(CLASS_DATES[0], 'present')
+        records = [
+            Attendance(student=self.student, course_registration_id=self.registration_id, date=date, status='absent')
+            for date in CLASS_DATES[:2]
+        ]
+
+        inserted = attendance_counters.bulk_create_attendance(records)
+
+        self.assertEqual([record.date for record in inserted], [CLASS_DATES[1]])
+        counters = self.counters()
+        self.assertEqual((counters.total_classes, counters.attended_classes), (2, 1))
+
+    def test_rebuild_command_repairs_drift(self):
+        self.attend(CLASS_DATES[0], 'present')
+        self.attend(CLASS_DATES[1], 'absent')
+        ExamEligibility.objects.update(total_classes=9, attended_classes=0, attendance_percentage=0.0)
+
+        call_command('rebuild_attendance_counters', stdout=io.StringIO())
+
+        counters = self.counters()
+        self.assertEqual((counters.total_classes, counters.attended_classes), (2, 1))
+        self.assertAlmostEqual(counters.attendance_percentage, 50.0)
+
+    def test_rates_are_single_lookups(self):
+        self.attend(CLASS_DATES[0], 'present')
+        self.attend(CLASS_DATES[1], 'partial')
+        self.attend(CLASS_DATES[2], 'absent')
+        self.attend(CLASS_DATES[3], 'absent')
+
+        with self.assertNumQueries(1):
+            rate = attendance_counters.get_combined_attendance_rate(ExamEligibility.objects.filter(
+                student=self.student, course_registration__semester=self.semester
+            ))
+        self.assertEqual(rate, 50.0)
+        with self.assertNumQueries(1):
+            rates = attendance_counters.get_attendance_rates([self.registration_id])
+        self.assertEqual(rates, {self.registration_id: 50.0})
@@ -0,0 +1,89 @@
+import datetime
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from attendance.attendance_buffer import get_course_registrations
+from attendance.attendance_rollups import get_rollups, rebuild_rollups, summarize
+from attendance.models import Attendance, DailyAttendanceRollup
+from attendance.test_roster_index import TimetableFixtureMixin
+
+CLASS_DATE = datetime.date(2025, 9, 1)
+
+
+class DailyAttendanceRollupTest(TimetableFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.create_timetable_fixture()
+        self.registrations = get_course_registrations({(student.id, self.course.id) for student in self.students})
+
+    def create_attendance(self, student, date, status, **fields):
+        return Attendance.objects.create(
+            student=student,
+            course_registration_id=self.registrations[(student.id, self.course.id)],
+            date=date,
+            status=status,
+            is_manual_override=True,
+            **fields
+        )
+
+    def test_rebuild_groups_by_course_and_status(self):
+        self.create_attendance(self.students[0], CLASS_DATE, 'present', detection_count=4, presence_percentage=90.0)
+        self.create_attendance(self.students[1], CLASS_DATE, 'present', detection_count=2, presence_percentage=70.0)
+        self.create_attendance(self.students[2], CLASS_DATE, 'absent')
+
+        written = rebuild_rollups(CLASS_DATE, CLASS_DATE)
+
+        self.assertEqual(written, 2)
+        present = DailyAttendanceRollup.objects.get(status='present')
+        self.assertEqual(present.course_id, self.course.id)
+        self.assertTrue(DailyAttendanceRollup.objects.filter(
+            id=present.id, department_id=self.course.department_id
+        ).exists())
+        self.assertEqual(present.level, 200)
+        self.assertEqual((present.records, present.detected_records, present.detections), (2, 2, 6))
+        self.assertAlmostEqual(present.presence_total, 160.0)
+        self.assertEqual((present.presence_records, present.detected_presence_records), (2, 2))
+        self.assertEqual(DailyAttendanceRollup.objects.get(status='absent').records, 1)
+
+        totals = summarize(get_rollups(CLASS_DATE, CLASS_DATE))
+        self.assertEqual((totals['records'], totals['attended'], totals['attended_detected']), (3, 2, 2))
+
+    def test_records_without_presence_are_not_averaged(self):
+        self.create_attendance(self.students[0], CLASS_DATE, 'present', detection_count=3, presence_percentage=80.0)
+        self.create_attendance(self.students[1], CLASS_DATE, 'present', detection_count=1)
+        rebuild_rollups(CLASS_DATE, CLASS_DATE)
+
+        totals = summarize(get_rollups(CLASS_DATE, CLASS_DATE))
+
+        self.assertEqual((totals['detected_records'], totals['detected_presence_records']), (2, 1))
+        self.assertAlmostEqual(totals['detected_presence_total'] / totals['detected_presence_records'], 80.0)
+
+    def test_rebuild_replaces_previous_rollup(self):
+        attendance = self.create_attendance(self.students[0], CLASS_DATE, 'absent')
+        rebuild_rollups(CLASS_DATE, CLASS_DATE)
+        Attendance.objects.filter(id=attendance.id).update(status='late')
+
+        rebuild_rollups(CLASS_DATE, CLASS_DATE)
+
+        self.assertEqual(list(DailyAttendanceRollup.objects.values_list('status', 'records')), [('late', 1)])
+
+    def test_today_is_refreshed_on_read(self):
+        self.create_attendance(self.students[0], timezone.localdate(), 'present')
+
+        totals = summarize(get_rollups(timezone.localdate()))
+
+        self.assertEqual((totals['records'], totals['attended']), (1, 1))
+
+    def test_command_backfills_since_date(self):
+        self.create_attendance(self.students[0], CLASS_DATE, 'present')
+        out = StringIO()
+
+        call_command('rollup_attendance', since=CLASS_DATE.isoformat(), stdout=out)
+
+        self.assertTrue(DailyAttendanceRollup.objects.filter(date=CLASS_DATE, records=1).exists())
+        self.assertIn("Rolled up attendance", out.getvalue())
@@ -0,0 +1,76 @@
+"""
+Tests for per-camera face tracking used by streaming recognition sessions
+"""
+
+from django.test import SimpleTestCase
+
+from attendance.camera_sessions import CameraSessionManager, FaceTracker, box_iou
+
+
+class FaceTrackerTest(SimpleTestCase):
+    """The tracker must carry identities across frames of the same camera"""
+
+    def test_box_iou(self):
+        self.assertEqual(box_iou((0, 0, 10, 10), (0, 0, 10, 10)), 1.0)
+        self.assertEqual(box_iou((0, 0, 10, 10), (20, 20, 10, 10)), 0.0)
+        self.assertAlmostEqual(box_iou((0, 0, 10, 10), (5, 0, 10, 10)), 50 / 150)
+
+    def test_tracks_follow_moving_faces(self):
+        tracker = FaceTracker()
+        first = tracker.update([(10, 10, 50, 50), (200, 10, 50, 50)])
+        second = tracker.update([(204, 12, 50, 50), (14, 11, 50, 50)])
+
+        self.assertIs(second[0], first[1])
+        self.assertIs(second[1], first[0])
+        self.assertEqual(len(tracker.tracks), 2)
+
+    def test_new_face_starts_new_track(self):
+        tracker = FaceTracker()
+        first = tracker.update([(10, 10, 50, 50)])
+        second = tracker.update([(10, 10, 50, 50), (400, 300, 40, 40)])
+
+        self.assertIs(second[0], first[0])
+        self.assertNotEqual(second[1].track_id, first[0].track_id)
+
+    def test_lost_tracks_expire(self):
+        tracker = FaceTracker(max_missed_frames=2)
+        tracker.update([(10, 10, 50, 50)])
+        for _ in range(3):
+            tracker.update([])
+
+        self.assertEqual(tracker.tracks, {})
+
+
+class CameraSessionTest(SimpleTestCase):
+    """Identified faces are only re-recognized every reverify_interval frames"""
+
+    def test_identified_face_skips_recognition_until_reverify(self):
+        manager = CameraSessionManager()
+        session = manager.get_session('hall-a')
+        session.reverify_interval = 3
+
+        track = session.track_faces([(10, 10, 50, 50)])[0]
+        self.assertTrue(session.should_recognize(track))
+        track.record_identity(7, 42.0)
+
+        decisions = []
+        for _ in range(4):
+            track = session.track_faces([(11, 10, 50, 50)])[0]
+            decisions.append(session.should_recognize(track))
+            if decisions[-1]:
+                track.record_identity(7, 40.0)
+
+        self.assertEqual(decisions, [False, False, True, False])
+        self.assertEqual(session.predictions_skipped, 3)
+
+    def test_unidentified_face_is_always_recognized(self):
+        session = CameraSessionManager().get_session('hall-b')
+        for _ in range(3):
+            track = session.track_faces([(10, 10, 50, 50)])[0]
+            self.assertTrue(session.should_recognize(track))
+
+    def test_end_session(self):
+        manager = CameraSessionManager()
+        manager.get_session('hall-c')
+        self.assertTrue(manager.end_session('hall-c'))
+        self.assertEqual(manager.get_stats()['active_sessions'], 0)
@@ -0,0 +1,51 @@
+"""
+Tests for the adaptive detection pass planner
+"""
+
+from django.test import SimpleTestCase
+
+from attendance.detection_planner import DetectionPlanner
+
+
+class DetectionPlannerTest(SimpleTestCase):
+
+    def run_frame(self, planner, yields, cost_ms=10.0):
+        plan = planner.plan()
+        for name in plan:
+            planner.record_pass(name, cost_ms)
+        planner.record_frame({name: yields.get(name, 0) for name in plan}, cost_ms * len(plan))
+        return plan
+
+    def test_all_passes_run_until_measured(self):
+        planner = DetectionPlanner(['a', 'b', 'c'])
+        self.assertEqual(planner.plan(), ['a', 'b', 'c'])
+
+    def test_unproductive_pass_is_skipped_then_reprobed(self):
+        planner = DetectionPlanner(['a', 'b'])
+        for _ in range(planner.IDLE_FRAMES):
+            self.run_frame(planner, {'a': 2})
+
+        self.assertEqual(planner.plan(), ['a'])
+        planner.record_frame({'a': 2}, 10.0)
+
+        probed = False
+        for _ in range(planner.PROBE_INTERVAL):
+            probed = 'b' in self.run_frame(planner, {'a': 2}) or probed
+        self.assertTrue(probed)
+        self.assertGreater(planner.get_stats()['passes']['b']['skips'], 0)
+
+    def test_budget_keeps_best_yield_per_cost(self):
+        planner = DetectionPlanner(['slow', 'fast'], budget_ms=30.0)
+        plan = planner.plan()
+        planner.record_pass('slow', 50.0)
+        planner.record_pass('fast', 10.0)
+        planner.record_frame({'slow': 1, 'fast': 1}, 60.0)
+        self.assertEqual(plan, ['slow', 'fast'])
+
+        self.assertEqual(planner.plan(), ['fast'])
+
+    def test_never_plans_an_empty_frame(self):
+        planner = DetectionPlanner(['a', 'b'])
+        for _ in range(planner.IDLE_FRAMES):
+            self.run_frame(planner, {})
+        self.assertEqual(len(planner.plan()), 1)
@@ -0,0 +1,93 @@
+"""
+Tests for ingestion of recognition events from edge recognizers
+"""
+
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from attendance.edge_events import ingest_events
+from attendance.models import Attendance, AttendanceDetection
+from attendance.roster_index import roster_index
+from attendance.test_roster_index import TimetableFixtureMixin
+
+User = get_user_model()
+
+# A Monday inside the fixture slot (MON 09:00-11:00)
+MONDAY = datetime.datetime(2026, 3, 2, 9, 15, tzinfo=datetime.timezone.utc)
+
+
+class EdgeEventIngestionTest(TimetableFixtureMixin, TestCase):
+
+    def setUp(self):
+        roster_index.clear()
+        self.create_timetable_fixture()
+
+    def event(self, event_id, matric='CSC000', minutes=0, **overrides):
+        return dict({
+            'event_id': event_id,
+            'matric_number': matric,
+            'slot_id': str(self.slot.id),
+            'timestamp': (MONDAY + datetime.timedelta(minutes=minutes)).isoformat(),
+            'confidence': 0.9,
+            'camera_id': 'hall-a-cam-1'
+        }, **overrides)
+
+    def test_valid_events_update_attendance_once_per_student(self):
+        result = ingest_events([
+            self.event('e1'),
+            self.event('e2', minutes=20),
+            self.event('e1'),
+            self.event('e3', matric='CSC001', minutes=5),
+        ])
+
+        self.assertEqual((result['accepted'], result['duplicates'], result['attendance_updated']), (3, 1, 2))
+        attendance = Attendance.objects.get(student=self.students[0])
+        self.assertEqual(attendance.date, MONDAY.date())
+        self.assertEqual(attendance.detection_count, 2)
+        self.assertEqual(attendance.first_detected_at, MONDAY)
+        self.assertEqual(attendance.last_detected_at, MONDAY + datetime.timedelta(minutes=20))
+        self.assertEqual(
+            set(AttendanceDetection.objects.values_list('idempotency_key', flat=True)), {'e1', 'e2', 'e3'}
+        )
+
+    def test_resent_batch_is_not_applied_twice(self):
+        batch = [self.event('e1'), self.event('e2', minutes=1)]
+        ingest_events(batch)
+
+        result = ingest_events(batch)
+
+        self.assertEqual((result['accepted'], result['duplicates']), (0, 2))
+        self.assertEqual(Attendance.objects.get(student=self.students[0]).detection_count, 2)
+        self.assertEqual(AttendanceDetection.objects.count(), 2)
+
+    def test_events_outside_the_roster_or_slot_are_rejected(self):
+        result = ingest_events([
+            self.event('not-expected', matric='CSC002'),
+            self.event('unknown-student', matric='XYZ999'),
+            self.event('after-class', minutes=180),
+            self.event('bad-slot', slot_id='not-a-uuid'),
+            self.event('bad-confidence', confidence=3),
+            'not an event',
+        ])
+
+        self.assertEqual(result['accepted'], 0)
+        self.assertEqual([r['event_id'] for r in result['rejected']], [
+            'not-expected', 'unknown-student', 'after-class', 'bad-slot', 'bad-confidence', None
+        ])
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_endpoint_requires_staff_or_lecturer(self):
+        client = APIClient()
+        payload = {'events': [self.event('e1')]}
+
+        client.force_authenticate(self.students[0].user)
+        self.assertEqual(client.post('/api/attendance/face-tracking/edge-events/', payload, format='json').status_code, 403)
+
+        lecturer = User.objects.create_user(username='lecturer', email='l@test.com', password='x', role='lecturer')
+        client.force_authenticate(lecturer)
+        response = client.post('/api/attendance/face-tracking/edge-events/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['accepted'], 1)
@@ -0,0 +1,50 @@
+"""
+Tests for the vectorized face embedding index
+"""
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from attendance.embedding_index import EmbeddingIndex
+
+
+class EmbeddingIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.encodings = rng.normal(size=(50, 128))
+        self.labels = [f"S{i // 2}" for i in range(50)]
+        self.departments = [i % 3 for i in range(50)]
+        self.index = EmbeddingIndex(self.encodings, self.labels, self.departments)
+
+    def test_distances_match_numpy_norm(self):
+        queries = self.encodings[:4] + 0.01
+        expected = np.linalg.norm(self.encodings[None, :, :] - queries[:, None, :], axis=2)
+
+        np.testing.assert_allclose(self.index.distances(queries), expected, rtol=1e-4, atol=1e-3)
+
+    def test_search_returns_sorted_top_k(self):
+        matches = self.index.search(self.encodings[[10, 21]], k=3)
+
+        self.assertEqual(matches[0][0].label, "S5")
+        self.assertEqual(matches[1][0].label, "S10")
+        for face_matches in matches:
+            self.assertEqual(len(face_matches), 3)
+            distances = [match.distance for match in face_matches]
+            self.assertEqual(distances, sorted(distances))
+
+    def test_search_respects_max_distance(self):
+        matches = self.index.search(self.encodings[:1], k=5, max_distance=0.5)
+        self.assertEqual([match.row for match in matches[0]], [0])
+
+    def test_group_sub_index(self):
+        department_index = self.index.for_group(1)
+
+        self.assertEqual(len(department_index), len([d for d in self.departments if d == 1]))
+        self.assertEqual(department_index.search(self.encodings[4:5])[0][0].label, "S2")
+        self.assertIsNone(self.index.for_group(99))
+
+    def test_empty_index(self):
+        index = EmbeddingIndex([])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.search(np.zeros((2, 128))), [[], []])
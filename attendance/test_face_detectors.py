@@ -0,0 +1,94 @@
+"""
+Tests for the downscaled face detector backends and the shared face_config.json
+"""
+
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from attendance.face_detectors import FaceDetector, downscale, scale_location
+
+
+class FaceDetectorTest(SimpleTestCase):
+
+    def test_downscale_limits_longest_side(self):
+        image = np.zeros((720, 1280, 3), dtype=np.uint8)
+
+        small, scale = downscale(image, 640)
+        self.assertEqual(small.shape, (360, 640, 3))
+        self.assertEqual(scale, 2.0)
+        self.assertIs(downscale(image, None)[0], image)
+        self.assertIs(downscale(image, 2000)[0], image)
+
+    def test_boxes_are_mapped_back_to_full_resolution(self):
+        self.assertEqual(scale_location((10, 60, 50, 20), 2.0, (720, 1280)), (20, 120, 100, 40))
+        # Clipped to the full frame
+        self.assertEqual(scale_location((350, 645, 365, 600), 2.0, (720, 1280)), (700, 1280, 720, 1200))
+
+    def test_backend_runs_on_the_downscaled_frame(self):
+        detector = FaceDetector('hog', max_dimension=640)
+        image = np.zeros((720, 1280, 3), dtype=np.uint8)
+
+        with mock.patch.object(detector, '_detect_hog', return_value=[(10, 60, 50, 20)]) as detect:
+            self.assertEqual(detector.detect(image), [(20, 120, 100, 40)])
+        self.assertEqual(detect.call_args[0][0].shape, (360, 640, 3))
+
+    def test_dnn_without_model_files_falls_back_to_hog(self):
+        detector = FaceDetector('dnn', models_dir=tempfile.gettempdir())
+        with mock.patch.object(detector, '_detect_hog', return_value=[]) as detect:
+            detector.detect(np.zeros((100, 100, 3), dtype=np.uint8))
+        detect.assert_called_once()
+
+    def test_invalid_settings_are_rejected(self):
+        with self.assertRaises(ValueError):
+            FaceDetector('cnn')
+        with self.assertRaises(ValueError):
+            FaceDetector('hog', max_dimension=-1)
+
+
+class SharedFaceConfigTest(SimpleTestCase):
+
+    def setUp(self):
+        self.base_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.base_dir)
+        (self.base_dir / "ml_models").mkdir()
+        self.config_file = self.base_dir / "ml_models" / "face_config.json"
+
+    def test_lbph_config_keeps_detector_settings(self):
+        from attendance.face_config import FaceRecognitionConfig
+
+        with override_settings(BASE_DIR=self.base_dir):
+            config = FaceRecognitionConfig()
+            self.config_file.write_text(json.dumps(dict(config.config, detector_backend='haar')))
+            config.update_student_count(45)
+
+        saved = json.loads(self.config_file.read_text())
+        self.assertEqual(saved['detector_backend'], 'haar')
+        self.assertEqual(saved['max_faces_per_frame'], 50)
+
+    def test_engine_config_keeps_lbph_settings(self):
+        from attendance.enhanced_face_recognition import EnhancedFaceRecognitionEngine
+
+        self.config_file.write_text(json.dumps({'confidence_threshold': 70, 'img_size': [250, 250]}))
+        with override_settings(BASE_DIR=self.base_dir), \
+                mock.patch.object(EnhancedFaceRecognitionEngine, 'load_models'):
+            engine = EnhancedFaceRecognitionEngine()
+            result = engine.update_configuration({'detector_backend': 'haar', 'detection_max_dimension': 640})
+            rejected = engine.update_configuration({'detector_backend': 'cnn'})
+
+        saved = json.loads(self.config_file.read_text())
+        self.assertTrue(result['success'])
+        self.assertFalse(rejected['success'])
+        self.assertEqual((saved['detector_backend'], saved['detection_max_dimension']), ('haar', 640))
+        self.assertEqual((saved['confidence_threshold'], saved['img_size']), (70, [250, 250]))
+        self.assertEqual(engine.face_detector.backend, 'haar')
+
+        with override_settings(BASE_DIR=self.base_dir), \
+                mock.patch.object(EnhancedFaceRecognitionEngine, 'load_models'):
+            reloaded = EnhancedFaceRecognitionEngine()
+        self.assertEqual((reloaded.face_detector.backend, reloaded.face_detector.max_dimension), ('haar', 640))
@@ -0,0 +1,68 @@
+"""
+Tests for the face training feature store and batched augmentation
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from attendance.face_feature_store import FaceFeatureStore, augment_faces, extract_student_dir
+
+CONFIG = {'img_size': (40, 40), 'scale_factor': 1.1, 'min_neighbors': 5}
+AUGMENTATION = {
+    'rotations': [-10, 10],
+    'brightness_variations': [0.8, 1.2],
+    'enable_flipping': True,
+    'enable_noise': False
+}
+
+
+class FaceFeatureStoreTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_rois_round_trip_by_content_hash(self):
+        store = FaceFeatureStore(self.root / 'store')
+        key = store.key_for(b'photo bytes', CONFIG)
+        rois = np.random.randint(0, 255, (2, 40, 40), dtype=np.uint8)
+
+        self.assertIsNone(store.get(key))
+        store.put(key, rois)
+        np.testing.assert_array_equal(store.get(key), rois)
+
+        # Detection parameters are part of the key
+        self.assertNotEqual(key, store.key_for(b'photo bytes', dict(CONFIG, min_neighbors=3)))
+
+    def test_unchanged_photos_are_not_detected_again(self):
+        student_dir = self.root / 'photos' / 'CSC001'
+        student_dir.mkdir(parents=True)
+        cv2.imwrite(str(student_dir / 'a.png'), np.full((80, 80), 128, dtype=np.uint8))
+
+        first = extract_student_dir(student_dir, CONFIG, AUGMENTATION, self.root / 'store')
+        second = extract_student_dir(student_dir, CONFIG, AUGMENTATION, self.root / 'store')
+
+        self.assertEqual(first['matric_number'], 'CSC001')
+        self.assertEqual((first['photos'], first['photos_detected']), (1, 1))
+        self.assertEqual((second['photos'], second['photos_detected']), (1, 0))
+
+    def test_batched_augmentation_matches_per_face_operations(self):
+        rois = np.random.RandomState(0).randint(0, 255, (3, 40, 40), dtype=np.uint8)
+        samples = augment_faces(rois, AUGMENTATION)
+
+        expected = list(rois)
+        for angle in AUGMENTATION['rotations']:
+            matrix = cv2.getRotationMatrix2D((20, 20), angle, 1)
+            expected.extend(cv2.warpAffine(roi, matrix, (40, 40)) for roi in rois)
+        for brightness in AUGMENTATION['brightness_variations']:
+            expected.extend(cv2.convertScaleAbs(roi, alpha=brightness, beta=0) for roi in rois)
+        expected.extend(cv2.flip(roi, 1) for roi in rois)
+
+        self.assertEqual(samples.shape, (len(expected), 40, 40))
+        for sample, reference in zip(samples, expected):
+            self.assertLessEqual(int(np.abs(sample.astype(int) - reference.astype(int)).max()), 1)
@@ -0,0 +1,47 @@
+"""
+Tests for batched face preprocessing
+"""
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from attendance.face_preprocessing import FacePreprocessor, enhance_contrast, gamma_lut, get_clahe
+
+
+def reference_preprocess(face_roi, img_size):
+    """The per-face pipeline the preprocessor replaces"""
+    table = np.array([((i / 255.0) ** (1.0 / 1.3)) * 255 for i in np.arange(0, 256)]).astype("uint8")
+    enhanced = cv2.createCLAHE(clipLimit=3.5, tileGridSize=(4, 4)).apply(cv2.LUT(face_roi, table))
+    denoised = cv2.bilateralFilter(enhanced, 5, 50, 50)
+    sharpened = cv2.filter2D(denoised, -1, np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]]))
+    normalized = cv2.normalize(sharpened, None, 0, 255, cv2.NORM_MINMAX)
+    return cv2.resize(normalized, img_size, interpolation=cv2.INTER_CUBIC)
+
+
+class FacePreprocessorTest(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.rois = [rng.randint(0, 255, (size, size + 7), dtype=np.uint8) for size in (24, 61, 140)]
+        self.preprocessor = FacePreprocessor((100, 90))
+
+    def test_batch_matches_per_face_pipeline(self):
+        batch = self.preprocessor.preprocess_batch(self.rois)
+
+        self.assertEqual(batch.shape, (3, 90, 100))
+        for roi, face in zip(self.rois, batch):
+            np.testing.assert_array_equal(face, reference_preprocess(roi, (100, 90)))
+
+    def test_enhance_contrast_matches_per_face(self):
+        batch = self.preprocessor.preprocess_batch(self.rois)
+        enhanced = enhance_contrast(batch)
+
+        for face, expected in zip(enhanced, batch):
+            np.testing.assert_array_equal(face, cv2.convertScaleAbs(expected, alpha=1.2, beta=10))
+        self.assertEqual(enhance_contrast(batch[:0]).shape, (0, 90, 100))
+
+    def test_tables_and_clahe_are_reused(self):
+        self.assertIs(gamma_lut(1.5), gamma_lut(1.5))
+        self.assertFalse(gamma_lut(1.5).flags.writeable)
+        self.assertIs(get_clahe(3.0, (8, 8)), get_clahe(3.0, (8, 8)))
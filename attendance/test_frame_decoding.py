@@ -0,0 +1,50 @@
+"""
+Tests for grayscale and reduced-resolution frame decoding
+"""
+
+import base64
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from attendance.frame_decoding import decode_frame, reduction_factor, scale_box
+
+
+def encode_jpeg(width, height):
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.rectangle(frame, (width // 4, height // 4), (width // 2, height // 2), (255, 255, 255), -1)
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+class FrameDecodingTest(SimpleTestCase):
+
+    def test_bytes_and_data_url_decode_to_grayscale(self):
+        data = encode_jpeg(320, 240)
+        data_url = 'data:image/jpeg;base64,' + base64.b64encode(data).decode()
+
+        for frame_data in (data, data_url):
+            image, scale = decode_frame(frame_data, max_dimension=1280)
+            self.assertEqual(image.shape, (240, 320))
+            self.assertEqual(scale, 1.0)
+
+    def test_large_frames_are_decoded_at_reduced_resolution(self):
+        image, scale = decode_frame(encode_jpeg(2560, 1440), max_dimension=1280)
+
+        self.assertEqual(scale, 2.0)
+        self.assertEqual(image.shape, (720, 1280))
+        self.assertEqual(scale_box(100, 50, 40, 40, scale), (200, 100, 80, 80))
+
+    def test_reduction_never_drops_below_max_dimension(self):
+        self.assertEqual(reduction_factor((1920, 1080), 1280), 1)
+        self.assertEqual(reduction_factor((5120, 2880), 1280), 4)
+        self.assertEqual(reduction_factor((5120, 2880), None), 1)
+
+    def test_numpy_frames_are_converted_in_place_of_decoding(self):
+        image, scale = decode_frame(np.zeros((10, 20, 3), dtype=np.uint8))
+        self.assertEqual(image.shape, (10, 20))
+        self.assertEqual(scale, 1.0)
+
+    def test_undecodable_data_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            decode_frame(b'not an image')
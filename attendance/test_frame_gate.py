@@ -0,0 +1,80 @@
+"""
+Tests for the per-camera scene-change gate
+"""
+
+from unittest import mock
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from attendance.frame_gate import FrameGate, FrameGateManager
+
+
+def encode(image):
+    return cv2.imencode('.png', image)[1].tobytes()
+
+
+class FrameGateTest(SimpleTestCase):
+
+    def setUp(self):
+        self.gate = FrameGate(change_threshold=0.02, max_reused_frames=2, max_age=5.0)
+        rng = np.random.RandomState(0)
+        self.scene = cv2.GaussianBlur(rng.randint(0, 255, (480, 640), dtype=np.uint8), (31, 31), 0)
+        self.result = {'faces_detected': 3, 'recognized_students': []}
+
+    def _process(self, image, context=('session', None)):
+        thumbnail = self.gate.fingerprint(encode(image))
+        reused = self.gate.reuse(thumbnail, context)
+        if reused is None:
+            self.gate.record(thumbnail, context, self.result)
+        return reused
+
+    def test_unchanged_scene_reuses_previous_result(self):
+        self.assertIsNone(self._process(self.scene))
+
+        noisy = cv2.add(self.scene, np.full_like(self.scene, 2))
+        reused = self._process(noisy)
+
+        self.assertTrue(reused['reused'])
+        self.assertEqual(reused['faces_detected'], 3)
+        self.assertEqual(self.gate.get_stats()['frames_reused'], 1)
+
+    def test_scene_change_is_processed(self):
+        self._process(self.scene)
+        changed = self.scene.copy()
+        changed[100:300, 200:400] = 255
+
+        self.assertIsNone(self._process(changed))
+        self.assertGreater(self.gate.last_change, 0.02)
+
+    def test_reuse_is_bounded_by_frames_age_and_context(self):
+        self._process(self.scene)
+        self.assertIsNotNone(self._process(self.scene))
+        self.assertIsNotNone(self._process(self.scene))
+        # max_reused_frames reached: processed again, which resets the count
+        self.assertIsNone(self._process(self.scene))
+
+        with mock.patch('attendance.frame_gate.time.time', return_value=10**10):
+            self.assertIsNone(self._process(self.scene))
+
+        self.assertIsNone(self._process(self.scene, context=('other-session', None)))
+
+    def test_failed_results_are_not_reused(self):
+        thumbnail = self.gate.fingerprint(encode(self.scene))
+        self.gate.record(thumbnail, None, {'error': 'boom'})
+        self.assertIsNone(self.gate.reuse(thumbnail, None))
+
+
+class FrameGateManagerTest(SimpleTestCase):
+
+    def test_gates_are_per_camera_and_can_be_disabled(self):
+        manager = FrameGateManager()
+        with override_settings(FACE_FRAME_GATE_THRESHOLD=0.05):
+            self.assertIs(manager.get_gate('cam-1'), manager.get_gate('cam-1'))
+            self.assertIsNot(manager.get_gate('cam-1'), manager.get_gate('cam-2'))
+            self.assertIsNone(manager.get_gate(None))
+            self.assertEqual(set(manager.get_stats()['cameras']), {'cam-1', 'cam-2'})
+
+        with override_settings(FACE_FRAME_GATE_THRESHOLD=None):
+            self.assertIsNone(manager.get_gate('cam-1'))
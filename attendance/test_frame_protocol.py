@@ -0,0 +1,84 @@
+"""
+Tests for compact, delta-encoded frame responses
+"""
+
+from django.test import SimpleTestCase
+
+from attendance.frame_protocol import FACE_FIELDS, FrameDeltaEncoder, FrameEncoderManager
+
+
+def frame_result(version='v1', recognized=('CSC001',)):
+    return {
+        'timestamp': '2026-01-01T09:00:00',
+        'faces_detected': 2,
+        'roster_version': version,
+        'active_timetable_slots': [{'id': 1, 'course_code': 'CSC101'}],
+        'expected_students': [{'matric_number': 'CSC001'}, {'matric_number': 'CSC002'}],
+        'face_boxes': [
+            {'box': {'x': 1, 'y': 2, 'width': 30, 'height': 40}, 'status': 'expected',
+             'matric_number': 'CSC001', 'confidence': 41.237, 'track_id': 7},
+            {'box': {'x': 50, 'y': 2, 'width': 20, 'height': 20}, 'status': 'low_quality'}
+        ],
+        'recognized_students': [{'matric_number': matric} for matric in recognized]
+    }
+
+
+class FrameDeltaEncoderTest(SimpleTestCase):
+
+    def test_faces_are_arrays_in_field_order(self):
+        faces = FrameDeltaEncoder().encode(frame_result())['faces']
+
+        self.assertEqual(dict(zip(FACE_FIELDS, faces[0])), {
+            'x': 1, 'y': 2, 'width': 30, 'height': 40, 'status': 'expected',
+            'matric_number': 'CSC001', 'confidence': 41.24, 'track_id': 7
+        })
+        self.assertEqual(faces[1][4:], ['low_quality', None, None, None])
+
+    def test_roster_and_recognitions_are_sent_once(self):
+        encoder = FrameDeltaEncoder()
+        first = encoder.encode(frame_result())
+        second = encoder.encode(frame_result(recognized=('CSC001', 'CSC002')))
+
+        self.assertEqual(first['roster']['expected_students'][1]['matric_number'], 'CSC002')
+        self.assertEqual(first['recognized'], [{'matric_number': 'CSC001'}])
+        self.assertNotIn('roster', second)
+        self.assertEqual(second['recognized'], [{'matric_number': 'CSC002'}])
+
+        # A new roster version is sent again and restarts the announcements
+        third = encoder.encode(frame_result(version='v2'))
+        self.assertEqual(third['roster']['version'], 'v2')
+        self.assertEqual(third['recognized'], [{'matric_number': 'CSC001'}])
+
+    def test_client_roster_version_skips_roster(self):
+        self.assertNotIn('roster', FrameDeltaEncoder('v1').encode(frame_result()))
+        self.assertIn('roster', FrameDeltaEncoder('v0').encode(frame_result()))
+
+
+class FrameEncoderManagerTest(SimpleTestCase):
+
+    def test_http_clients_of_a_camera_share_an_encoder(self):
+        encoders = FrameEncoderManager()
+        first = encoders.encode('hall-a', None, frame_result())
+        second = encoders.encode('hall-a', 'v1', frame_result())
+
+        self.assertEqual(len(first['recognized']), 1)
+        self.assertNotIn('roster', second)
+        self.assertEqual(second['recognized'], [])
+        # Without a camera there is no state to dedupe recognitions with
+        self.assertEqual(len(encoders.encode(None, 'v1', frame_result())['recognized']), 1)
+
+    def test_stale_client_roster_resends_recognitions(self):
+        encoders = FrameEncoderManager()
+        encoders.encode('hall-a', None, frame_result())
+
+        again = encoders.encode('hall-a', None, frame_result())
+
+        self.assertIn('roster', again)
+        self.assertEqual(len(again['recognized']), 1)
+
+    def test_least_recently_used_encoders_are_dropped(self):
+        encoders = FrameEncoderManager(max_encoders=2)
+        for camera_id in ('a', 'b', 'c'):
+            encoders.encode(camera_id, None, frame_result())
+
+        self.assertEqual(list(encoders._encoders), ['b', 'c'])
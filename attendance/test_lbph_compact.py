@@ -0,0 +1,71 @@
+"""
+Tests for the compact LBPH model format and histogram pruning
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from attendance.lbph_compact import CompactLBPHRecognizer, lbph_counts, prune_histograms
+
+
+def make_faces(count, seed=0):
+    rng = np.random.RandomState(seed)
+    return [cv2.GaussianBlur(rng.randint(0, 255, (60, 60), dtype=np.uint8), (5, 5), 0) for _ in range(count)]
+
+
+class CompactLBPHRecognizerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.faces = make_faces(12)
+        self.labels = np.repeat(np.arange(4), 3)
+        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        self.recognizer.train(self.faces, self.labels)
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_histograms_match_opencv(self):
+        counts, area = lbph_counts(self.faces[5])
+        np.testing.assert_allclose(counts / area, self.recognizer.getHistograms()[5].ravel(), atol=1e-6)
+
+    def test_predictions_match_opencv(self):
+        compact = CompactLBPHRecognizer.from_recognizer(self.recognizer)
+        self.assertEqual(compact.histograms.dtype, np.uint16)
+
+        for face in make_faces(5, seed=1) + self.faces[:3]:
+            expected_label, expected_distance = self.recognizer.predict(face)
+            label, distance = compact.predict(face)
+            self.assertEqual(label, expected_label)
+            self.assertAlmostEqual(distance, expected_distance, places=4)
+
+    def test_batch_predictions_match_single(self):
+        compact = CompactLBPHRecognizer.from_recognizer(self.recognizer)
+        faces = np.stack(make_faces(4, seed=3) + self.faces[:2])
+
+        self.assertEqual(compact.predict_batch(faces), [compact.predict(face) for face in faces])
+        self.assertEqual(compact.predict_batch(faces[:0]), [])
+
+    def test_saved_model_is_memory_mapped(self):
+        CompactLBPHRecognizer.from_recognizer(self.recognizer).save(self.directory, source={'size': 1})
+        compact = CompactLBPHRecognizer.load(self.directory)
+
+        self.assertIsInstance(compact.histograms, np.memmap)
+        self.assertEqual(compact.read_meta(self.directory)['source'], {'size': 1})
+        self.assertEqual(compact.predict(self.faces[7])[0], self.recognizer.predict(self.faces[7])[0])
+
+    def test_threshold_rejects_distant_faces(self):
+        self.recognizer.setThreshold(1.0)
+        compact = CompactLBPHRecognizer.from_recognizer(self.recognizer)
+        self.assertEqual(compact.predict(make_faces(1, seed=2)[0])[0], -1)
+
+    def test_pruning_keeps_k_histograms_per_label(self):
+        compact = CompactLBPHRecognizer.from_recognizer(self.recognizer)
+        keep = prune_histograms(compact.histograms, compact.labels, 2)
+
+        self.assertEqual(np.bincount(compact.labels[keep]).tolist(), [2, 2, 2, 2])
+        pruned = CompactLBPHRecognizer.from_recognizer(self.recognizer, keep=keep)
+        self.assertEqual(len(pruned.labels), 8)
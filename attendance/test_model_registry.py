@@ -0,0 +1,205 @@
+"""
+Tests for the process-wide face model registry
+"""
+
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from attendance.model_registry import (
+    ModelRegistry, model_registry, copy_lbph_recognizer, load_lbph_model, load_lbph_shards, save_lbph_shards,
+    LBPH_MODEL, LBPHModel
+)
+
+
+class ModelRegistryTest(SimpleTestCase):
+
+    def setUp(self):
+        self.loads = 0
+        self.registry = ModelRegistry()
+        self.registry.register('dummy', self._load)
+
+    def _load(self):
+        self.loads += 1
+        return {'load': self.loads}
+
+    def test_model_is_loaded_lazily_once(self):
+        self.assertIsNone(self.registry.get_if_loaded('dummy'))
+
+        first = self.registry.get('dummy')
+        second = self.registry.get('dummy')
+
+        self.assertIs(first, second)
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(first.version, 1)
+
+    def test_concurrent_first_use_loads_once(self):
+        threads = [threading.Thread(target=self.registry.get, args=('dummy',)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.loads, 1)
+
+    def test_reload_swaps_without_touching_old_handle(self):
+        old_handle = self.registry.get('dummy')
+        new_handle = self.registry.reload('dummy')
+
+        self.assertEqual(old_handle.model, {'load': 1})
+        self.assertEqual(new_handle.model, {'load': 2})
+        self.assertEqual(new_handle.version, 2)
+        self.assertIs(self.registry.get('dummy'), new_handle)
+
+    def test_swap_publishes_prebuilt_model(self):
+        handle = self.registry.swap('dummy', {'trained': True})
+
+        self.assertEqual(self.loads, 0)
+        self.assertIs(self.registry.get('dummy'), handle)
+
+    def test_lbph_model_is_shared_by_services(self):
+        from attendance.face_recognition import face_recognition_service
+        from attendance.simple_face_recognition import simple_face_recognition_service
+
+        self.assertIs(face_recognition_service.lbph_model, simple_face_recognition_service.lbph_model)
+        self.assertIs(face_recognition_service.lbph_model, model_registry.get(LBPH_MODEL).model)
+        with self.assertRaises(TypeError):
+            face_recognition_service.id_to_matric[-1] = 'X'
+
+
+class CopyLBPHRecognizerTest(SimpleTestCase):
+
+    def setUp(self):
+        import cv2
+        import numpy as np
+
+        rng = np.random.RandomState(0)
+        self.faces = [rng.randint(0, 255, (50, 50), dtype=np.uint8) for _ in range(6)]
+        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        self.recognizer.train(self.faces, np.array([0, 0, 1, 1, 2, 2]))
+
+    def test_copy_drops_excluded_labels_only(self):
+        copy = copy_lbph_recognizer(self.recognizer, exclude_labels=[1])
+
+        self.assertEqual(copy.getLabels().ravel().tolist(), [0, 0, 2, 2])
+        self.assertEqual(copy.predict(self.faces[4])[0], 2)
+        # The live recognizer is untouched
+        self.assertEqual(len(self.recognizer.getHistograms()), 6)
+
+    def test_copy_can_be_updated_independently(self):
+        import numpy as np
+
+        copy = copy_lbph_recognizer(self.recognizer)
+        copy.update(self.faces[:1], np.array([3]))
+
+        self.assertEqual(len(copy.getHistograms()), 7)
+        self.assertEqual(len(self.recognizer.getHistograms()), 6)
+        self.assertEqual(copy.getGridX(), self.recognizer.getGridX())
+
+
+class LBPHShardTest(SimpleTestCase):
+
+    def setUp(self):
+        import cv2
+        import numpy as np
+
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir)
+        settings_override = override_settings(BASE_DIR=self.base_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        rng = np.random.RandomState(0)
+        self.faces = [rng.randint(0, 255, (50, 50), dtype=np.uint8) for _ in range(6)]
+        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        self.recognizer.train(self.faces, np.array([0, 0, 1, 1, 2, 2]))
+        self.label_map = {'A': 0, 'B': 1, 'C': 2}
+
+    def test_shards_hold_only_their_students(self):
+        shards = save_lbph_shards(self.recognizer, self.label_map, {'department-1': [0, 1], 'department-2': [2]})
+
+        self.assertEqual(shards.get('department-1').getLabels().ravel().tolist(), [0, 0, 1, 1])
+        self.assertEqual(shards.get('department-2').getLabels().ravel().tolist(), [2, 2])
+
+        loaded = load_lbph_shards(self.label_map)
+        self.assertEqual(set(loaded.keys()), {'department-1', 'department-2'})
+        self.assertIsNone(load_lbph_shards({'A': 0}))
+
+    def test_prediction_is_limited_to_selected_shards(self):
+        shards = save_lbph_shards(self.recognizer, self.label_map, {'department-1': [0, 1], 'department-2': [2]})
+        model = LBPHModel(self.recognizer, self.label_map, {0: 'A', 1: 'B', 2: 'C'}, shards=shards)
+
+        self.assertEqual(model.predict(self.faces[4])[0], 2)
+        self.assertEqual(model.predict(self.faces[4], ['department-2'])[0], 2)
+        self.assertIn(model.predict(self.faces[4], ['department-1'])[0], (0, 1))
+        # Unknown shard keys fall back to the global recognizer
+        self.assertEqual(model.recognizers_for(['department-9']), [self.recognizer])
+
+        import numpy as np
+
+        faces = np.stack(self.faces)
+        for keys in (None, ['department-1'], ['department-1', 'department-2']):
+            self.assertEqual(model.predict_batch(faces, keys), [model.predict(face, keys) for face in faces])
+
+    def test_new_shards_keep_only_the_previous_generation(self):
+        from attendance.model_registry import get_shards_dir
+
+        save_lbph_shards(self.recognizer, self.label_map, {'level-1': [0]})
+        previous = save_lbph_shards(self.recognizer, self.label_map, {'level-2': [1]})
+        latest = save_lbph_shards(self.recognizer, self.label_map, {'level-3': [2]})
+
+        directories = {path for path in get_shards_dir().iterdir() if path.is_dir()}
+        self.assertEqual(directories, {previous.directory, latest.directory})
+        # A handle still on the replaced generation can load its shards
+        self.assertEqual(previous.get('level-2').getLabels().ravel().tolist(), [1, 1])
+
+
+class CompactLBPHModelTest(SimpleTestCase):
+
+    def setUp(self):
+        import cv2
+        import numpy as np
+
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir)
+        settings_override = override_settings(BASE_DIR=self.base_dir, FACE_LBPH_COMPACT=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        rng = np.random.RandomState(0)
+        self.faces = [rng.randint(0, 255, (50, 50), dtype=np.uint8) for _ in range(4)]
+        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        self.recognizer.train(self.faces, np.array([0, 0, 1, 1]))
+
+        # Keep the process-wide registry out of reach of save_lbph_model()
+        registry = ModelRegistry()
+        registry.register(LBPH_MODEL, load_lbph_model)
+        registry_patch = mock.patch('attendance.model_registry.model_registry', registry)
+        registry_patch.start()
+        self.addCleanup(registry_patch.stop)
+
+    def test_saved_model_is_served_from_compact_export(self):
+        from attendance.lbph_compact import CompactLBPHRecognizer
+        from attendance.model_registry import save_lbph_model
+
+        with override_settings(FACE_LBPH_PRUNE_PER_STUDENT=1):
+            handle = save_lbph_model(self.recognizer, {'A': 0, 'B': 1})
+
+        self.assertIsInstance(handle.model.recognizer, CompactLBPHRecognizer)
+        self.assertEqual(len(handle.model.recognizer.labels), 2)
+        self.assertIsInstance(load_lbph_model().recognizer, CompactLBPHRecognizer)
+
+    def test_stale_compact_export_falls_back_to_yaml(self):
+        import os
+
+        from attendance.lbph_compact import CompactLBPHRecognizer
+        from attendance.model_registry import get_model_dir, save_lbph_model
+
+        save_lbph_model(self.recognizer, {'A': 0, 'B': 1})
+        model_file = get_model_dir() / "face_trainer.yml"
+        os.utime(model_file, ns=(0, 0))
+
+        self.assertNotIsInstance(load_lbph_model().recognizer, CompactLBPHRecognizer)
@@ -0,0 +1,98 @@
+import datetime
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from attendance.attendance_buffer import get_course_registrations
+from attendance.models import Attendance, AttendanceDetection
+from attendance.presence_accumulator import PresenceAccumulator, presence_accumulator
+from attendance.presence_tracking_service import presence_tracking_service
+from attendance.test_roster_index import TimetableFixtureMixin
+from courses.models import CourseRegistration
+
+CLASS_START = timezone.make_aware(datetime.datetime(2025, 9, 1, 9, 0))
+
+
+class PresenceAccumulatorTest(TimetableFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_timetable_fixture()
+        self.accumulator = PresenceAccumulator(flush_interval=3600, detection_sampling=2)
+        registrations = get_course_registrations({(student.id, self.course.id) for student in self.students})
+        self.attendances = [
+            presence_tracking_service.start_presence_tracking(
+                student,
+                CourseRegistration.objects.get(id=registrations[(student.id, self.course.id)]),
+                date=CLASS_START.date()
+            )
+            for student in self.students
+        ]
+        self.timestamps = [CLASS_START + timedelta(minutes=10 * i) for i in range(5)]
+
+    def tearDown(self):
+        self.accumulator.flush()
+
+    def test_flush_matches_per_detection_updates(self):
+        for timestamp in self.timestamps:
+            self.accumulator.record(self.attendances[0], 0.8, detected_at=timestamp)
+        for timestamp in self.timestamps:
+            presence_tracking_service.record_presence_detection(self.attendances[1], timestamp)
+
+        self.assertEqual(self.accumulator.flush(), 1)
+
+        accumulated = Attendance.objects.get(id=self.attendances[0].id)
+        direct = Attendance.objects.get(id=self.attendances[1].id)
+        for field in ('detection_count', 'first_detected_at', 'last_detected_at', 'presence_duration',
+                      'presence_percentage', 'status'):
+            self.assertEqual(getattr(accumulated, field), getattr(direct, field), field)
+        self.assertEqual(accumulated.detection_count, 5)
+        self.assertAlmostEqual(accumulated.avg_confidence, 0.8)
+
+    def test_detections_are_merged_across_flushes(self):
+        self.accumulator.record(self.attendances[0], 1.0, detected_at=self.timestamps[0])
+        self.accumulator.flush()
+        self.accumulator.record(self.attendances[0], 0.5, detected_at=self.timestamps[1])
+        self.accumulator.flush()
+
+        attendance = Attendance.objects.get(id=self.attendances[0].id)
+        self.assertEqual(attendance.detection_count, 2)
+        self.assertEqual(attendance.first_detected_at, self.timestamps[0])
+        self.assertEqual(attendance.last_detected_at, self.timestamps[1])
+        self.assertAlmostEqual(attendance.avg_confidence, 0.75)
+
+    def test_detection_rows_are_sampled(self):
+        for timestamp in self.timestamps:
+            self.accumulator.record(self.attendances[0], 0.9, detected_at=timestamp,
+                                    session_context={'session_id': 's1'})
+        self.accumulator.flush()
+
+        detections = AttendanceDetection.objects.filter(attendance_id=self.attendances[0].id)
+        self.assertEqual(detections.count(), 3)
+        self.assertEqual(
+            sorted(d.session_context['detected_at'] for d in detections),
+            [self.timestamps[i].isoformat() for i in (0, 2, 4)]
+        )
+
+    def test_one_write_per_flush_for_many_students(self):
+        for attendance in self.attendances:
+            for timestamp in self.timestamps:
+                self.accumulator.record(attendance, 0.9, detected_at=timestamp)
+
+        # Savepoint, select, bulk update, detection insert, three attendance counter
+        # queries for the status changes, release
+        with self.assertNumQueries(8):
+            self.assertEqual(self.accumulator.flush(), 3)
+
+    def test_finalization_flushes_pending_detections(self):
+        for timestamp in self.timestamps:
+            presence_accumulator.record(self.attendances[0], 0.9, detected_at=timestamp)
+
+        presence_tracking_service.finalize_class_session(
+            self.attendances[0].course_registration, CLASS_START.date()
+        )
+
+        attendance = Attendance.objects.get(id=self.attendances[0].id)
+        self.assertEqual(attendance.detection_count, 5)
+        self.assertTrue(attendance.is_locked)
+        self.assertEqual(presence_accumulator.get_stats()['pending_records'], 0)
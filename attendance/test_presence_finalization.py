@@ -0,0 +1,77 @@
+import datetime
+from datetime import timedelta
+
+from django.test import TestCase
+
+from attendance.attendance_buffer import get_course_registrations
+from attendance.models import Attendance
+from attendance.presence_tracking_service import PresenceTrackingService
+from attendance.test_roster_index import TimetableFixtureMixin
+from courses.models import CourseRegistration
+
+CLASS_DATE = datetime.date(2025, 9, 1)
+
+
+class FinalizeClassSessionTest(TimetableFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.create_timetable_fixture()
+        self.service = PresenceTrackingService()
+        registrations = get_course_registrations({(student.id, self.course.id) for student in self.students})
+        self.registrations = {
+            student.matric_number: registrations[(student.id, self.course.id)] for student in self.students
+        }
+
+    def create_attendance(self, student, presence_minutes, status='absent', **fields):
+        attendance = Attendance.objects.create(
+            student=student,
+            course_registration_id=self.registrations[student.matric_number],
+            date=CLASS_DATE,
+            status=status,
+            total_class_duration=timedelta(minutes=120),
+            **fields
+        )
+        # Presence gathered after creation, without save() deriving the status
+        Attendance.objects.filter(id=attendance.id).update(
+            presence_duration=timedelta(minutes=presence_minutes), status=status
+        )
+        return attendance
+
+    def test_statuses_are_finalized_and_locked(self):
+        self.create_attendance(self.students[0], 100)
+        self.create_attendance(self.students[1], 65)
+        self.create_attendance(self.students[2], 0)
+
+        result = self.service.finalize_class_sessions(
+            CourseRegistration.objects.filter(course=self.course), CLASS_DATE
+        )
+
+        self.assertEqual(result['finalized_count'], 3)
+        statuses = dict(Attendance.objects.values_list('student__matric_number', 'status'))
+        self.assertEqual(statuses, {'CSC000': 'present', 'CSC001': 'partial', 'CSC002': 'absent'})
+        self.assertFalse(Attendance.objects.filter(is_locked=False).exists())
+        changes = {change['matric_number']: change for change in result['status_changes']}
+        self.assertEqual(set(changes), {'CSC000', 'CSC001'})
+        self.assertEqual(changes['CSC000']['old_status'], 'absent')
+        self.assertAlmostEqual(changes['CSC001']['presence_percentage'], 65 / 120 * 100)
+
+    def test_manual_override_keeps_status(self):
+        self.create_attendance(self.students[0], 0, status='present', is_manual_override=True)
+
+        result = self.service.finalize_class_session(
+            CourseRegistration.objects.get(id=self.registrations['CSC000']), CLASS_DATE
+        )
+
+        attendance = Attendance.objects.get()
+        self.assertEqual(attendance.status, 'present')
+        self.assertTrue(attendance.is_locked)
+        self.assertEqual(result['status_changes'], [])
+
+    def test_query_count_does_not_grow_with_students(self):
+        for student in self.students:
+            self.create_attendance(student, 100)
+        registrations = list(CourseRegistration.objects.filter(course=self.course))
+
+        # Savepoint, select, bulk update, three attendance counter queries, release
+        with self.assertNumQueries(7):
+            self.service.finalize_class_sessions(registrations, CLASS_DATE)
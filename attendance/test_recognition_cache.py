@@ -0,0 +1,74 @@
+"""
+Tests for the recognition result cache
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from attendance.camera_sessions import FaceTrack
+from attendance.recognition_cache import RecognitionCache, CachedStudent
+
+
+STUDENT = CachedStudent(id=1, user_id=10, matric_number='CSC/2020/001', full_name='Ada Obi')
+
+
+class RecognitionCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = RecognitionCache(max_entries=2, ttl=5.0, confirmations_required=2)
+
+    def test_entry_is_served_only_after_confirmation(self):
+        key = self.cache.key_for('cam-1', box=(100, 100, 60, 60))
+
+        self.cache.put(key, 3, 40.0, STUDENT, model_version=1)
+        self.assertIsNone(self.cache.get(key, model_version=1))
+
+        self.cache.put(key, 3, 42.0, STUDENT, model_version=1)
+        entry = self.cache.get(key, model_version=1)
+        self.assertEqual(entry.student, STUDENT)
+        self.assertEqual(self.cache.get_stats()['hits'], 1)
+
+    def test_different_label_restarts_confirmation(self):
+        key = self.cache.key_for('cam-1', box=(100, 100, 60, 60))
+        self.cache.put(key, 3, 40.0, STUDENT, model_version=1)
+        self.cache.put(key, 4, 40.0, None, model_version=1)
+        self.assertIsNone(self.cache.get(key, model_version=1))
+
+    def test_entries_expire_and_follow_model_version(self):
+        key = self.cache.key_for('cam-1', box=(100, 100, 60, 60))
+        for _ in range(2):
+            self.cache.put(key, 3, 40.0, STUDENT, model_version=1)
+
+        self.assertIsNone(self.cache.get(key, model_version=2))
+
+        for _ in range(2):
+            self.cache.put(key, 3, 40.0, STUDENT, model_version=1)
+        with mock.patch('attendance.recognition_cache.time.time', return_value=10**10):
+            self.assertIsNone(self.cache.get(key, model_version=1))
+        self.assertEqual(self.cache.get_stats()['expirations'], 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        keys = [self.cache.key_for('cam-1', box=(x, 0, 40, 40)) for x in (0, 100, 200)]
+        for key in keys:
+            self.cache.put(key, 1, 40.0, STUDENT)
+
+        stats = self.cache.get_stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['evictions'], 1)
+
+    def test_tracked_faces_are_keyed_by_track(self):
+        track = FaceTrack(7, (0, 0, 40, 40))
+        self.assertEqual(self.cache.key_for('cam-1', track, (300, 300, 40, 40)), ('track', 'cam-1', 7))
+        # Small jitter of an untracked face stays in the same bucket
+        self.assertEqual(self.cache.key_for('cam-1', box=(100, 100, 60, 60)),
+                         self.cache.key_for('cam-1', box=(104, 98, 62, 60)))
+
+    def test_frames_without_camera_are_not_cached(self):
+        key = self.cache.key_for(None, box=(100, 100, 60, 60))
+        self.assertIsNone(key)
+        self.cache.put(key, 3, 40.0, None)
+        self.cache.put(key, 3, 40.0, None)
+
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(self.cache.get_stats()['entries'], 0)
@@ -0,0 +1,97 @@
+"""
+Tests for recognition worker routing and load shedding
+"""
+
+from concurrent.futures import Future
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from attendance import recognition_workers
+from attendance.model_registry import model_registry, LBPH_MODEL
+from attendance.recognition_workers import RecognitionWorkerPool, FrameDropped, end_camera_session, run_frame
+
+
+class RecognitionWorkerPoolTest(SimpleTestCase):
+
+    def test_disabled_without_workers(self):
+        self.assertFalse(RecognitionWorkerPool(worker_count=0, queue_size=2).enabled)
+
+    def test_camera_is_routed_to_the_same_worker(self):
+        pool = RecognitionWorkerPool(worker_count=4, queue_size=2)
+        first = pool._select_worker('room-101')
+        pool._in_flight = [1, 1, 1, 1]
+        self.assertEqual(pool._select_worker('room-101'), first)
+
+    def test_cameraless_frames_go_to_least_busy_worker(self):
+        pool = RecognitionWorkerPool(worker_count=3, queue_size=2)
+        pool._in_flight = [2, 0, 1]
+        self.assertEqual(pool._select_worker(None), 1)
+
+    def test_full_worker_drops_frame_with_retry_hint(self):
+        pool = RecognitionWorkerPool(worker_count=1, queue_size=2)
+        pool._in_flight = [2]
+
+        with self.assertRaises(FrameDropped) as ctx:
+            pool.submit(b'frame', camera_id='room-101')
+
+        self.assertGreaterEqual(ctx.exception.retry_after, 1.0)
+        stats = pool.get_stats()
+        self.assertEqual(stats['dropped'], 1)
+        self.assertEqual(stats['submitted'], 0)
+        self.assertEqual(stats['queue_depth'], 2)
+
+    def test_worker_stage_timings_are_recorded_before_result_is_released(self):
+        from concurrent.futures import Future
+
+        from attendance.stage_timing import stage_timings
+
+        pool = RecognitionWorkerPool(worker_count=1, queue_size=2)
+        pool._in_flight = [1]
+        stage_timings.clear()
+        self.addCleanup(stage_timings.clear)
+
+        worker_future, result = Future(), Future()
+        worker_future.set_result({
+            'faces_detected': 1,
+            'stage_timings': {'service': 'lbph', 'stages_ms': {'detect': 4.0}, 'total_ms': 6.0}
+        })
+        pool._on_done(0, 0.0, worker_future, result)
+
+        self.assertNotIn('stage_timings', result.result())
+        self.assertEqual(stage_timings.get_stats()['lbph']['stages']['detect']['samples'], 1)
+        self.assertEqual(pool.get_stats()['queue_depth'], 0)
+
+    def test_frames_carry_the_model_version(self):
+        pool = RecognitionWorkerPool(worker_count=1, queue_size=2)
+        executor = mock.Mock()
+        executor.submit.return_value = Future()
+        pool._executors = [executor]
+
+        pool.submit(b'frame', camera_id='room-101')
+
+        args = executor.submit.call_args.args
+        self.assertIs(args[0], run_frame)
+        self.assertEqual(args[-1], model_registry.version(LBPH_MODEL))
+
+    def test_worker_reloads_when_behind(self):
+        service = mock.Mock()
+        service.reload_models.return_value = {'success': True}
+        self.addCleanup(setattr, recognition_workers, '_worker_model_version', None)
+        recognition_workers._worker_model_version = 2
+
+        for version in (None, 2, 3, 3):
+            recognition_workers._sync_model(service, version)
+
+        self.assertEqual(service.reload_models.call_count, 1)
+        self.assertEqual(recognition_workers._worker_model_version, 3)
+
+    def test_end_session_is_sent_to_the_camera_worker(self):
+        pool = RecognitionWorkerPool(worker_count=2, queue_size=2)
+        self.assertIsNone(pool.end_session('room-101'))
+
+        executor = mock.Mock()
+        pool._executors[pool._select_worker('room-101')] = executor
+        pool.end_session('room-101')
+
+        executor.submit.assert_called_once_with(end_camera_session, 'room-101')
@@ -0,0 +1,126 @@
+"""
+Tests for the in-memory roster index used by frame processing
+"""
+
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from academics.models import AcademicYear, Course, Department as AcademicDepartment, Semester
+from courses.models import Level, Timetable, TimetableSlot
+from institutions.models import Department, Faculty, Institution
+from institutions.program_models import AcademicProgram
+from students.models import Student, StudentCourseSelection
+from attendance.roster_index import RosterIndex, roster_index, roster_version, shard_keys_for
+
+User = get_user_model()
+
+
+class TimetableFixtureMixin:
+    """One timetable slot with three students, the first two taking the course"""
+
+    def create_timetable_fixture(self):
+        institution = Institution.objects.create(name="Test University", code="TU")
+        program = AcademicProgram.objects.create(name="Computer Science", code="CSC", institution=institution)
+        faculty = Faculty.objects.create(name="Science", program=program)
+        self.department = Department.objects.create(name="Computer Science", faculty=faculty)
+        # Timetables reference the academics department with the same id
+        academic_department = AcademicDepartment.objects.create(
+            id=self.department.id, name="Computer Science", code="CSC"
+        )
+        year = AcademicYear.objects.create(
+            name="2025/2026", start_date=datetime.date(2025, 9, 1), end_date=datetime.date(2026, 7, 31)
+        )
+        self.semester = Semester.objects.create(
+            academic_year=year, name="Semester 1", is_current=True,
+            start_date=datetime.date(2025, 9, 1), end_date=datetime.date(2026, 1, 31)
+        )
+
+        self.level = Level.objects.create(name="Level 200", code=200, department=academic_department)
+        self.course = Course.objects.create(
+            code="CSC201", title="Data Structures", department=academic_department,
+            credit_units=3, level=200
+        )
+        timetable = Timetable.objects.create(
+            name="CSC L200", department=academic_department, level=self.level, semester=self.semester
+        )
+        self.slot = TimetableSlot.objects.create(
+            timetable=timetable, course=self.course, level=self.level, day_of_week='MON',
+            start_time=datetime.time(9, 0), end_time=datetime.time(11, 0), venue="Hall A"
+        )
+
+        self.students = []
+        for i in range(3):
+            user = User.objects.create_user(username=f"student{i}", email=f"student{i}@test.com", password="x")
+            student = Student.objects.create(
+                user=user, full_name=f"Student {i}", matric_number=f"CSC00{i}", institution=institution,
+                faculty=faculty, department=self.department, program=program,
+                is_active=True, is_approved=True
+            )
+            self.students.append(student)
+
+        for student in self.students[:2]:
+            StudentCourseSelection.objects.create(
+                student=student, department=self.department, level=self.level, course=self.course,
+                is_offered=True, is_approved=True
+            )
+
+
+class RosterIndexTest(TimetableFixtureMixin, TestCase):
+
+    def setUp(self):
+        roster_index.clear()
+        self.index = RosterIndex()
+        self.create_timetable_fixture()
+
+    def test_roster_contains_only_expected_students(self):
+        roster = self.index.get_roster(self.slot)
+
+        self.assertEqual(len(roster), 2)
+        self.assertIn(self.students[0].id, roster)
+        self.assertNotIn(self.students[2].id, roster)
+        self.assertEqual(roster.students_by_matric['CSC001']['full_name'], "Student 1")
+        self.assertEqual(roster.slot_info['expected_students_count'], 2)
+
+    def test_roster_is_built_once(self):
+        self.index.get_roster(self.slot)
+        with self.assertNumQueries(0):
+            roster = self.index.get_roster(self.slot)
+            self.assertIn(self.students[1].id, roster)
+
+    def test_course_selection_change_invalidates_global_roster(self):
+        self.assertEqual(len(roster_index.get_roster(self.slot)), 2)
+
+        StudentCourseSelection.objects.create(
+            student=self.students[2], department=self.department, level=self.level, course=self.course,
+            is_offered=True, is_approved=True
+        )
+
+        self.assertEqual(len(roster_index.get_roster(self.slot)), 3)
+
+    def test_roster_version_follows_content(self):
+        first = roster_version([self.index.get_roster(self.slot)])
+        # Rebuilt in another process: same content, same version
+        self.assertEqual(roster_version([RosterIndex().get_roster(self.slot)]), first)
+
+        StudentCourseSelection.objects.create(
+            student=self.students[2], department=self.department, level=self.level, course=self.course,
+            is_offered=True, is_approved=True
+        )
+        self.assertNotEqual(roster_version([RosterIndex().get_roster(self.slot)]), first)
+
+    def test_shard_keys_follow_sharding_setting(self):
+        from attendance.simple_face_trainer import student_shard_labels
+
+        roster = self.index.get_roster(TimetableSlot.objects.get(pk=self.slot.pk))
+        shard_labels = student_shard_labels({'CSC000': 0, 'CSC001': 1, 'CSC002': 2})
+
+        with override_settings(FACE_RECOGNITION_SHARDING='department'):
+            [key] = shard_keys_for([roster])
+            self.assertEqual(shard_labels[key], {0, 1})
+        with override_settings(FACE_RECOGNITION_SHARDING='level'):
+            [key] = shard_keys_for([roster])
+            self.assertEqual(shard_labels[key], {0, 1})
+        with override_settings(FACE_RECOGNITION_SHARDING=None):
+            self.assertEqual(shard_keys_for([roster]), [])
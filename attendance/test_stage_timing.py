@@ -0,0 +1,59 @@
+"""
+Tests for per-stage frame timing
+"""
+
+from django.test import SimpleTestCase, override_settings
+
+from attendance.stage_timing import StageTimer, StageTimings, stage_timings
+
+
+class StageTimerTest(SimpleTestCase):
+
+    def setUp(self):
+        stage_timings.clear()
+        self.addCleanup(stage_timings.clear)
+
+    def test_spans_of_a_stage_add_up(self):
+        timer = StageTimer('lbph')
+        for _ in range(3):
+            with timer.span('predict'):
+                pass
+        with timer.span('detect'):
+            pass
+
+        timings = timer.as_dict()
+        self.assertEqual(set(timings['stages_ms']), {'predict', 'detect'})
+        self.assertGreaterEqual(timings['total_ms'], timings['stages_ms']['predict'])
+
+    def test_span_is_recorded_when_stage_raises(self):
+        timer = StageTimer('lbph')
+        with self.assertRaises(ValueError):
+            with timer.span('decode'):
+                raise ValueError('bad frame')
+        self.assertIn('decode', timer.stages)
+
+    def test_finish_attaches_timings_only_when_enabled(self):
+        results = {}
+        StageTimer('lbph').finish(results)
+        self.assertNotIn('stage_timings', results)
+
+        with override_settings(FACE_RECOGNITION_RETURN_STAGE_TIMINGS=True):
+            StageTimer('lbph').finish(results)
+        self.assertEqual(results['stage_timings']['service'], 'lbph')
+        self.assertEqual(stage_timings.get_stats()['lbph']['frames'], 2)
+
+
+class StageTimingsTest(SimpleTestCase):
+
+    def test_percentiles_over_rolling_window(self):
+        timings = StageTimings(window=100)
+        for ms in range(1, 201):
+            timings.record({'service': 'dlib', 'stages_ms': {'encode': float(ms)}, 'total_ms': float(ms)})
+
+        stats = timings.get_stats()['dlib']
+        encode = stats['stages']['encode']
+        self.assertEqual(stats['frames'], 200)
+        self.assertEqual(encode['samples'], 100)
+        self.assertAlmostEqual(encode['p50_ms'], 150.5)
+        self.assertAlmostEqual(encode['p99_ms'], 199.01)
+        self.assertIn('total', stats['stages'])
@@ -0,0 +1,56 @@
+"""
+Tests for background face training jobs
+"""
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from attendance.training_jobs import TrainingJobManager, JOB_COMPLETED, JOB_FAILED
+
+
+class TrainingJobManagerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.manager = TrainingJobManager()
+
+    def wait(self, job):
+        self.manager._executor.submit(lambda: None).result(timeout=10)
+        return self.manager.get(job.id)
+
+    def test_job_reports_progress_and_result(self):
+        seen = []
+
+        def work(progress, matric_number):
+            progress(50, f'Half way through {matric_number}')
+            seen.append(self.manager.list_jobs()[0].to_dict()['progress'])
+            return {'success': True, 'matric_number': matric_number}
+
+        job = self.manager.submit('enroll', 'Enroll A1', work, matric_number='A1')
+        job = self.wait(job)
+
+        self.assertEqual(seen, [50])
+        self.assertEqual(job.status, JOB_COMPLETED)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(job.result['matric_number'], 'A1')
+
+    def test_failures_are_recorded(self):
+        def work(progress):
+            raise SystemExit('No training data found')
+
+        job = self.wait(self.manager.submit('full_train', 'Full retrain', work))
+
+        self.assertEqual(job.status, JOB_FAILED)
+        self.assertIn('No training data', job.error)
+
+
+class TrainingJobViewsTest(TestCase):
+
+    def test_training_endpoints_require_staff(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(
+            username='student', email='student@test.com', password='x'
+        ))
+
+        self.assertEqual(client.get('/api/attendance/face-tracking/training-jobs/').status_code, 403)
+        self.assertEqual(client.post('/api/attendance/face-tracking/retrain-models/').status_code, 403)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Background Face Training Jobs
+
+Training and enrollment run off the request thread. Jobs are executed one
+at a time, in submission order, by a single background thread, so two
+jobs never write the model files concurrently. Each job reports its
+progress, and its result or error, through TrainingJobManager.get().
+"""
+
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+
+class TrainingJob:
+    """State of one background training or enrollment run"""
+
+    def __init__(self, kind: str, description: str, requested_by: Optional[str] = None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.description = description
+        self.requested_by = requested_by
+        self.status = JOB_QUEUED
+        self.progress = 0
+        self.message = 'Queued'
+        self.result = None
+        self.error = None
+        self.created_at = timezone.now()
+        self.started_at = None
+        self.finished_at = None
+
+    def update_progress(self, percent: int, message: str):
+        self.progress = max(0, min(int(percent), 100))
+        self.message = message
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (JOB_COMPLETED, JOB_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'description': self.description,
+            'requested_by': self.requested_by,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class TrainingJobManager:
+    """Runs training jobs sequentially on a background thread"""
+
+    MAX_FINISHED_JOBS = 50  # Finished jobs kept for status queries
+
+    def __init__(self):
+        self._jobs: Dict[str, TrainingJob] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='face-training')
+
+    def submit(self, kind: str, description: str, func: Callable[..., Dict[str, Any]],
+               requested_by: Optional[str] = None, **kwargs) -> TrainingJob:
+        """
+        Queue a job
+
+        Args:
+            kind: Job type, e.g. 'enroll' or 'full_train'
+            description: Human readable summary
+            func: Called as func(progress=callable(percent, message), **kwargs)
+            requested_by: Optional user identifier for auditing
+        """
+        job = TrainingJob(kind, description, requested_by)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune_finished_jobs()
+        self._executor.submit(self._run, job, func, kwargs)
+        logger.info(f"Queued {kind} job {job.id}: {description}")
+        return job
+
+    def _run(self, job: TrainingJob, func: Callable[..., Dict[str, Any]], kwargs: Dict[str, Any]):
+        close_old_connections()
+        job.status = JOB_RUNNING
+        job.started_at = timezone.now()
+        job.message = 'Running'
+        try:
+            job.result = func(progress=job.update_progress, **kwargs)
+            job.status = JOB_COMPLETED
+            job.update_progress(100, 'Completed')
+            logger.info(f"{job.kind} job {job.id} completed")
+        except (Exception, SystemExit) as e:
+            # The full trainer signals missing data with SystemExit
+            job.status = JOB_FAILED
+            job.error = str(e)
+            job.message = 'Failed'
+            logger.error(f"{job.kind} job {job.id} failed: {e}")
+        finally:
+            job.finished_at = timezone.now()
+            close_old_connections()
+
+    def _prune_finished_jobs(self):
+        finished = sorted((job for job in self._jobs.values() if job.is_finished), key=lambda job: job.created_at)
+        for job in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        return self._jobs.get(str(job_id))
+
+    def list_jobs(self) -> List[TrainingJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+
+# Global training job manager
+training_jobs = TrainingJobManager()
@@ -10,6 +10,8 @@ urlpatterns = [
     
     # Face Tracking API endpoints
     path('face-tracking/process-frame/', face_tracking_views.process_face_frame, name='process_face_frame'),
+    path('face-tracking/process-frame-binary/', face_tracking_views.process_face_frame_binary, name='process_face_frame_binary'),
+    path('face-tracking/edge-events/', face_tracking_views.ingest_edge_events, name='ingest_edge_events'),
     path('face-tracking/active-sessions/', face_tracking_views.get_active_sessions, name='get_active_sessions'),
     path('face-tracking/session/<uuid:session_id>/attendance/', face_tracking_views.get_session_attendance, name='get_session_attendance'),
     path('face-tracking/model-status/', face_tracking_views.get_face_model_status, name='get_face_model_status'),
@@ -19,6 +21,9 @@ urlpatterns = [
     path('face-tracking/manual-override/', face_tracking_views.manual_attendance_override, name='manual_attendance_override'),
     path('face-tracking/retrain-models/', face_tracking_views.retrain_face_models, name='retrain_face_models'),
     path('face-tracking/simple-train-models/', face_tracking_views.simple_train_face_models, name='simple_train_face_models'),
+    path('face-tracking/enroll-student/', face_tracking_views.enroll_student_face, name='enroll_student_face'),
+    path('face-tracking/training-jobs/', face_tracking_views.get_training_jobs, name='get_training_jobs'),
+    path('face-tracking/training-jobs/<uuid:job_id>/', face_tracking_views.get_training_jobs, name='get_training_job'),
     path('face-tracking/config/', face_tracking_views.face_recognition_config, name='face_recognition_config'),
     path('face-tracking/stats/', face_tracking_views.get_face_recognition_stats, name='get_face_recognition_stats'),
     path('face-tracking/live-feed/', face_tracking_views.get_live_attendance_feed, name='get_live_attendance_feed'),
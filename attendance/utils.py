@@ -1,7 +1,8 @@
 from datetime import date
 from django.utils import timezone
 from courses.models import CourseRegistration, TimetableEntry
-from attendance.models import Timetable, Attendance
+from attendance.models import Timetable, Attendance, ExamEligibility
+from attendance.attendance_counters import get_combined_attendance_rate
 
 def auto_create_attendance_for_timetable(timetable_entry):
     """
@@ -93,18 +94,7 @@ def determine_attendance_status(timetable_entry):
     return "late"
 
 def calculate_attendance_percentage(student, course_offering):
-    total_classes = Attendance.objects.filter(
+    return round(get_combined_attendance_rate(ExamEligibility.objects.filter(
         student=student,
-        timetable_entry__course_offering=course_offering
-    ).count()
-
-    if total_classes == 0:
-        return 0
-
-    attended = Attendance.objects.filter(
-        student=student,
-        timetable_entry__course_offering=course_offering,
-        status__in=["present", "late"]
-    ).count()
-
-    return round((attended / total_classes) * 100, 2)
+        course_registration__course=course_offering.course
+    )), 2)
@@ -286,6 +286,27 @@ SERVER_EMAIL = 'server@university.local'
 INSTITUTION_NAME = 'Secure Scalable Academic System'
 PORTAL_URL = 'http://localhost:5173'
 ATTENDANCE_THRESHOLD = 75  # Attendance threshold percentage
+ATTENDANCE_ROLLUP_TODAY_MAX_AGE = 60  # Seconds today's analytics rollup may be stale before it is recomputed
+
+# Face recognition worker pool (0 = process frames in the request thread)
+FACE_RECOGNITION_WORKERS = int(os.environ.get('FACE_RECOGNITION_WORKERS', 0))
+FACE_RECOGNITION_QUEUE_SIZE = 2  # Frames in flight per worker before new frames are dropped
+FACE_RECOGNITION_TIMEOUT = 30  # Seconds to wait for a worker result
+FACE_DETECTION_BUDGET_MS = None  # Per-frame cascade detection budget (None = run every productive pass)
+FACE_DETECTION_MAX_DIMENSION = 1280  # Larger uploaded frames are decoded at 1/2, 1/4 or 1/8 resolution
+FACE_FRAME_GATE_THRESHOLD = 0.02  # Changed fraction of a camera's frame thumbnail below which the last result is reused (None = off)
+FACE_FRAME_GATE_MAX_REUSED = 10  # Consecutive frames a result may be reused for
+FACE_FRAME_GATE_MAX_AGE = 5.0  # Seconds a result may be reused for
+FACE_RECOGNITION_RETURN_STAGE_TIMINGS = False  # Include per-stage timings ('stage_timings') in every frame result
+FACE_RECOGNITION_SHARDING = 'department'  # Match faces against the 'department' or 'level' LBPH shards of active slots (None = global model)
+FACE_LBPH_COMPACT = True  # Serve the memory-mapped binary export of face_trainer.yml (ml_models/compact/)
+FACE_LBPH_PRUNE_PER_STUDENT = None  # Keep only this many medoid histograms per student in the compact model
+FACE_EDGE_MAX_EVENTS = 500  # Recognition events accepted per edge ingestion request
+FACE_PRESENCE_FLUSH_INTERVAL = 10.0  # Seconds presence detections are merged in memory before being written
+FACE_PRESENCE_DETECTION_SAMPLING = 10  # Store one AttendanceDetection row per this many detections of a student (1 = all, 0 = none)
+
+# Face training: processes used to extract faces from student photo directories
+FACE_TRAINING_WORKERS = int(os.environ.get('FACE_TRAINING_WORKERS', os.cpu_count() or 1))
 
 # Logging configuration
 LOGGING = {
@@ -385,8 +385,7 @@ class ClassSession(models.Model):
             status__in=['approved', 'auto_approved']
         )
         
-        for registration in course_registrations:
-            presence_tracking_service.finalize_class_session(registration, self.date)
+        presence_tracking_service.finalize_class_sessions(course_registrations, self.date)
 
     def get_expected_students(self):
         """Get list of students expected to attend this session"""
@@ -10,49 +10,13 @@ import os
 import logging
 from pathlib import Path
 import face_recognition
-from .face_utils import FaceProcessor
+from attendance.model_registry import model_registry, SVM_MODEL, FACE_PROCESSOR
 
 logger = logging.getLogger(__name__)
 
 class FaceRecognitionAPI(APIView):
     """API endpoint for face recognition."""
     
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.face_processor = FaceProcessor()
-        self.model = None
-        self.label_encoder = None
-        self._load_model()
-    
-    def _load_model(self):
-        """Load the trained model and label encoder."""
-        try:
-            model_dir = Path("ml_models")
-            
-            # Load SVM model
-            model_path = model_dir / "svm_face_classifier.pkl"
-            if not model_path.exists():
-                logger.error(f"Model file not found: {model_path}")
-                return False
-                
-            self.model = joblib.load(str(model_path))
-            
-            # Load label encoder
-            encoder_path = model_dir / "label_encoder.pkl"
-            if not encoder_path.exists():
-                logger.error(f"Label encoder file not found: {encoder_path}")
-                return False
-                
-            with open(encoder_path, 'rb') as f:
-                self.label_encoder = pickle.load(f)
-                
-            logger.info("Successfully loaded face recognition model")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error loading model: {e}")
-            return False
-    
     def post(self, request):
         """Handle face recognition request.
         Handle face recognition request.
@@ -63,8 +27,12 @@ class FaceRecognitionAPI(APIView):
         }
         """
         try:
-            # Check if model is loaded
-            if not self.model or not self.label_encoder:
+            # Models are loaded once per process and shared between requests
+            try:
+                svm = model_registry.get(SVM_MODEL).model
+                face_processor = model_registry.get(FACE_PROCESSOR).model
+            except Exception as e:
+                logger.error(f"Error loading model: {e}")
                 return Response(
                     {"error": "Face recognition model not loaded"}, 
                     status=status.HTTP_503_SERVICE_UNAVAILABLE
@@ -105,13 +73,8 @@ class FaceRecognitionAPI(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Enhance image
-            enhanced = enhance_image(image)
-            
-            # # Detect faces
-            # faces = self.face_processor.detect_faces(enhanced)
-            faces = self.face_processor.detect_faces(image)
-
+            # Detect faces
+            faces = face_processor.detect_faces(image)
             
             if not faces:
                 return Response({
@@ -119,43 +82,37 @@ class FaceRecognitionAPI(APIView):
                     "recognized_faces": []
                 })
             
-            # Process each face
-            results = []
+            # Keep faces large enough to encode, with coordinates inside the image
+            boxes = []
             for face in faces:
+                x, y, w, h = face['box']
+                x, y = max(0, x), max(0, y)  # Ensure coordinates are not negative
+                face_roi = image[y:y+h, x:x+w]
+                if face_roi.size == 0 or face_roi.shape[0] < 50 or face_roi.shape[1] < 50:
+                    continue
+                boxes.append({'box': [x, y, w, h]})
+            
+            results = []
+            if boxes:
                 try:
-                    # Get face bounding box
-                    x, y, w, h = face['box']
-                    x, y = max(0, x), max(0, y)  # Ensure coordinates are not negative
-                    
-                    # Extract face ROI
-                    face_roi = enhanced[y:y+h, x:x+w]
+                    # Align all faces and compute their descriptors in one batched call
+                    encodings = face_processor.get_face_encodings(image, boxes)
                     
-                    # Skip if face is too small
-                    if face_roi.size == 0 or face_roi.shape[0] < 50 or face_roi.shape[1] < 50:
-                        continue
+                    # One classifier call for the whole photo; the label is the most probable class
+                    probabilities = svm.classifier.predict_proba(np.vstack(encodings))
+                    best = probabilities.argmax(axis=1)
+                    max_probs = probabilities[np.arange(len(best)), best]
                     
-                    # Align face
-                    aligned_face = self.face_processor.align_face(enhanced, (x, y, w, h))
-                    
-                    if aligned_face is None:
-                        continue
-                    
-                    # Get face encoding
-                    encoding = self.face_processor.get_face_encoding(aligned_face)
-                    
-                    if encoding is not None:
-                        # Predict with SVM
-                        prediction = self.model.predict_proba([encoding])
-                        max_prob = np.max(prediction)
-                        
-                        # Only accept predictions with sufficient confidence
-                        if max_prob > 0.6:  # Adjust threshold as needed
-                            predicted_label = self.model.predict([encoding])[0]
-                            student_id = self.label_encoder.inverse_transform([predicted_label])[0]
-                            
+                    # Only accept predictions with sufficient confidence
+                    accepted = np.flatnonzero(max_probs > 0.6)  # Adjust threshold as needed
+                    if len(accepted):
+                        labels = svm.classifier.classes_[best[accepted]]
+                        student_ids = svm.label_encoder.inverse_transform(labels).tolist()
+                        for i, student_id in zip(accepted, student_ids):
+                            x, y, w, h = boxes[i]['box']
                             results.append({
                                 "student_id": student_id,
-                                "confidence": float(max_prob),
+                                "confidence": float(max_probs[i]),
                                 "bounding_box": {
                                     "x": int(x),
                                     "y": int(y),
@@ -163,10 +120,8 @@ class FaceRecognitionAPI(APIView):
                                     "height": int(h)
                                 }
                             })
-                            
                 except Exception as e:
-                    logger.error(f"Error processing face: {e}")
-                    continue
+                    logger.error(f"Error processing faces: {e}")
             
             return Response({
                 "detected_faces": len(faces),
@@ -7,6 +7,9 @@ import imutils
 import logging
 import os
 
+from attendance.embedding_index import EmbeddingIndex
+from attendance.face_detectors import detect_faces_dnn
+
 logger = logging.getLogger(__name__)
 
 class FaceProcessor:
@@ -76,39 +79,23 @@ class FaceProcessor:
     def _detect_faces_dnn(self, image):
         """Detect faces using OpenCV's DNN face detector."""
         try:
-            (h, w) = image.shape[:2]
-            blob = cv2.dnn.blobFromImage(
-                cv2.resize(image, (300, 300)), 1.0,
-                (300, 300), (104.0, 177.0, 123.0))
-            
-            self.dnn_net.setInput(blob)
-            detections = self.dnn_net.forward()
-            
-            results = []
-            for i in range(0, detections.shape[2]):
-                confidence = detections[0, 0, i, 2]
-                
-                if confidence > 0.7:  # Confidence threshold
-                    box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                    (startX, startY, endX, endY) = box.astype("int")
-                    
-                    # Ensure the bounding boxes fall within the dimensions of the frame
-                    (startX, startY) = (max(0, startX), max(0, startY))
-                    (endX, endY) = (min(w - 1, endX), min(h - 1, endY))
-                    
-                    results.append({
-                        'box': [startX, startY, endX - startX, endY - startY],
-                        'confidence': float(confidence)
-                    })
-            
-            return results
+            return detect_faces_dnn(self.dnn_net, image)
             
         except Exception as e:
             logger.error(f"Error in DNN face detection: {e}")
             return []
 
+    def align_faces(self, rgb_image, face_locations):
+        """68-point landmarks of every face, which dlib uses to align the face chips."""
+        shapes = dlib.full_object_detections()
+        for face in face_locations:
+            # Convert to dlib rectangle
+            (x, y, w, h) = face['box']
+            shapes.append(self.predictor(rgb_image, dlib.rectangle(left=x, top=y, right=x+w, bottom=y+h)))
+        return shapes
+
     def get_face_encodings(self, image, face_locations=None):
-        """Get face encodings for all faces in the image."""
+        """Get face encodings for all faces in the image, computed in one batched call."""
         if face_locations is None:
             face_locations = self.detect_faces(image)
             
@@ -118,26 +105,23 @@ class FaceProcessor:
         # Convert the image from BGR to RGB (dlib uses RGB)
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
-        encodings = []
-        for face in face_locations:
-            # Convert to dlib rectangle
-            (x, y, w, h) = face['box']
-            rect = dlib.rectangle(left=x, top=y, right=x+w, bottom=y+h)
-            
-            # Get the face landmarks
-            shape = self.predictor(rgb_image, rect)
-            
-            # Get the face encoding
-            face_encoding = self.face_recognizer.compute_face_descriptor(rgb_image, shape)
-            encodings.append(np.array(face_encoding))
-            
-        return encodings
+        # Align every face, then run the ResNet encoder over all face chips at once
+        shapes = self.align_faces(rgb_image, face_locations)
+        descriptors = self.face_recognizer.compute_face_descriptor(rgb_image, shapes)
+        return [np.array(descriptor) for descriptor in descriptors]
 
     def compare_faces(self, known_encodings, face_encoding_to_check, tolerance=0.6):
-        """Compare a face encoding to a list of known face encodings."""
-        if not known_encodings:
-            return []
-            
+        """Compare a face encoding to a list of known face encodings (or an EmbeddingIndex)."""
+        return self.compare_faces_batch(known_encodings, [face_encoding_to_check], tolerance)[0]
+
+    def compare_faces_batch(self, known_encodings, face_encodings_to_check, tolerance=0.6):
+        """Compare several face encodings to the known encodings with one matrix product."""
+        if len(known_encodings) == 0:
+            return [[] for _ in face_encodings_to_check]
+
+        if not isinstance(known_encodings, EmbeddingIndex):
+            known_encodings = EmbeddingIndex(known_encodings)
+
         # Calculate face distances
-        distances = np.linalg.norm(known_encodings - face_encoding_to_check, axis=1)
-        return list(distances <= tolerance)
\ No newline at end of file
+        distances = known_encodings.distances(face_encodings_to_check)
+        return [list(row <= tolerance) for row in distances]
\ No newline at end of file
@@ -1,3 +1,66 @@
-from django.test import TestCase
+import base64
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+from sklearn.preprocessing import LabelEncoder
+from sklearn.svm import SVC
+
+from recognition.api import FaceRecognitionAPI
+
+
+class FakeFaceProcessor:
+    """Detects fixed boxes and returns one known encoding per box"""
+
+    def __init__(self, boxes, encodings):
+        self.boxes = boxes
+        self.encodings = encodings
+        self.encoding_calls = 0
+
+    def detect_faces(self, image):
+        return [{'box': box, 'confidence': 1.0} for box in self.boxes]
+
+    def get_face_encodings(self, image, face_locations):
+        self.encoding_calls += 1
+        return [self.encodings[tuple(face['box'])] for face in face_locations]
+
+
+class FaceRecognitionAPITest(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        centers = rng.normal(size=(3, 128))
+        encodings = np.vstack([center + rng.normal(scale=0.05, size=(10, 128)) for center in centers])
+        self.label_encoder = LabelEncoder().fit(['S1', 'S2', 'S3'])
+        classifier = SVC(probability=True, kernel='linear', random_state=0).fit(
+            encodings, self.label_encoder.transform(np.repeat(['S1', 'S2', 'S3'], 10))
+        )
+        self.classifier = mock.Mock(wraps=classifier, classes_=classifier.classes_)
+
+        # Two recognizable faces and one too small to encode
+        self.processor = FakeFaceProcessor(
+            [[0, 0, 80, 80], [100, 0, 80, 80], [200, 0, 30, 30]],
+            {(0, 0, 80, 80): centers[2], (100, 0, 80, 80): centers[0], (200, 0, 30, 30): centers[1]}
+        )
+        image = base64.b64encode(cv2.imencode('.png', np.zeros((120, 240, 3), dtype=np.uint8))[1]).decode()
+        self.request = APIRequestFactory().post('/api/face/recognize/', {'image': image}, format='json')
+        force_authenticate(self.request, user=mock.Mock(is_authenticated=True))
+
+    def _models(self, name):
+        model = SimpleNamespace(classifier=self.classifier, label_encoder=self.label_encoder)
+        return SimpleNamespace(model=model if name == 'svm' else self.processor)
+
+    def test_faces_are_encoded_and_classified_in_one_batch(self):
+        with mock.patch('recognition.api.model_registry.get', side_effect=self._models):
+            response = FaceRecognitionAPI.as_view()(self.request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['detected_faces'], 3)
+        self.assertEqual([face['student_id'] for face in response.data['recognized_faces']], ['S3', 'S1'])
+        self.assertEqual(response.data['recognized_faces'][1]['bounding_box']['x'], 100)
+        self.assertEqual(self.processor.encoding_calls, 1)
+        self.assertEqual(self.classifier.predict_proba.call_count, 1)
+        self.classifier.predict.assert_not_called()
@@ -6,5 +6,6 @@ class StudentsConfig(AppConfig):
     name = 'students'
     
     def ready(self):
-        """Import signals when the app is ready"""
+        """Import signals and cache invalidation receivers when the app is ready"""
         import students.signals
+        import students.caching
@@ -17,6 +17,7 @@ import logging
 from students.models import Student, StudentLevelSelection, StudentCourseSelection
 from courses.models import Level, Course, TimetableSlot, Timetable
 from institutions.models import Department
+from attendance.roster_index import roster_index
 
 logger = logging.getLogger(__name__)
 
@@ -323,6 +324,7 @@ def invalidate_timetable_caches(sender, instance, **kwargs):
     
     StudentTimetableCacheManager.invalidate_timetable_cache(department_id, level_id)
     StudentTimetableCacheManager.invalidate_department_stats_cache(department_id)
+    roster_index.invalidate_slot(instance.id)
 
 
 @receiver(post_save, sender=StudentLevelSelection)
@@ -342,6 +344,14 @@ def invalidate_course_selection_caches(sender, instance, **kwargs):
         instance.level_id
     )
     StudentTimetableCacheManager.invalidate_department_stats_cache(instance.department_id)
+    roster_index.invalidate_course(instance.course_id, instance.level_id)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_student_rosters(sender, instance, **kwargs):
+    """Invalidate attendance rosters when a student's status or department changes"""
+    roster_index.invalidate_department(instance.department_id)
 
 
 # Utility functions for view integration
@@ -18,6 +18,7 @@ from students.models import Student
 from academics.models import Department, Course, AcademicYear, Semester
 from courses.models import CourseRegistration, ClassSession, TimetableSlot, Level
 from attendance.models import Attendance, ExamEligibility
+from attendance.attendance_counters import get_attendance_rates, get_combined_attendance_rate
 from administration.system_config import system_config_service
 
 logger = logging.getLogger(__name__)
@@ -111,6 +112,8 @@ class StudentDashboardService:
                 semester=semester
             ).select_related('course', 'approved_by').order_by('course__code')
             
+            attendance_rates = get_attendance_rates(registrations)
+            
             registered_courses = []
             for reg in registrations:
                 course_data = {
@@ -126,7 +129,7 @@ class StudentDashboardService:
                     'approved_at': reg.approved_at.isoformat() if reg.approved_at else None,
                     'approved_by': reg.approved_by.get_full_name() if reg.approved_by else None,
                     'rejection_reason': reg.rejection_reason,
-                    'attendance_rate': self._get_course_attendance_rate(student, reg.course, semester)
+                    'attendance_rate': round(attendance_rates.get(reg.id, 0.0), 2)
                 }
                 registered_courses.append(course_data)
             
@@ -487,18 +490,19 @@ class StudentDashboardService:
             threshold = system_config_service.get_setting('attendance.exam_eligibility_threshold', 75.0)
             
             # Get course registrations
-            registrations = CourseRegistration.objects.filter(
+            registrations = list(CourseRegistration.objects.filter(
                 student=student,
                 semester=semester,
                 status__in=['approved', 'auto_approved']
-            )
+            ).select_related('course'))
+            attendance_rates = get_attendance_rates(registrations)
             
             eligibility_status = []
             eligible_courses = 0
-            total_courses = registrations.count()
+            total_courses = len(registrations)
             
             for registration in registrations:
-                attendance_rate = self._get_course_attendance_rate(student, registration.course, semester)
+                attendance_rate = round(attendance_rates.get(registration.id, 0.0), 2)
                 is_eligible = attendance_rate >= threshold
                 
                 if is_eligible:
@@ -528,18 +532,11 @@ class StudentDashboardService:
     def _get_course_attendance_rate(self, student: Student, course: Course, semester: Semester) -> float:
         """Get attendance rate for specific course"""
         try:
-            course_attendance = Attendance.objects.filter(
+            return round(get_combined_attendance_rate(ExamEligibility.objects.filter(
                 student=student,
                 course_registration__course=course,
                 course_registration__semester=semester
-            )
-            
-            total = course_attendance.count()
-            if total == 0:
-                return 0.0
-            
-            present = course_attendance.filter(status__in=['present', 'partial', 'late']).count()
-            return round((present / total) * 100, 2)
+            )), 2)
             
         except Exception as e:
             logger.error(f"Error getting course attendance rate: {e}")